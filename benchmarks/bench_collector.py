@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+End-to-end collector benchmark against the local Smart-J stand-in.
+
+Starts benchmarks/smartj_stub_server.py in process, points the collector
+to it and runs login() -> collect_all_data() -> save_lessons_to_db() for
+every tenant on a fresh database, then reports wall time, requests per
+second and lessons per second of the whole run and of each step.
+
+Usage:
+    python benchmarks/bench_collector.py --tenants 4 --max-workers 3 --latency 0.2
+    python benchmarks/bench_collector.py --error-rate 0.1 --rate-limit 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smartj_stub_server import add_stub_arguments, start_server, stub_from_args
+
+
+def configure_environment(base_url, work_dir, tenants, max_workers, request_delay):
+    """Point the collector to the stand-in server and a scratch directory.
+
+    Must run before src modules are imported, they read the settings on import.
+    """
+    os.environ['SMARTJ_BASE_URL'] = base_url
+    os.environ['SMARTJ_DB_PATH'] = os.path.join(work_dir, 'bench.db')
+    os.environ['SMARTJ_DATA_DIR'] = os.path.join(work_dir, 'data')
+    os.environ['SMARTJ_USERNAME'] = 'bench'
+    os.environ['SMARTJ_PASSWORD'] = 'bench'
+
+    tenants_file = os.path.join(work_dir, 'tenants.json')
+    with open(tenants_file, 'w', encoding='utf-8') as f:
+        json.dump([
+            {
+                'name': 'default' if i == 0 else f'bench{i}',
+                'plan': f'r{1869 + i}~plan',
+                'max_workers': max_workers,
+                'request_delay': request_delay
+            }
+            for i in range(tenants)
+        ], f)
+    os.environ['SMARTJ_TENANTS_FILE'] = tenants_file
+
+    # extract_data_from_page() saves pages into data/ of the working directory
+    os.makedirs(os.path.join(work_dir, 'data'), exist_ok=True)
+    os.chdir(work_dir)
+
+
+def run_benchmark(tenant_parallelism):
+    """Collect and save all tenants, return timings and counts."""
+    from src.database.schema import create_database
+    from src.database.operations import save_lessons_to_db
+    from src.parsers.auth import login
+    from src.parsers.lesson_parser import collect_all_data
+    from src.parsers.tenants import load_tenants
+
+    create_database()
+    tenants = load_tenants()
+    timings = {'login': 0.0, 'collect': 0.0, 'save': 0.0}
+
+    def collect(tenant):
+        started = time.perf_counter()
+        session = login(tenant.username, tenant.password)
+        login_seconds = time.perf_counter() - started
+        if session is None:
+            return tenant, login_seconds, 0.0, []
+
+        started = time.perf_counter()
+        lessons = collect_all_data(session, tenant)
+        return tenant, login_seconds, time.perf_counter() - started, lessons
+
+    saved = {'new': 0, 'existing': 0, 'updated': 0}
+    parsed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(tenant_parallelism, len(tenants))) as executor:
+        for tenant, login_seconds, collect_seconds, lessons in executor.map(collect, tenants):
+            timings['login'] += login_seconds
+            timings['collect'] += collect_seconds
+            parsed += len(lessons)
+
+            save_started = time.perf_counter()
+            new, existing, updated = save_lessons_to_db(lessons, tenant.name)
+            timings['save'] += time.perf_counter() - save_started
+            saved['new'] += new
+            saved['existing'] += existing
+            saved['updated'] += updated
+
+    return {
+        'wall': time.perf_counter() - started,
+        'tenants': len(tenants),
+        'parsed': parsed,
+        'saved': saved,
+        'timings': timings
+    }
+
+
+def main():
+    """Run the end-to-end collector benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the collector against a local Smart-J stand-in")
+    parser.add_argument("--tenants", type=int, default=1, help="Number of tenants to collect")
+    parser.add_argument("--tenant-parallelism", type=int, default=4, help="Tenants collected at the same time")
+    parser.add_argument("--max-workers", type=int, default=1, help="Module pages fetched at once per tenant")
+    parser.add_argument("--request-delay", type=float, default=0.0, help="Pause after every module request")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub = stub_from_args(args)
+    server = start_server(stub)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    work_dir = tempfile.mkdtemp(prefix='smartj-bench-')
+    configure_environment(base_url, work_dir, args.tenants, args.max_workers, args.request_delay)
+
+    try:
+        result = run_benchmark(args.tenant_parallelism)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    requests_sent = sum(stub.stats.values())
+    wall = result['wall']
+    print(f"Stand-in: {base_url}, latency {args.latency} s, error rate {args.error_rate}, "
+          f"rate limit {args.rate_limit or '-'} req/s")
+    print(f"Tenants: {result['tenants']}, tenant parallelism {args.tenant_parallelism}, "
+          f"max workers {args.max_workers}, request delay {args.request_delay} s")
+    print(f"Work directory: {work_dir}")
+    print()
+    print(f"{'wall time':<20} {wall:>10.2f} s")
+    print(f"{'requests':<20} {requests_sent:>10} ({', '.join(f'{k}: {v}' for k, v in sorted(stub.stats.items()))})")
+    print(f"{'requests/s':<20} {requests_sent / wall:>10.1f}")
+    print(f"{'lessons parsed':<20} {result['parsed']:>10}")
+    print(f"{'lessons saved':<20} {result['saved']['new']:>10}")
+    print(f"{'lessons/s':<20} {result['parsed'] / wall:>10.1f}")
+    print()
+    print("Time summed over tenants:")
+    for step, seconds in result['timings'].items():
+        print(f"  {step:<18} {seconds:>10.2f} s")
+
+
+if __name__ == "__main__":
+    main()
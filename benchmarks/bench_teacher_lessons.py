@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Benchmark for the teacher lessons query.
+
+Compares the previous per-module COUNT + paginated join approach
+(2 x modules + 2 queries) with the single window-function query of
+get_teacher_lessons() on a synthetic database.
+
+Usage:
+    python benchmarks/bench_teacher_lessons.py [--lessons 50000] [--repeat 200]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_synthetic_db import create_synthetic_database
+
+
+def legacy_teacher_lessons(teacher_id, city_id=None, page=1, per_page=10):
+    """Previous implementation: one COUNT and one paginated join per module."""
+    from src.database.operations import get_connection
+
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM teachers WHERE id = ?", (teacher_id,))
+    teacher = cursor.fetchone()
+
+    cursor.execute("SELECT id, name FROM modules ORDER BY id")
+    all_modules = cursor.fetchall()
+
+    modules = {}
+    for module in all_modules:
+        count_query = '''
+        SELECT COUNT(*) as count
+        FROM lessons l
+        JOIN topics t ON l.topic_id = t.id
+        WHERE l.teacher_id = ? AND t.module_id = ?
+        '''
+        count_params = [teacher_id, module['id']]
+        if city_id:
+            count_query += ' AND l.city_id = ?'
+            count_params.append(city_id)
+        cursor.execute(count_query, count_params)
+        total_count = cursor.fetchone()['count']
+
+        modules[module['name']] = {'count': total_count, 'lessons': []}
+        if total_count == 0:
+            continue
+
+        module_query = '''
+        SELECT
+            l.id,
+            m.name as module_name,
+            t.title as topic_title,
+            c.name as city_name,
+            tc.name as teacher_name,
+            l.date,
+            l.group_name
+        FROM lessons l
+        JOIN topics t ON l.topic_id = t.id
+        JOIN modules m ON t.module_id = m.id
+        JOIN cities c ON l.city_id = c.id
+        JOIN teachers tc ON l.teacher_id = tc.id
+        WHERE l.teacher_id = ? AND t.module_id = ?
+        '''
+        module_params = [teacher_id, module['id']]
+        if city_id:
+            module_query += ' AND l.city_id = ?'
+            module_params.append(city_id)
+        module_query += ' ORDER BY l.date DESC LIMIT ? OFFSET ?'
+        module_params.extend([per_page, (page - 1) * per_page])
+        cursor.execute(module_query, module_params)
+        modules[module['name']]['lessons'] = [dict(row) for row in cursor.fetchall()]
+
+    conn.close()
+    return {'teacher_name': teacher['name'], 'modules': modules}
+
+
+def measure(func, teacher_ids, repeat):
+    """Return per-call latencies in milliseconds."""
+    timings = []
+    for i in range(repeat):
+        teacher_id = teacher_ids[i % len(teacher_ids)]
+        started = time.perf_counter()
+        func(teacher_id, None, 1, 10)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def report(name, timings):
+    """Print latency summary."""
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    mean = sum(timings) / len(timings)
+    print(f"{name:<16} mean {mean:8.3f} ms   p50 {p50:8.3f} ms   p95 {p95:8.3f} ms")
+    return mean
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark /api/teacher_lessons queries")
+    parser.add_argument("--lessons", type=int, default=50000, help="Number of synthetic lessons")
+    parser.add_argument("--repeat", type=int, default=200, help="Number of calls per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        counts = create_synthetic_database(os.path.join(tmp_dir, 'bench.db'), lessons_count=args.lessons)
+
+        from src.database.operations import get_teacher_lessons
+
+        teachers_count = counts['teachers']
+        teacher_ids = list(range(1, teachers_count + 1))
+
+        # Sanity check: both variants return the same lessons
+        for teacher_id in teacher_ids[:5]:
+            legacy = legacy_teacher_lessons(teacher_id)
+            current = get_teacher_lessons(teacher_id)
+            for module_name, module in legacy['modules'].items():
+                assert module['count'] == current['modules'][module_name]['count']
+                assert [l['date'] for l in module['lessons']] == \
+                    [l['date'] for l in current['modules'][module_name]['lessons']]
+
+        print(f"Lessons: {args.lessons}, teachers: {teachers_count}, calls: {args.repeat}")
+        legacy_mean = report("per-module", measure(legacy_teacher_lessons, teacher_ids, args.repeat))
+        window_mean = report("window query", measure(get_teacher_lessons, teacher_ids, args.repeat))
+        print(f"Speedup: {legacy_mean / window_mean:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
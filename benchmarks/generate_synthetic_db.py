@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+Synthetic database generator for load testing.
+
+Creates a database with the schema from src/database/schema.py and fills
+it with a configurable number of cities, teachers, topics and lessons
+spread over several years, and with the change log of the lessons: an
+insert of every lesson and teacher updates of a share of them.
+
+Usage:
+    python benchmarks/generate_synthetic_db.py synthetic.db --lessons 2000000 --years 5
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lessons inserted per executemany() call
+BATCH_SIZE = 50000
+
+
+def fill_database(db_path, lessons_count, cities_count=12, teachers_count=60,
+                  topics_per_module=40, years=3, updated_share=0.05, seed=42):
+    """Fill a database created by create_database() with synthetic data.
+
+    Args:
+        db_path (str): Path to the database.
+        lessons_count (int): Number of lessons to generate. Lessons colliding
+            on UNIQUE(topic_id, city_id, date) are skipped.
+        cities_count (int): Total number of cities, including the initial ones.
+        teachers_count (int): Number of teachers.
+        topics_per_module (int): Number of topics in every module.
+        years (int): Number of years before today covered by lesson dates.
+        updated_share (float): Share of lessons whose teacher is changed
+            after the insert, logged as updates.
+        seed (int): Random seed.
+
+    Returns:
+        dict: Number of rows in every table.
+    """
+    random.seed(seed)
+    conn = sqlite3.connect(db_path)
+    # Generated data can be recreated, skip durability for speed
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM cities")
+    existing_cities = cursor.fetchone()[0]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO cities (name) VALUES (?)",
+        [(f"Город {i}",) for i in range(existing_cities + 1, cities_count + 1)]
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO teachers (name) VALUES (?)",
+        [(f"Преподаватель {i}",) for i in range(1, teachers_count + 1)]
+    )
+
+    cursor.execute("SELECT id FROM modules")
+    module_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO topics (module_id, title) VALUES (?, ?)",
+        [(module_id, f"Тема {i}") for module_id in module_ids for i in range(1, topics_per_module + 1)]
+    )
+
+    cursor.execute("SELECT id FROM cities")
+    city_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM teachers")
+    teacher_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM topics")
+    topic_ids = [row[0] for row in cursor.fetchall()]
+
+    # Every teacher works in one or two cities
+    teacher_cities = {
+        teacher_id: random.sample(city_ids, min(len(city_ids), random.choice((1, 1, 2))))
+        for teacher_id in teacher_ids
+    }
+
+    days = max(1, years * 365)
+    first_day = datetime.date.today() - datetime.timedelta(days=days)
+    dates = [(first_day + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days + 1)]
+
+    remaining = lessons_count
+    while remaining > 0:
+        batch = []
+        for _ in range(min(BATCH_SIZE, remaining)):
+            teacher_id = random.choice(teacher_ids)
+            batch.append((
+                random.choice(topic_ids),
+                random.choice(teacher_cities[teacher_id]),
+                teacher_id,
+                random.choice(dates),
+                f"Группа {random.randint(1, 30)}"
+            ))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO lessons (topic_id, city_id, teacher_id, date, group_name) VALUES (?, ?, ?, ?, ?)",
+            batch
+        )
+        remaining -= len(batch)
+
+    # Change log as written by save_lessons_to_db(): every lesson inserted,
+    # then the teacher of some lessons changed
+    cursor.execute('''
+    INSERT INTO lesson_changes (lesson_id, tenant_id, operation, teacher_id, group_name, changed_at)
+    SELECT id, tenant_id, 'insert', teacher_id, group_name, created_at FROM lessons ORDER BY id
+    ''')
+    cursor.execute("SELECT MIN(id), MAX(id) FROM lessons")
+    first_id, last_id = cursor.fetchone()
+    updates = []
+    if first_id is not None:
+        lesson_ids = range(first_id, last_id + 1)
+        for lesson_id in random.sample(lesson_ids, int(len(lesson_ids) * updated_share)):
+            cursor.execute("SELECT tenant_id, teacher_id, group_name FROM lessons WHERE id = ?", (lesson_id,))
+            lesson = cursor.fetchone()
+            teacher_id = random.choice(teacher_ids)
+            if lesson is None or teacher_id == lesson[1]:
+                continue
+            tenant_id, old_teacher_id, group_name = lesson
+            updates.append((lesson_id, tenant_id, teacher_id, group_name, old_teacher_id, group_name))
+    cursor.executemany(
+        "UPDATE lessons SET teacher_id = ? WHERE id = ?",
+        [(teacher_id, lesson_id) for lesson_id, _, teacher_id, *_ in updates]
+    )
+    cursor.executemany(
+        """INSERT INTO lesson_changes
+        (lesson_id, tenant_id, operation, teacher_id, group_name, old_teacher_id, old_group_name)
+        VALUES (?, ?, 'update', ?, ?, ?, ?)""",
+        updates
+    )
+
+    conn.commit()
+
+    counts = {}
+    for table in ('modules', 'cities', 'topics', 'teachers', 'lessons', 'lesson_changes'):
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cursor.fetchone()[0]
+
+    conn.close()
+    return counts
+
+
+def create_synthetic_database(db_path, **kwargs):
+    """Create the schema at db_path and fill it, see fill_database()."""
+    os.environ['SMARTJ_DB_PATH'] = os.path.abspath(db_path)
+
+    # DB_PATH is read from the environment on import
+    from src.database import schema
+    schema.DB_PATH = os.environ['SMARTJ_DB_PATH']
+    schema.create_database()
+
+    return fill_database(db_path, **kwargs)
+
+
+def main():
+    """Generate a synthetic database."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic Smart-J database")
+    parser.add_argument("db_path", help="Path of the database to create")
+    parser.add_argument("--lessons", type=int, default=1000000, help="Number of lessons")
+    parser.add_argument("--cities", type=int, default=40, help="Number of cities")
+    parser.add_argument("--teachers", type=int, default=500, help="Number of teachers")
+    parser.add_argument("--topics", type=int, default=100, help="Number of topics per module")
+    parser.add_argument("--years", type=int, default=5, help="Number of years covered by lessons")
+    parser.add_argument("--updated", type=float, default=0.05,
+                        help="Share of lessons with a logged teacher update")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path):
+        parser.error(f"{args.db_path} already exists")
+
+    started = time.perf_counter()
+    counts = create_synthetic_database(
+        args.db_path,
+        lessons_count=args.lessons,
+        cities_count=args.cities,
+        teachers_count=args.teachers,
+        topics_per_module=args.topics,
+        years=args.years,
+        updated_share=args.updated,
+        seed=args.seed
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"Created {args.db_path} in {elapsed:.1f} s")
+    for table, count in counts.items():
+        print(f"  {table:<10} {count:>10}")
+
+
+if __name__ == "__main__":
+    main()
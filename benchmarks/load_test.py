@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Load driver for the Smart-J web interface.
+
+Replays a weighted mix of API requests against the Flask app, either in
+process through the test client or against a running server over HTTP,
+and reports latency percentiles and throughput per endpoint for each
+concurrency level.
+
+Usage:
+    python benchmarks/generate_synthetic_db.py synthetic.db --lessons 2000000
+    python benchmarks/load_test.py synthetic.db --concurrency 1,4,16 --duration 10
+    python benchmarks/load_test.py synthetic.db --url http://127.0.0.1:8080
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Relative weights of request types in the default mix
+DEFAULT_MIX = {
+    'lessons': 5,
+    'lessons_filtered': 3,
+    'teacher_lessons': 3,
+    'teachers_by_city': 2,
+    'weekly': 1
+}
+
+
+class RequestFactory:
+    """Builds random request URLs using IDs from the database."""
+
+    def __init__(self, db_path):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        self.module_ids = [row[0] for row in cursor.execute("SELECT id FROM modules")]
+        self.city_ids = [row[0] for row in cursor.execute("SELECT id FROM cities")]
+        self.teacher_ids = [row[0] for row in cursor.execute("SELECT id FROM teachers")]
+        min_date, max_date = cursor.execute("SELECT MIN(date), MAX(date) FROM lessons").fetchone()
+        conn.close()
+
+        today = datetime.date.today().strftime('%Y-%m-%d')
+        self.min_date = datetime.date.fromisoformat(min_date or today)
+        self.max_date = datetime.date.fromisoformat(max_date or today)
+
+    def build(self, kind, rng):
+        """Return (endpoint name, path with query string) of a random request."""
+        if kind == 'lessons':
+            params = {'page': rng.randint(1, 20)}
+            path = '/api/lessons'
+        elif kind == 'lessons_filtered':
+            params = {
+                'module_id': rng.choice(self.module_ids),
+                'city_id': rng.choice(self.city_ids),
+                'page': rng.randint(1, 5)
+            }
+            path = '/api/lessons'
+        elif kind == 'teacher_lessons':
+            params = {'teacher_id': rng.choice(self.teacher_ids)}
+            if rng.random() < 0.3:
+                params['city_id'] = rng.choice(self.city_ids)
+            path = '/api/teacher_lessons'
+        elif kind == 'teachers_by_city':
+            params = {'city_id': rng.choice(self.city_ids)}
+            path = '/api/teachers_by_city'
+        elif kind == 'weekly':
+            days = max(0, (self.max_date - self.min_date).days)
+            week_day = self.min_date + datetime.timedelta(days=rng.randint(0, days))
+            params = {'start_date': week_day.strftime('%Y-%m-%d')}
+            path = '/api/weekly'
+        else:
+            raise ValueError(f"Unknown request type: {kind}")
+
+        return kind, f"{path}?{urllib.parse.urlencode(params)}"
+
+
+class InProcessClient:
+    """Sends requests to the Flask app through its test client."""
+
+    def __init__(self):
+        from src.web.app import app
+        self.app = app
+
+    def session(self):
+        return self.app.test_client()
+
+    @staticmethod
+    def get(session, path):
+        response = session.get(path)
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def session(self):
+        return None
+
+    def get(self, session, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 0
+
+
+def percentile(sorted_values, fraction):
+    """Return a percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_level(client, factory, mix, concurrency, duration, seed):
+    """Run the request mix with the given number of concurrent workers.
+
+    Returns:
+        tuple: Latencies in seconds and error counts by request type, elapsed time.
+    """
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    latencies = {kind: [] for kind in kinds}
+    errors = {kind: 0 for kind in kinds}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        session = client.session()
+        local_latencies = {kind: [] for kind in kinds}
+        local_errors = {kind: 0 for kind in kinds}
+
+        while time.perf_counter() < deadline:
+            kind, path = factory.build(rng.choices(kinds, weights)[0], rng)
+            started = time.perf_counter()
+            status = client.get(session, path)
+            local_latencies[kind].append(time.perf_counter() - started)
+            if status < 200 or status >= 400:
+                local_errors[kind] += 1
+
+        with lock:
+            for kind in kinds:
+                latencies[kind].extend(local_latencies[kind])
+                errors[kind] += local_errors[kind]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def print_report(concurrency, latencies, errors, elapsed):
+    """Print per-endpoint latency percentiles and throughput."""
+    print(f"\nConcurrency {concurrency} ({elapsed:.1f} s)")
+    print(f"{'endpoint':<18} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+
+    all_latencies = []
+    for kind, values in latencies.items():
+        values.sort()
+        all_latencies.extend(values)
+        print(f"{kind:<18} {len(values):>9} {errors[kind]:>7} {len(values) / elapsed:>9.1f} "
+              f"{percentile(values, 0.50) * 1000:>9.2f} {percentile(values, 0.95) * 1000:>9.2f} "
+              f"{percentile(values, 0.99) * 1000:>9.2f}")
+
+    all_latencies.sort()
+    print(f"{'total':<18} {len(all_latencies):>9} {sum(errors.values()):>7} {len(all_latencies) / elapsed:>9.1f} "
+          f"{percentile(all_latencies, 0.50) * 1000:>9.2f} {percentile(all_latencies, 0.95) * 1000:>9.2f} "
+          f"{percentile(all_latencies, 0.99) * 1000:>9.2f}")
+
+
+def parse_mix(value):
+    """Parse a mix like 'lessons=5,teacher_lessons=1'."""
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request type: {kind}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description="Load test the Smart-J web interface")
+    parser.add_argument("db_path", help="Database used by the app (e.g. from generate_synthetic_db.py)")
+    parser.add_argument("--url", help="Base URL of a running server; the app is run in process if omitted")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="Comma separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Request mix, default: {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        parser.error(f"{args.db_path} does not exist")
+
+    factory = RequestFactory(args.db_path)
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        # The app reads the database path from the environment on import
+        os.environ['SMARTJ_DB_PATH'] = os.path.abspath(args.db_path)
+        # Keep generation stamp and caches of the synthetic database apart
+        os.environ.setdefault('SMARTJ_DATA_DIR', tempfile.mkdtemp(prefix='smartj-load-'))
+        client = InProcessClient()
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    print(f"Target: {args.url or 'in-process Flask app'}, database: {args.db_path}")
+    for concurrency in levels:
+        latencies, errors, elapsed = run_level(client, factory, args.mix, concurrency, args.duration, args.seed)
+        print_report(concurrency, latencies, errors, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Smart-J website.
+
+Serves the main page, the login POST and the kt-plan-report module pages
+of any plan, so that the collector can be run and benchmarked without
+my.smart-j.ru. Module pages are either archived HTML (the
+module_<id>_page.html files saved by the collector into data/) or
+synthetic reports with popovers in the format parsed by
+src/parsers/lesson_parser.py.
+
+Latency, server errors and rate limiting can be injected to test
+concurrency, retries and request pacing of the collector.
+
+Usage:
+    python benchmarks/smartj_stub_server.py --port 8765 --latency 0.2 --error-rate 0.05
+    SMARTJ_BASE_URL=http://127.0.0.1:8765 SMARTJ_USERNAME=u SMARTJ_PASSWORD=p python collect_data.py
+"""
+import argparse
+import datetime
+import hashlib
+import html
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Report page of a module: /<plan>/kt-plan-report/l:<list>/
+REPORT_PATH = re.compile(r'^/(?P<plan>[^/]+)/kt-plan-report/l:(?P<list>\d+)/?$')
+
+# Report lists of the modules, see MODULE_PATHS in src/config.py
+MODULE_LISTS = {'33': 1, '55': 2, '56': 3}
+
+LOGIN_PAGE = '''<html><body>
+<form method="post" action="/">
+<input name="login"><input name="passw" type="password"><input type="hidden" name="auth_mode" value="login">
+</form>
+</body></html>'''
+
+HOME_PAGE = '<html><body><a href="/?logout=1">Logout</a></body></html>'
+
+SESSION_COOKIE = 'stub_session'
+
+
+def popover(city, date, teacher, group):
+    """Return the escaped data-content of a lesson popover."""
+    content = (
+        f"<table><tr><td>Филиал:</td><td><b>{city}</b></td></tr>"
+        f"<tr><td>Дата</td><td>{date.strftime('%d.%m.%Y')}</td></tr>"
+        f"<tr><td>Преподаватель</td><td>{teacher}</td></tr>"
+        f"<tr><td>Группа</td><td>{group}</td></tr></table>"
+    )
+    return html.escape(content, quote=True)
+
+
+def synthetic_report(module_id, plan, topics=40, cities=12, fill=0.6, seed=0):
+    """Build a synthetic kt-plan-report page.
+
+    Args:
+        module_id (int): Module of the page, changes topics and lessons.
+        plan (str): Plan of the tenant, changes lessons.
+        topics (int): Number of topic rows.
+        cities (int): Number of city columns.
+        fill (float): Fraction of cells with a held lesson.
+        seed (int): Random seed.
+
+    Returns:
+        str: HTML of the page.
+    """
+    rng = random.Random(f"{seed}:{plan}:{module_id}")
+    first_day = datetime.date.today() - datetime.timedelta(days=365)
+    rows = ['<tr><th>Тема</th>' + ''.join(f'<th>Город {c}</th>' for c in range(1, cities + 1)) + '</tr>']
+    for topic in range(1, topics + 1):
+        cells = []
+        for city in range(1, cities + 1):
+            if rng.random() < fill:
+                date = first_day + datetime.timedelta(days=rng.randrange(365))
+                content = popover(f"Город {city}", date, f"Преподаватель {rng.randint(1, cities * 3)}",
+                                  f"Группа {rng.randint(1, 20)}")
+                cells.append(f'<td><div class="bull" style="background:#96fe96" data-toggle="popover" '
+                             f'data-content="{content}"></div></td>')
+            else:
+                cells.append('<td><div class="bull" style="background:#ffffff"></div></td>')
+        rows.append(f"<tr><td>Модуль {module_id}, тема {topic}</td>{''.join(cells)}</tr>")
+    return f'<html><body><table class="plan-rep">{"".join(rows)}</table></body></html>'
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per second with bursts of `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, return 0 on success or seconds until a token is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class StubSmartJ:
+    """State and configuration of the stand-in server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, pages_dir=None,
+                 topics=40, cities=12, fill=0.6, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.pages_dir = pages_dir
+        self.topics = topics
+        self.cities = cities
+        self.fill = fill
+        self.seed = seed
+        self.sessions = set()
+        self.stats = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def count(self, status):
+        with self._lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    def page(self, plan, module_id):
+        """Return (HTML, ETag) of a module page, built once per plan and module."""
+        key = (plan, module_id)
+        with self._lock:
+            cached = self._pages.get(key)
+        if cached is not None:
+            return cached
+
+        content = None
+        if self.pages_dir:
+            path = os.path.join(self.pages_dir, f"module_{module_id}_page.html")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    content = f.read()
+        if content is None:
+            content = synthetic_report(module_id, plan, self.topics, self.cities, self.fill, self.seed)
+
+        page = (content.encode('utf-8'), f'"{hashlib.sha1(content.encode("utf-8")).hexdigest()}"')
+        with self._lock:
+            self._pages[key] = page
+        return page
+
+    def inject(self):
+        """Sleep for the injected latency and decide on an injected failure.
+
+        Returns:
+            tuple: (status, retry_after) of a failure, or None.
+        """
+        delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.limiter is not None:
+            wait = self.limiter.acquire()
+            if wait:
+                return 429, max(1, round(wait))
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return 500, None
+        return None
+
+
+def make_handler(stub):
+    """Return a request handler class bound to a StubSmartJ."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            stub.count(status)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def session_id(self):
+            cookies = self.headers.get('Cookie', '')
+            match = re.search(rf'{SESSION_COOKIE}=([0-9a-f]+)', cookies)
+            return match.group(1) if match else None
+
+        def fail_injected(self):
+            failure = stub.inject()
+            if failure is None:
+                return False
+            status, retry_after = failure
+            self.send_body(status, f'<html><body>Error {status}</body></html>',
+                           headers={'Retry-After': str(retry_after)} if retry_after else None)
+            return True
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/__stats':
+                self.send_body(200, json.dumps(stub.stats), 'application/json')
+                return
+            if self.fail_injected():
+                return
+
+            if path == '/':
+                logged_in = self.session_id() in stub.sessions
+                self.send_body(200, HOME_PAGE if logged_in else LOGIN_PAGE)
+                return
+
+            match = REPORT_PATH.match(path)
+            if match is None or match.group('list') not in MODULE_LISTS:
+                self.send_body(404, '<html><body>Not found</body></html>')
+                return
+            if self.session_id() not in stub.sessions:
+                # Like Smart-J, an expired session gets the login page
+                self.send_body(200, LOGIN_PAGE)
+                return
+
+            body, etag = stub.page(match.group('plan'), MODULE_LISTS[match.group('list')])
+            if self.headers.get('If-None-Match') == etag:
+                self.send_body(304, b'', headers={'ETag': etag})
+                return
+            self.send_body(200, body, headers={'ETag': etag})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            form = parse_qs(self.rfile.read(length).decode('utf-8'))
+            if self.fail_injected():
+                return
+            if self.path.split('?', 1)[0] != '/':
+                self.send_body(404, '<html><body>Not found</body></html>')
+                return
+
+            if form.get('auth_mode') == ['login'] and form.get('login') and form.get('passw'):
+                session_id = secrets.token_hex(16)
+                stub.sessions.add(session_id)
+                self.send_body(200, HOME_PAGE, headers={'Set-Cookie': f'{SESSION_COOKIE}={session_id}; Path=/'})
+            else:
+                self.send_body(200, LOGIN_PAGE)
+
+    return Handler
+
+
+def start_server(stub, host='127.0.0.1', port=0):
+    """Start the stand-in server on a background thread.
+
+    Returns:
+        ThreadingHTTPServer: Running server, its URL is
+            http://<host>:<server.server_address[1]>.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='smartj-stub', daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser):
+    """Add options of StubSmartJ to an argument parser."""
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before answering 429")
+    parser.add_argument("--pages-dir", help="Directory with archived module_<id>_page.html files")
+    parser.add_argument("--topics", type=int, default=40, help="Topics per synthetic module page")
+    parser.add_argument("--cities", type=int, default=12, help="Cities per synthetic module page")
+    parser.add_argument("--fill", type=float, default=0.6, help="Fraction of held lessons on synthetic pages")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def stub_from_args(args):
+    """Create a StubSmartJ from options added by add_stub_arguments()."""
+    return StubSmartJ(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        pages_dir=args.pages_dir,
+        topics=args.topics,
+        cities=args.cities,
+        fill=args.fill,
+        seed=args.seed
+    )
+
+
+def main():
+    """Run the stand-in server until interrupted."""
+    parser = argparse.ArgumentParser(description="Local stand-in for the Smart-J website")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub_from_args(args)))
+    print(f"Smart-J stand-in listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+Collector daemon for Smart-J Data Collector.
+
+Keeps one authenticated session per tenant and checks every module page
+at its own adaptive interval within the request budget of the tenant, see
+src/parsers/scheduler.py. Replaces the daily cron run of collect_data.py.
+"""
+import logging
+import signal
+import threading
+import time
+from src.config import HEADERS, COLLECTOR_METRICS_FILE, DAEMON_MAX_INTERVAL, DAEMON_RETRY_INTERVAL, LOGIN_REQUESTS
+from src.utils.logger import setup_logging
+from src.utils.metrics import COLLECTOR_REGISTRY
+from src.database.schema import create_database
+from src.database.operations import save_lessons_to_db
+from src.database.generation import publish_generation
+from src.database.maintenance import maintain_after_ingest
+from src.database.snapshot import export_after_ingest
+from src.parsers.auth import login
+from src.parsers.lesson_parser import fetch_module_page, parse_module_page
+from src.parsers.scheduler import (
+    load_state, save_state, state_file, adapt_interval, jittered, lessons_fingerprint, min_interval
+)
+from src.parsers.tenants import load_tenants
+from src.web.weekly_cache import prerender_weekly_reports
+from src.web.warmup import run_warmup
+
+# Daemons of all tenants write to the same database and generation file
+_write_lock = threading.Lock()
+
+CHECKS = COLLECTOR_REGISTRY.counter(
+    'smartj_collector_checks_total', 'Module page checks by result', ['module', 'result']
+)
+CHECK_INTERVAL = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_check_interval_seconds', 'Current check interval of the module', ['module']
+)
+BUDGET_REMAINING = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_request_budget_remaining', 'Requests left in the current budget window', ['tenant']
+)
+LAST_CHECK = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_last_check_timestamp_seconds', 'Unix time of the last module check', ['module']
+)
+
+
+class CollectorDaemon:
+    """Checks module pages of a tenant on an adaptive schedule until stopped."""
+
+    def __init__(self, tenant, stop_event=None):
+        self.tenant = tenant
+        self.state_path = state_file(tenant.name)
+        self.schedules, self.budget = load_state(tenant, self.state_path)
+        self.shortest_interval = min_interval(len(self.schedules), self.budget)
+        self.session = None
+        self._stop = stop_event or threading.Event()
+
+    def stop(self, *args):
+        """Stop the daemon after the current check."""
+        self._stop.set()
+
+    def run(self):
+        """Run checks until stop() is called."""
+        logging.info(
+            "Collector daemon of tenant %s started: %d modules, budget %d requests per %d s, shortest interval %d s",
+            self.tenant.name, len(self.schedules), self.budget.limit, self.budget.window, self.shortest_interval
+        )
+        if self.shortest_interval >= DAEMON_MAX_INTERVAL:
+            logging.warning(
+                "Request budget of tenant %s leaves no room for checks more often than every %d s, "
+                "set request_budget to check changing modules sooner", self.tenant.name, DAEMON_MAX_INTERVAL
+            )
+
+        while not self._stop.is_set():
+            schedule = min(self.schedules, key=lambda item: item.next_run)
+            now = time.time()
+
+            # Login needs budget too when there is no session yet
+            requests_needed = 1 if self.session else 1 + LOGIN_REQUESTS
+            delay = max(schedule.next_run - now, self.budget.wait_time(requests_needed, now))
+            if delay > 0:
+                if schedule.next_run <= now:
+                    logging.info("Request budget of tenant %s exhausted, next check of %s in %d s",
+                                 self.tenant.name, schedule.name, delay)
+                self._stop.wait(delay)
+                continue
+
+            if self.session is None and not self.login():
+                schedule.next_run = time.time() + DAEMON_RETRY_INTERVAL
+                continue
+
+            self.check_module(schedule)
+            save_state(self.schedules, self.budget, self.state_path)
+            self.write_metrics()
+
+        save_state(self.schedules, self.budget, self.state_path)
+        logging.info("Collector daemon of tenant %s stopped", self.tenant.name)
+
+    def login(self):
+        """Log in and keep the session for following checks."""
+        self.budget.spend(LOGIN_REQUESTS)
+        self.session = login(self.tenant.username, self.tenant.password)
+        return self.session is not None
+
+    def check_module(self, schedule):
+        """Fetch a module page, save changed lessons and reschedule the module."""
+        headers = dict(HEADERS)
+        if schedule.etag:
+            headers['If-None-Match'] = schedule.etag
+        if schedule.last_modified:
+            headers['If-Modified-Since'] = schedule.last_modified
+
+        label = self.tenant.module_label(schedule.name)
+        now = time.time()
+        schedule.checks += 1
+        LAST_CHECK.set(now, module=label)
+        self.budget.spend(1, now)
+        try:
+            response = fetch_module_page(self.session, schedule.url, label, headers)
+            if response.status_code == 304:
+                lessons = None
+            else:
+                response.raise_for_status()
+                lessons = parse_module_page(response.text, schedule.module_id, label)
+                if lessons is None:
+                    # The login page is returned once the session expires
+                    logging.warning("No lessons table on %s page, logging in again", label)
+                    CHECKS.inc(module=label, result='session_expired')
+                    self.session = None
+                    schedule.next_run = now
+                    return
+        except Exception as e:
+            logging.error("Error checking module %s: %s", label, e)
+            CHECKS.inc(module=label, result='error')
+            schedule.next_run = now + DAEMON_RETRY_INTERVAL
+            return
+
+        if lessons is None:
+            changed = False
+        else:
+            fingerprint = lessons_fingerprint(lessons)
+            # The first check after start has nothing to compare with
+            changed = schedule.fingerprint is not None and fingerprint != schedule.fingerprint
+            if fingerprint != schedule.fingerprint:
+                try:
+                    self.save_lessons(lessons)
+                except Exception as e:
+                    # ETag and Last-Modified are not stored, so the retry gets the whole page again
+                    logging.error("Error saving lessons of module %s: %s", label, e)
+                    CHECKS.inc(module=label, result='error')
+                    schedule.next_run = now + DAEMON_RETRY_INTERVAL
+                    return
+                schedule.fingerprint = fingerprint
+            schedule.etag = response.headers.get('ETag')
+            schedule.last_modified = response.headers.get('Last-Modified')
+
+        if changed:
+            schedule.changes += 1
+            schedule.last_changed = now
+        CHECKS.inc(module=label, result='changed' if changed else 'unchanged')
+
+        schedule.interval = adapt_interval(schedule.interval, changed, self.shortest_interval)
+        schedule.next_run = now + jittered(schedule.interval)
+        CHECK_INTERVAL.set(schedule.interval, module=label)
+        logging.info(
+            "Module %s %s, next check in %.1f min",
+            label, 'changed' if changed else 'unchanged', (schedule.next_run - now) / 60
+        )
+
+    def save_lessons(self, lessons):
+        """Save lessons and publish a new data generation if any were added or updated."""
+        if not lessons:
+            return
+
+        with _write_lock:
+            new_lessons, existing_lessons, updated_lessons = save_lessons_to_db(lessons, self.tenant.name)
+            if not new_lessons and not updated_lessons:
+                return
+
+            try:
+                prerender_weekly_reports()
+            except Exception as e:
+                logging.error("Failed to pre-render weekly reports: %s", e)
+            generation = publish_generation(new_lessons, existing_lessons, updated_lessons)
+            export_after_ingest(generation['generation'])
+            maintain_after_ingest()
+            run_warmup(read_model=False)
+
+    def write_metrics(self):
+        """Write collector metrics for the /metrics endpoint."""
+        BUDGET_REMAINING.set(self.budget.remaining(), tenant=self.tenant.name)
+        with _write_lock:
+            try:
+                COLLECTOR_REGISTRY.write_file(COLLECTOR_METRICS_FILE)
+            except OSError as e:
+                logging.error("Failed to write collector metrics: %s", e)
+
+
+def main():
+    """Run a collector daemon thread per tenant until SIGTERM or SIGINT."""
+    setup_logging(level=logging.INFO)
+    create_database()
+
+    stop_event = threading.Event()
+    daemons = [CollectorDaemon(tenant, stop_event) for tenant in load_tenants()]
+    signal.signal(signal.SIGTERM, daemons[0].stop)
+    signal.signal(signal.SIGINT, daemons[0].stop)
+
+    threads = [
+        threading.Thread(target=daemon.run, name=f"collector-{daemon.tenant.name}") for daemon in daemons
+    ]
+    for thread in threads:
+        thread.start()
+    # Wait with a timeout, so that the main thread can handle signals
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
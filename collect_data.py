@@ -3,12 +3,46 @@
 Data collection script for Smart-J Data Collector.
 This script can be run independently by scheduled tasks.
 """
+import argparse
+import cProfile
+import glob
 import logging
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from src.config import ARCHIVE_KEEP_YEARS, COLLECTOR_METRICS_FILE, PROFILE_DIR, TENANT_PARALLELISM
 from src.utils.logger import setup_logging
+from src.utils.metrics import COLLECTOR_REGISTRY
+from src.utils.profiler import PROFILER, format_profile, load_profile
 from src.database.schema import create_database
 from src.parsers.auth import login
 from src.parsers.lesson_parser import collect_all_data
+from src.parsers.tenants import load_tenants
 from src.database.operations import save_lessons_to_db
+from src.database.generation import publish_generation
+from src.database.maintenance import format_health, maintain_after_ingest, run_maintenance
+from src.database.partitions import archive_old_years, archive_path, archived_years
+from src.database.snapshot import export_after_ingest
+from src.web.weekly_cache import prerender_weekly_reports
+from src.web.warmup import run_warmup
+
+RUN_SECONDS = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_run_seconds', 'Duration of the last collection run'
+)
+RUN_SUCCESS = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_last_run_success', '1 if the last collection run succeeded, 0 otherwise'
+)
+RUN_TIMESTAMP = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_last_run_timestamp_seconds', 'Unix time when the last collection run finished'
+)
+LOGIN_SECONDS = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_login_seconds', 'Duration of the login', ['tenant']
+)
+LESSONS_SAVED = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_lessons_saved', 'Lessons saved by the last collection run', ['tenant', 'status']
+)
 
 
 def collect_data():
@@ -16,27 +50,288 @@ def collect_data():
     logger = setup_logging(level=logging.DEBUG)
     logger.info("Starting data collection...")
     
-    # Create database schema
-    create_database()
+    COLLECTOR_REGISTRY.clear()
+    started = time.perf_counter()
     
-    # Login to website
-    session = login()
-    if not session:
-        logger.error("Failed to login. Exiting.")
-        return False
+    success = run_collection(logger)
     
-    # Collect data from all modules
-    all_lessons_data = collect_all_data(session)
+    # Write run metrics for the /metrics endpoint
+    RUN_SECONDS.set(time.perf_counter() - started)
+    RUN_SUCCESS.set(1 if success else 0)
+    RUN_TIMESTAMP.set(time.time())
+    try:
+        COLLECTOR_REGISTRY.write_file(COLLECTOR_METRICS_FILE)
+    except OSError as e:
+        logger.error(f"Failed to write collector metrics: {e}")
     
-    # Save data to database
-    if all_lessons_data:
-        new_lessons, existing_lessons = save_lessons_to_db(all_lessons_data)
-        logger.info(f"Data collection complete. Added {new_lessons} new lessons, {existing_lessons} already existed.")
-        return True
-    else:
+    return success
+
+
+def collect_tenant(tenant, logger):
+    """Log in to a tenant account and collect lessons of its modules.
+
+    Returns:
+        list: Lesson dictionaries, or None if the login failed.
+    """
+    login_started = time.perf_counter()
+    with PROFILER.stage('login', tenant.name):
+        session = login(tenant.username, tenant.password)
+    LOGIN_SECONDS.set(time.perf_counter() - login_started, tenant=tenant.name)
+    if not session:
+        logger.error(f"Failed to login to tenant {tenant.name}.")
+        return None
+
+    return collect_all_data(session, tenant)
+
+
+def run_collection(logger):
+    """Log in, collect lessons of all tenants and modules and save them.
+
+    Tenants are collected in parallel, lessons are saved from this thread
+    one tenant at a time as soon as the tenant is collected. A new data
+    generation is published only if lessons were added or updated.
+
+    Returns:
+        bool: False if no tenant was collected or saving a tenant failed.
+    """
+    # Create database schema
+    create_database()
+
+    try:
+        tenants = load_tenants()
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logger.error(f"Failed to load tenants: {e}")
+        return False
+
+    new_lessons = 0
+    existing_lessons = 0
+    updated_lessons = 0
+    collected_tenants = 0
+    failed_saves = 0
+
+    with ThreadPoolExecutor(max_workers=PROFILER.workers(min(TENANT_PARALLELISM, len(tenants)))) as executor:
+        futures = {executor.submit(collect_tenant, tenant, logger): tenant for tenant in tenants}
+        for future in as_completed(futures):
+            tenant = futures[future]
+            try:
+                lessons_data = future.result()
+            except Exception as e:
+                logger.error(f"Error collecting tenant {tenant.name}: {e}")
+                continue
+            if not lessons_data:
+                logger.error(f"No data collected for tenant {tenant.name}.")
+                continue
+
+            # Save data to database
+            try:
+                with PROFILER.stage('save', tenant.name):
+                    tenant_new, tenant_existing, tenant_updated = save_lessons_to_db(lessons_data, tenant.name)
+            except Exception as e:
+                logger.error(f"Failed to save lessons of tenant {tenant.name}: {e}")
+                failed_saves += 1
+                continue
+            PROFILER.add_items('save', len(lessons_data), tenant.name)
+            LESSONS_SAVED.set(tenant_new, tenant=tenant.name, status='new')
+            LESSONS_SAVED.set(tenant_existing, tenant=tenant.name, status='existing')
+            LESSONS_SAVED.set(tenant_updated, tenant=tenant.name, status='updated')
+            new_lessons += tenant_new
+            existing_lessons += tenant_existing
+            updated_lessons += tenant_updated
+            collected_tenants += 1
+
+    if not collected_tenants:
         logger.error("No data collected.")
         return False
 
+    if not new_lessons and not updated_lessons:
+        logger.info(f"Data collection complete ({collected_tenants} of {len(tenants)} tenants), "
+                    f"no new or updated lessons.")
+        return not failed_saves
+
+    logger.info(f"Data collection complete ({collected_tenants} of {len(tenants)} tenants). "
+                f"Added {new_lessons} new lessons, updated {updated_lessons}, {existing_lessons} already existed.")
+
+    # Pre-render weekly reports for the web interface
+    try:
+        with PROFILER.stage('prerender'):
+            prerender_weekly_reports()
+    except Exception as e:
+        logger.error(f"Failed to pre-render weekly reports: {e}")
+
+    # Announce new data to web clients
+    with PROFILER.stage('publish'):
+        generation = publish_generation(new_lessons, existing_lessons, updated_lessons)
+
+    # Columnar snapshot of the new generation for analytics tools
+    with PROFILER.stage('snapshot'):
+        export_after_ingest(generation['generation'])
+
+    # Fresh planner statistics and a compact file for the next run
+    with PROFILER.stage('maintenance'):
+        maintain_after_ingest()
+
+    # Fill the shared cache and the page cache of the new generation for the web interface
+    with PROFILER.stage('warmup'):
+        run_warmup(read_model=False)
+
+    return not failed_saves
+
+
+def latest_profile():
+    """Return the path of the most recent saved profile, or None."""
+    paths = sorted(glob.glob(os.path.join(PROFILE_DIR, 'collect_*.json')))
+    return paths[-1] if paths else None
+
+
+def profile_collection(compare_path=None, cprofile_path=None, tracemalloc_path=None, trace_allocations=True):
+    """Run collect_data() with the stage profiler and print a summary.
+
+    The profile is saved to PROFILE_DIR and compared with compare_path,
+    or with the most recent saved profile.
+
+    Args:
+        compare_path (str, optional): Profile of a previous run.
+        cprofile_path (str, optional): Write a cProfile dump (pstats format).
+        tracemalloc_path (str, optional): Write a tracemalloc snapshot.
+        trace_allocations (bool): Measure allocated memory per stage.
+
+    Returns:
+        bool: Whether the collection succeeded.
+    """
+    compare_path = compare_path or latest_profile()
+    if tracemalloc_path and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    PROFILER.start(trace_allocations=trace_allocations)
+    profile = cProfile.Profile() if cprofile_path else None
+    if profile:
+        profile.enable()
+    try:
+        success = collect_data()
+    finally:
+        if profile:
+            profile.disable()
+        PROFILER.stop()
+
+    if profile:
+        profile.dump_stats(cprofile_path)
+        print(f"cProfile dump written to {cprofile_path}")
+    if tracemalloc_path:
+        tracemalloc.take_snapshot().dump(tracemalloc_path)
+        print(f"tracemalloc snapshot written to {tracemalloc_path}")
+
+    profile_path = os.path.join(PROFILE_DIR, f"collect_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+    PROFILER.save(profile_path)
+
+    previous = None
+    if compare_path:
+        try:
+            previous = load_profile(compare_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cannot read profile {compare_path}: {e}")
+
+    print(f"\nProfile written to {profile_path}")
+    if previous is not None:
+        print(f"Compared with {compare_path}")
+    print(format_profile(PROFILER.stats, previous))
+
+    return success
+
+
+def maintain_database(analyze=True, vacuum=True, full_vacuum=False, integrity=True):
+    """Run database maintenance and print the database health before and after.
+
+    Returns:
+        bool: Whether the integrity check passed.
+    """
+    setup_logging(level=logging.INFO)
+    create_database()
+
+    report = run_maintenance(analyze=analyze, vacuum=vacuum, full_vacuum=full_vacuum, integrity=integrity)
+
+    print("Before maintenance:")
+    print(format_health(report['before']))
+    print("\nAfter maintenance:")
+    print(format_health(report['after']))
+    if not full_vacuum and vacuum:
+        print(f"\nIncremental vacuum freed {report['freed_pages']} pages")
+        if report['before']['auto_vacuum'] != 'incremental':
+            print("Incremental vacuum needs auto_vacuum = incremental, run once with --full-vacuum")
+    if report['integrity'] is not None:
+        print(f"Integrity check: {'ok' if not report['integrity'] else '; '.join(report['integrity'])}")
+
+    return not report['integrity']
+
+
+def archive_database(keep_years=ARCHIVE_KEEP_YEARS):
+    """Move lessons of old years into read-only archive databases and print what was moved."""
+    setup_logging(level=logging.INFO)
+    create_database()
+
+    moved = archive_old_years(keep_years)
+    for year, count in moved.items():
+        print(f"{year}: {count} lessons moved to {archive_path(year)}")
+    if not moved:
+        print(f"Nothing to archive, the last {keep_years} years stay in the main database")
+    print(f"Archived years: {', '.join(map(str, archived_years())) or '-'}")
+
+    # Return the space of the moved rows to the file system
+    maintain_after_ingest()
+    return True
+
+
+def main():
+    """Parse command line options and collect data or maintain the database."""
+    parser = argparse.ArgumentParser(description="Collect data from Smart-J website")
+    subparsers = parser.add_subparsers(dest="command")
+    maintenance_parser = subparsers.add_parser(
+        "maintenance", help="Analyze, vacuum and check the database and report its health"
+    )
+    maintenance_parser.add_argument("--no-analyze", action="store_true",
+                                    help="Run PRAGMA optimize instead of a full ANALYZE")
+    maintenance_parser.add_argument("--no-vacuum", action="store_true", help="Skip the incremental vacuum")
+    maintenance_parser.add_argument("--full-vacuum", action="store_true",
+                                    help="Rebuild the file with VACUUM and enable incremental vacuum")
+    maintenance_parser.add_argument("--no-integrity", action="store_true", help="Skip the integrity check")
+    archive_parser = subparsers.add_parser(
+        "archive", help="Move lessons of old years into read-only archive databases"
+    )
+    archive_parser.add_argument("--keep-years", type=int, default=ARCHIVE_KEEP_YEARS,
+                                help="Latest years kept in the main database, the current one included")
+    parser.add_argument("--profile", action="store_true",
+                        help="Measure time, CPU, allocations and items per stage and module")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="Profile of a previous run to compare with (default: the latest saved profile)")
+    parser.add_argument("--cprofile", metavar="PATH", help="With --profile, write a cProfile dump")
+    parser.add_argument("--tracemalloc", metavar="PATH", help="With --profile, write a tracemalloc snapshot")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="With --profile, do not trace allocations (lower overhead)")
+    args = parser.parse_args()
+
+    if args.command == "maintenance":
+        return maintain_database(
+            analyze=not args.no_analyze,
+            vacuum=not args.no_vacuum,
+            full_vacuum=args.full_vacuum,
+            integrity=not args.no_integrity
+        )
+    if args.command == "archive":
+        if args.keep_years < 1:
+            parser.error("--keep-years must be at least 1")
+        return archive_database(args.keep_years)
+
+    if not args.profile:
+        if args.compare or args.cprofile or args.tracemalloc or args.no_allocations:
+            parser.error("--compare, --cprofile, --tracemalloc and --no-allocations require --profile")
+        return collect_data()
+
+    return profile_collection(
+        compare_path=args.compare,
+        cprofile_path=args.cprofile,
+        tracemalloc_path=args.tracemalloc,
+        trace_allocations=not args.no_allocations
+    )
+
 
 if __name__ == "__main__":
-    collect_data() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for Smart-J Data Collector web interface.
+
+Gunicorn loads this file automatically from the working directory:
+
+    gunicorn run_web:app
+"""
+import time
+
+from src.config import EVENTS_KEEPALIVE_INTERVAL, METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+bind = "0.0.0.0:8080"
+workers = 3
+
+# Every /api/events subscriber holds a connection for as long as the page
+# is open. Sync workers would serve one request at a time and kill a stream
+# after `timeout`, so each worker runs a pool of threads instead: up to
+# workers * threads requests and streams at once. gevent would hold more
+# streams, but needs an extra dependency and monkey-patching of sqlite3
+# users; the thread pool is enough for the expected number of open pages.
+worker_class = "gthread"
+threads = 16
+
+# Longer than the keep-alive interval of the event stream, so a stream
+# waiting for its next keep-alive is never taken for a hung worker
+timeout = EVENTS_KEEPALIVE_INTERVAL * 2
+
+# Import the app once in the master process; workers are forked with all
+# modules already loaded instead of importing them again
+preload_app = True
+
+
+def on_starting(server):
+    """Check the database schema once and share metrics, before workers are forked.
+
+    Every worker has its own metrics; they are written to METRICS_DIR and
+    merged by /metrics, whichever worker serves it.
+    """
+    from src.database.schema import ensure_database
+    from src.utils.metrics import REGISTRY
+
+    REGISTRY.share(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+    started = time.perf_counter()
+    updated = ensure_database()
+    server.log.info("Database schema %s in %.0f ms",
+                    "updated" if updated else "is up to date", (time.perf_counter() - started) * 1000)
+
+
+def when_ready(server):
+    """Report how long importing the app took and warm up caches before workers are forked.
+
+    Workers inherit the loaded read model, the shared cache and the OS page
+    cache are shared anyway. The warmup holds up the workers at most
+    WARMUP_BUDGET seconds.
+    """
+    import run_web
+    from src.web.warmup import run_warmup
+
+    server.log.info("Web interface imported in %.0f ms", run_web.IMPORT_SECONDS * 1000)
+
+    started = time.perf_counter()
+    run_warmup()
+    run_web.STARTUP_SECONDS.set(time.perf_counter() - started, phase='warmup')
+
+
+def worker_exit(server, worker):
+    """Keep the last counts of a stopped worker in /metrics."""
+    from src.utils.metrics import REGISTRY
+
+    REGISTRY.flush()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Main script for Smart-J Data Collector.
+
+Runs data collection (--collect), the web interface (--web) or both in
+one process (--all): the web interface serves requests while a background
+thread collects data at start and then every INGEST_INTERVAL seconds.
+The ingest thread writes through the writer connection of the process and
+hands new data to the request threads directly, see
+src/database/generation.py, without a restart or polling of files.
+"""
+import argparse
+import logging
+import sys
+import threading
+from src.config import INGEST_INTERVAL
+from collect_data import collect_data
+from run_web import start_web_server
+from src.utils.logger import setup_logging
+from src.database.schema import ensure_database
+from src.database.generation import add_generation_listener, follow_local_publishes
+from src.database.read_model import get_read_model
+from src.database.teacher_index import get_teacher_index
+from src.web.events import generation_watcher
+
+
+def run_ingests(interval, stop_event):
+    """Collect data now and then every interval seconds until stop_event is set."""
+    while not stop_event.is_set():
+        try:
+            if not collect_data():
+                logging.error("Background data collection failed, next attempt in %d s", interval)
+        except Exception:
+            logging.exception("Background data collection crashed, next attempt in %d s", interval)
+        stop_event.wait(interval)
+
+
+def refresh_read_model(generation):
+    """Load the read model and the teacher index of a new generation on the ingest thread, not on a request."""
+    get_read_model()
+    get_teacher_index()
+
+
+def start_background_ingest(interval=INGEST_INTERVAL):
+    """Start scheduled ingests in this process and follow their publishes directly.
+
+    Returns:
+        threading.Event: Set it to stop the ingests after the current one.
+    """
+    follow_local_publishes()
+    generation_watcher.poll_interval = None
+    add_generation_listener(generation_watcher.publish)
+    add_generation_listener(refresh_read_model)
+
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_ingests, args=(interval, stop_event), name='ingest', daemon=True)
+    thread.start()
+    return stop_event
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Smart-J Data Collector")
+    parser.add_argument("--collect", action="store_true", help="Collect data from Smart-J website")
+    parser.add_argument("--web", action="store_true", help="Run web interface")
+    parser.add_argument("--all", action="store_true",
+                        help="Run web interface and collect data in the background on a schedule")
+    parser.add_argument("--interval", type=int, default=INGEST_INTERVAL,
+                        help="Seconds between background collections with --all")
+
+    args = parser.parse_args()
+
+    if args.collect:
+        sys.exit(0 if collect_data() else 1)
+    elif args.web:
+        start_web_server()
+    elif args.all:
+        # Set up logging and the schema before the ingest thread and the server share them
+        setup_logging(level=logging.INFO)
+        ensure_database()
+        start_background_ingest(args.interval)
+        start_web_server()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,44 @@
 Web interface script for Smart-J Data Collector.
 This script can be run independently as a service.
 """
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import logging
 from src.utils.logger import setup_logging
-from src.database.schema import create_database
-from src.web.app import app, run_web_interface
+from src.utils.metrics import REGISTRY
+from src.database.schema import ensure_database
+from src.web.app import app, create_app, run_web_interface
+from src.web.warmup import run_warmup
 
 # Определяем переменную app для совместимости с Gunicorn
-# app экспортируется из модуля src.web.app
+# app экспортируется из модуля src.web.app, create_app - фабрика приложения
+
+# Time spent importing the web interface
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    'smartj_web_startup_seconds', 'Web interface import and startup time by phase', ['phase']
+)
+STARTUP_SECONDS.set(IMPORT_SECONDS, phase='import')
 
 def start_web_server():
     """Start the web interface for Smart-J Data."""
+    started = time.perf_counter()
     logger = setup_logging(level=logging.INFO)
     logger.info("Starting web interface...")
     
-    # Ensure database schema exists
-    create_database()
+    # Ensure database schema exists and is up to date
+    ensure_database()
+    
+    # Load caches and hot database pages, at most WARMUP_BUDGET seconds
+    warmup_started = time.perf_counter()
+    run_warmup()
+    STARTUP_SECONDS.set(time.perf_counter() - warmup_started, phase='warmup')
+    
+    startup_seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(startup_seconds, phase='startup')
+    logger.info(f"Web interface imported in {IMPORT_SECONDS * 1000:.0f} ms, started in {startup_seconds * 1000:.0f} ms")
     
     # Run web interface
     run_web_interface()
@@ -26,4 +49,4 @@ def start_web_server():
 
 
 if __name__ == "__main__":
-    start_web_server() 
\ No newline at end of file
+    start_web_server()
@@ -11,11 +11,14 @@ setup(
         "urllib3>=2.0.0",
         "python-dotenv>=1.1.0",
     ],
+    extras_require={
+        "heatmap": ["numpy>=1.21"],
+    },
     entry_points={
         "console_scripts": [
             "smart-j-collector=main:main",
             "smart-j-web=run_web:start_web_server",
-            "smart-j-parse=collect_data:collect_data",
+            "smart-j-parse=collect_data:main",
         ],
     },
     python_requires=">=3.7",
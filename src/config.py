@@ -8,31 +8,120 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Database settings
-DB_PATH = os.path.join(BASE_DIR, 'smart_j_data.db')
+DB_PATH = os.getenv('SMARTJ_DB_PATH', os.path.join(BASE_DIR, 'smart_j_data.db'))
+
+# Database maintenance (collect_data.py maintenance): run PRAGMA optimize and
+# an incremental vacuum after every ingest
+MAINTENANCE_AFTER_INGEST = True
+# Free pages returned to the file system by one incremental vacuum, 0 = all
+MAINTENANCE_VACUUM_PAGES = 0
+
+# Directory for collected pages and generated files
+DATA_DIR = os.getenv('SMARTJ_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Data generation stamp, rewritten after each published ingest
+GENERATION_FILE = os.path.join(DATA_DIR, 'generation.json')
+
+# Server-sent events settings (seconds)
+EVENTS_POLL_INTERVAL = 2
+EVENTS_KEEPALIVE_INTERVAL = 30
+
+# Metrics of the last data collection run, served by /metrics
+COLLECTOR_METRICS_FILE = os.path.join(DATA_DIR, 'collector_metrics.prom')
+
+# Metrics of the gunicorn workers, merged by /metrics (seconds between writes of a worker)
+METRICS_DIR = os.path.join(DATA_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+# Stage profiles written by collect_data.py --profile
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+
+# Collector daemon (collect_daemon.py)
+DAEMON_STATE_FILE = os.path.join(DATA_DIR, 'collector_schedule.json')
+# Bounds of the per-module check interval in seconds
+DAEMON_MIN_INTERVAL = 15 * 60
+DAEMON_MAX_INTERVAL = 24 * 60 * 60
+DAEMON_INITIAL_INTERVAL = 2 * 60 * 60
+# Interval factors after a check that found changes / no changes
+DAEMON_SPEEDUP = 0.5
+DAEMON_SLOWDOWN = 1.5
+# Random +/- fraction added to every interval
+DAEMON_JITTER = 0.1
+# Requests to Smart-J (logins included) allowed per budget window. None allows
+# as many requests as one daily cron run of collect_data.py sends: a login and
+# one request per module, which leaves no room for checking changing modules
+# sooner. Set a higher number to trade requests for fresher data
+DAEMON_REQUEST_BUDGET = None
+DAEMON_BUDGET_WINDOW = 24 * 60 * 60
+# Requests sent by a login: main page and login form
+LOGIN_REQUESTS = 2
+# Seconds to wait after a failed login or request
+DAEMON_RETRY_INTERVAL = 10 * 60
+
+# Combined mode (main.py --all): seconds between ingests run by the web process
+INGEST_INTERVAL = 24 * 60 * 60
+
+# Cache shared by all web workers, keyed by data generation
+SHARED_CACHE_ENABLED = True
+SHARED_CACHE_PATH = os.path.join(DATA_DIR, 'web_cache.db')
+
+# Cache warmup on web start and after every ingest: time budget in seconds
+# and number of latest weeks to load
+WARMUP_ENABLED = True
+WARMUP_BUDGET = 5.0
+WARMUP_WEEKS = 4
+
+# Per-year partitions (collect_data.py archive): finished years are moved into
+# read-only archive databases, the latest ARCHIVE_KEEP_YEARS years (the current
+# one included) stay in the main database
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')
+ARCHIVE_KEEP_YEARS = 2
+
+# Columnar lesson snapshots for analytics tools, exported after every ingest
+SNAPSHOT_EXPORT_ENABLED = True
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+# Number of newest snapshots kept
+SNAPSHOT_KEEP = 2
+
+# Pre-rendered weekly reports
+WEEKLY_CACHE_DIR = os.path.join(DATA_DIR, 'weekly_cache')
+WEEKLY_CACHE_WEEKS = 12
 
 # Logging settings
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 LOG_FILE = os.path.join(LOG_DIR, 'data_collector.log')
+# Write log records from a background thread instead of the logging thread
+LOG_BACKGROUND = True
+# Only every n-th per-lesson/per-topic message is logged
+LOG_ITEM_SAMPLE_RATE = 100
 
-# Smart-J website settings
-BASE_URL = "http://my.smart-j.ru"
+# Smart-J website settings, SMARTJ_BASE_URL points the collector to another
+# server, e.g. the stand-in server of benchmarks/smartj_stub_server.py
+BASE_URL = os.getenv('SMARTJ_BASE_URL', "http://my.smart-j.ru").rstrip('/')
 LOGIN_URL = f"{BASE_URL}/login"
 
-# Module URLs
-MODULE_URLS = {
-    'Matata': f"{BASE_URL}/r1869~plan/kt-plan-report/l:33/",
-    'Kids': f"{BASE_URL}/r1869~plan/kt-plan-report/l:55/",
-    'Junior': f"{BASE_URL}/r1869~plan/kt-plan-report/l:56/"
+# Module report pages, relative to the plan of a tenant
+MODULE_PATHS = {
+    'Matata': "kt-plan-report/l:33/",
+    'Kids': "kt-plan-report/l:55/",
+    'Junior': "kt-plan-report/l:56/"
 }
+MODULE_IDS = {name: module_id for module_id, name in enumerate(MODULE_PATHS, 1)}
 
-# Login credentials
-# Load from environment variables or .env file
-from dotenv import load_dotenv
-load_dotenv()
+# Smart-J accounts (tenants) are listed in TENANTS_FILE, see
+# src/parsers/tenants.py. Without the file only the default tenant is collected.
+DEFAULT_TENANT = 'default'
+DEFAULT_TENANT_PLAN = 'r1869~plan'
+TENANTS_FILE = os.getenv('SMARTJ_TENANTS_FILE', os.path.join(BASE_DIR, 'tenants.json'))
+# Tenants collected at the same time
+TENANT_PARALLELISM = 4
+# Default pause between requests of a tenant in seconds
+REQUEST_DELAY = 2
 
-import os
-USERNAME = os.getenv("SMARTJ_USERNAME")
-PASSWORD = os.getenv("SMARTJ_PASSWORD")
+# Module URLs of the default tenant
+MODULE_URLS = {name: f"{BASE_URL}/{DEFAULT_TENANT_PLAN}/{path}" for name, path in MODULE_PATHS.items()}
+
+# Login credentials are loaded by src.parsers.credentials from environment
+# variables or .env file, so that the web interface does not need them
 
 # HTTP headers
 HEADERS = {
@@ -48,3 +137,29 @@ HEADERS = {
 WEB_HOST = "127.0.0.1"
 WEB_PORT = 8080
 ITEMS_PER_PAGE = 10
+
+# Maximum number of idle pooled reader connections
+READER_POOL_SIZE = 4
+
+# Serve lessons and teacher queries of the web interface from an in-memory
+# read model (src/database/read_model.py) reloaded on every data generation
+READ_MODEL_ENABLED = os.getenv('SMARTJ_READ_MODEL', '0') == '1'
+
+# Maximum number of sub-requests in one /api/batch request
+BATCH_MAX_REQUESTS = 20
+
+# Changes returned by one /api/changes request: default and maximum
+CHANGES_PAGE_SIZE = 1000
+CHANGES_MAX_PAGE_SIZE = 10000
+
+# Teachers returned by one /api/teachers/search request: default and maximum
+TEACHER_SEARCH_PAGE_SIZE = 20
+TEACHER_SEARCH_MAX_PAGE_SIZE = 100
+
+# Longest date range of one /api/heatmap request in weeks (about two years),
+# the matrix is dense, so its size grows with every week of the range
+HEATMAP_MAX_WEEKS = 106
+
+# Response compression settings
+COMPRESSION_MIN_SIZE = 1024  # bytes, smaller responses are sent as is
+COMPRESSION_LEVEL = 6
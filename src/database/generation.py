@@ -0,0 +1,178 @@
+"""
+Data generation stamp for Smart-J Data Collector.
+
+Each finished ingest publishes a new data generation by rewriting
+GENERATION_FILE. Readers detect new data by checking the file stamp,
+without querying the database.
+
+When ingests run inside the web process (main.py --all), readers of that
+process are told directly: publish_generation() updates the current
+generation and calls the listeners added with add_generation_listener().
+
+Reads that must all see one generation, like the sub-requests of
+/api/batch, run inside pinned_generation().
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from src.config import GENERATION_FILE
+
+
+def read_generation():
+    """Read the current data generation.
+
+    Returns:
+        dict: Generation number, publish time and ingest counts.
+            Generation 0 means no ingest has been published yet.
+    """
+    try:
+        with open(GENERATION_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'generation': 0, 'published_at': None, 'new_lessons': 0, 'existing_lessons': 0, 'updated_lessons': 0}
+
+
+# Last read generation of this process and the stamp it was read at.
+# 'local' is set when all ingests run in this process, see follow_local_publishes()
+_current = {'stamp': None, 'generation': None, 'local': False}
+
+# Callbacks called with every generation published by this process
+_listeners = []
+
+# Generation pinned for the current thread and values loaded for it, see pinned_generation()
+_pinned = threading.local()
+
+
+def add_generation_listener(callback):
+    """Call callback(generation) after every generation published by this process.
+
+    Listeners run on the publishing thread. Errors are logged and do not
+    fail the ingest.
+    """
+    _listeners.append(callback)
+
+
+def follow_local_publishes():
+    """Stop checking the generation file, all ingests publish in this process.
+
+    Only for processes that run the collector themselves, see main.py --all.
+    """
+    _current['local'] = True
+
+
+def current_generation():
+    """Return the current generation number.
+
+    The file is only re-read when its stamp changes, so this is cheap
+    enough to call on every request.
+    """
+    pinned = getattr(_pinned, 'generation', None)
+    if pinned is not None:
+        return pinned
+    if _current['local'] and _current['generation'] is not None:
+        return _current['generation']
+
+    stamp = generation_stamp()
+    if _current['generation'] is None or stamp != _current['stamp']:
+        _current['generation'] = read_generation()['generation']
+        _current['stamp'] = stamp
+    return _current['generation']
+
+
+@contextmanager
+def pinned_generation():
+    """Make all reads of the block on this thread see one data generation.
+
+    current_generation() returns the generation current when the block
+    started, so caches keyed by generation serve only that generation.
+    In-memory models (read model, teacher index, heatmap codes) must not
+    return a model of another generation inside the block, see
+    generation_pinned() and pinned_value(). Nested blocks reuse the outer
+    generation.
+
+    Yields:
+        int: Pinned generation.
+    """
+    if generation_pinned():
+        yield _pinned.generation
+        return
+
+    _pinned.generation = current_generation()
+    _pinned.values = {}
+    try:
+        yield _pinned.generation
+    finally:
+        _pinned.generation = None
+        _pinned.values = None
+
+
+def generation_pinned():
+    """Return True inside pinned_generation() on this thread."""
+    return getattr(_pinned, 'generation', None) is not None
+
+
+def pinned_value(name, load):
+    """Return a value of the pinned generation, loaded once per pinned block.
+
+    For models of an older generation than the one already loaded by the
+    process, which must not replace it.
+
+    Args:
+        name (str): Name of the value.
+        load (callable): Function returning the value, called with the
+            pinned generation.
+    """
+    values = _pinned.values
+    if name not in values:
+        values[name] = load(_pinned.generation)
+    return values[name]
+
+
+def generation_stamp():
+    """Return a cheap stamp of the generation file that changes on publish."""
+    try:
+        stat = os.stat(GENERATION_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def publish_generation(new_lessons, existing_lessons, updated_lessons=0):
+    """Publish a new data generation after an ingest.
+
+    Args:
+        new_lessons (int): Number of lessons added by the ingest.
+        existing_lessons (int): Number of lessons that already existed unchanged.
+        updated_lessons (int): Number of lessons whose teacher or group changed.
+
+    Returns:
+        dict: Published generation.
+    """
+    generation = {
+        'generation': read_generation()['generation'] + 1,
+        'published_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'new_lessons': new_lessons,
+        'existing_lessons': existing_lessons,
+        'updated_lessons': updated_lessons
+    }
+
+    # Replace the file atomically so readers never see a partial write
+    os.makedirs(os.path.dirname(GENERATION_FILE), exist_ok=True)
+    tmp_path = f"{GENERATION_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(generation, f)
+    os.replace(tmp_path, GENERATION_FILE)
+    _current['generation'] = generation['generation']
+    _current['stamp'] = generation_stamp()
+
+    logging.info(f"Published data generation {generation['generation']}")
+
+    for listener in _listeners:
+        try:
+            listener(generation)
+        except Exception:
+            logging.exception("Generation listener %r failed", listener)
+    return generation
@@ -0,0 +1,223 @@
+"""
+Lesson heatmaps for Smart-J Data Collector web interface.
+
+All lessons of a data generation are fetched once as integer-coded rows
+(day number, city, module, teacher and tenant IDs) into NumPy columns
+sorted by day. A heatmap of any date range is then a binary search for
+the range, boolean masks for the filters and one bincount over the
+flattened (row, column, week) index, without Python loops over lessons.
+
+NumPy is optional, heatmaps are not available without it. It is imported
+on the first heatmap, not with the web interface.
+"""
+import datetime
+import importlib.util
+import logging
+import os
+import threading
+import time
+from src.database import operations
+from src.database.generation import current_generation, generation_pinned, pinned_value
+from src.database.partitions import lessons_source
+
+# Layouts of heatmap(): dimensions of the matrix before the week axis
+HEATMAP_LAYOUTS = {
+    'city_module': ('city', 'module'),
+    'teacher': ('teacher',)
+}
+
+# Reference tables of the dimensions
+DIMENSION_TABLES = {
+    'city': 'cities',
+    'module': 'modules',
+    'teacher': 'teachers',
+    'tenant': 'tenants'
+}
+
+# Day numbers are days since 1970-01-01, which was a Thursday
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+EPOCH_WEEKDAY = 3
+
+
+# Whether NumPy is installed, checked once by heatmap_available()
+_numpy_available = {}
+
+
+def heatmap_available():
+    """Return True if NumPy is installed, without importing it."""
+    if 'numpy' not in _numpy_available:
+        _numpy_available['numpy'] = importlib.util.find_spec('numpy') is not None
+    return _numpy_available['numpy']
+
+
+def day_number(date):
+    """Return the day number of a datetime.date."""
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def week_start(day):
+    """Return the day number of the Monday of the week of a day number."""
+    return day - (day + EPOCH_WEEKDAY) % 7
+
+
+def heatmap_weeks(start_date, end_date):
+    """Return the number of weeks (Monday to Sunday) a date range touches."""
+    return (week_start(day_number(end_date)) - week_start(day_number(start_date))) // 7 + 1
+
+
+def day_date(day):
+    """Return the datetime.date of a day number."""
+    return datetime.date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+class LessonCodes:
+    """Integer-coded lessons of one data generation in NumPy columns sorted by day."""
+
+    def __init__(self, generation, rows, names):
+        import numpy as np
+
+        data = np.array(rows, dtype=np.int64).reshape(-1, 5)
+        data = data[np.argsort(data[:, 0], kind='stable')]
+
+        self.generation = generation
+        self.day = np.ascontiguousarray(data[:, 0])
+        self.columns = {
+            'city': np.ascontiguousarray(data[:, 1], dtype=np.int32),
+            'module': np.ascontiguousarray(data[:, 2], dtype=np.int32),
+            'teacher': np.ascontiguousarray(data[:, 3], dtype=np.int32),
+            'tenant': np.ascontiguousarray(data[:, 4], dtype=np.int32)
+        }
+        # Dimension -> {ID: name}
+        self.names = names
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def load(cls, generation):
+        """Fetch all lessons with one query, lessons without a valid date are skipped."""
+        with operations.read_snapshot():
+            conn = operations.get_connection()
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f'''
+            SELECT CAST(strftime('%s', l.date) AS INTEGER) / 86400, l.city_id, t.module_id, l.teacher_id, l.tenant_id
+            FROM {lessons_source()} l
+            JOIN topics t ON l.topic_id = t.id
+            WHERE strftime('%s', l.date) IS NOT NULL
+            ''')
+            rows = cursor.fetchall()
+
+            names = {}
+            for dimension, table in DIMENSION_TABLES.items():
+                cursor.execute(f"SELECT id, name FROM {table}")
+                names[dimension] = dict(cursor.fetchall())
+            conn.close()
+
+        return cls(generation, rows, names)
+
+    def heatmap(self, layout, start_date, end_date, module_id=None, city_id=None, tenant_id=None):
+        """Count lessons per week in a dense matrix.
+
+        Args:
+            layout (str): Layout from HEATMAP_LAYOUTS.
+            start_date (datetime.date): First day of the range.
+            end_date (datetime.date): Last day of the range.
+            module_id (int, optional): Module ID to filter by.
+            city_id (int, optional): City ID to filter by.
+            tenant_id (int, optional): Tenant ID to filter by.
+
+        Returns:
+            dict: Axis labels and the count matrix with dimensions of the
+                layout followed by weeks. Rows and columns are the cities,
+                modules or teachers with lessons in the range, ordered by ID.
+        """
+        import numpy as np
+
+        first_day = day_number(start_date)
+        last_day = day_number(end_date)
+        first_week = week_start(first_day)
+        weeks = heatmap_weeks(start_date, end_date)
+
+        # Date range is a slice of the sorted day column
+        low = np.searchsorted(self.day, first_day, side='left')
+        high = np.searchsorted(self.day, last_day, side='right')
+        day = self.day[low:high]
+        columns = {dimension: column[low:high] for dimension, column in self.columns.items()}
+
+        mask = None
+        for dimension, value in (('module', module_id), ('city', city_id), ('tenant', tenant_id)):
+            if value:
+                condition = columns[dimension] == value
+                mask = condition if mask is None else mask & condition
+        if mask is not None:
+            day = day[mask]
+            columns = {dimension: column[mask] for dimension, column in columns.items()}
+
+        dimensions = HEATMAP_LAYOUTS[layout]
+        axes = {}
+        indexes = []
+        shape = []
+        for dimension in dimensions:
+            ids, codes = np.unique(columns[dimension], return_inverse=True)
+            names = self.names[dimension]
+            axes[dimension] = [{'id': int(item), 'name': names.get(int(item))} for item in ids]
+            indexes.append(codes.reshape(-1))
+            shape.append(len(ids))
+        indexes.append((day - first_week) // 7)
+        shape.append(weeks)
+
+        size = int(np.prod(shape))
+        if size and len(day):
+            flat = np.ravel_multi_index(indexes, shape)
+            counts = np.bincount(flat, minlength=size).reshape(shape)
+        else:
+            counts = np.zeros(shape, dtype=np.int64)
+
+        return {
+            'dimensions': list(dimensions) + ['week'],
+            'weeks': [day_date(first_week + 7 * week).isoformat() for week in range(weeks)],
+            'axes': axes,
+            'counts': counts.tolist(),
+            'total': int(counts.sum())
+        }
+
+
+# Lesson codes of the last loaded generation
+_current = {'codes': None}
+_load_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Drop the lock state inherited from the parent process."""
+    global _load_lock
+    _load_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_lesson_codes():
+    """Return the lesson codes of the current data generation, loading them once per generation."""
+    generation = current_generation()
+    codes = _current['codes']
+    if codes is not None and codes.generation == generation:
+        return codes
+
+    with _load_lock:
+        codes = _current['codes']
+        if generation_pinned() and codes is not None and codes.generation > generation:
+            # Published during the pinned reads, load their generation separately
+            return pinned_value('lesson_codes', LessonCodes.load)
+        if codes is None or codes.generation != generation:
+            started = time.perf_counter()
+            codes = LessonCodes.load(generation)
+            _current['codes'] = codes
+            logging.info("Loaded heatmap codes of generation %s: %d lessons in %.2f s",
+                         generation, len(codes), time.perf_counter() - started)
+        return codes
+
+
+def get_heatmap(layout, start_date, end_date, module_id=None, city_id=None, tenant_id=None):
+    """Count lessons per week by city and module or by teacher, see LessonCodes.heatmap()."""
+    return get_lesson_codes().heatmap(layout, start_date, end_date, module_id, city_id, tenant_id)
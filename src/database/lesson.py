@@ -0,0 +1,91 @@
+"""
+Lesson record passed from the parsers to save_lessons_to_db().
+
+A parsed report can hold many thousands of lessons, so a lesson is a
+slotted object instead of a dictionary, and its string values are
+interned: all lessons of the same teacher, city, topic or date share one
+string object.
+
+Subscription and get() keep working like on the dictionaries used before.
+"""
+import sys
+
+UNKNOWN_TEACHER = "Неизвестный преподаватель"
+UNKNOWN_DATE = "Неизвестная дата"
+UNKNOWN_CITY = "Неизвестный город"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Lesson:
+    """One lesson parsed from a module report page."""
+
+    __slots__ = ('topic', 'module_id', 'city', 'teacher', 'date', 'group_name')
+
+    def __init__(self, topic=None, module_id=None, city=UNKNOWN_CITY, teacher=UNKNOWN_TEACHER,
+                 date=UNKNOWN_DATE, group_name=None):
+        self.topic = topic
+        self.module_id = module_id
+        self.city = city
+        self.teacher = teacher
+        self.date = date
+        self.group_name = group_name
+        self.intern()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a lesson from a dictionary with the same keys."""
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    @classmethod
+    def coerce(cls, lesson):
+        """Return lesson itself if it is a Lesson, otherwise convert a dictionary."""
+        return lesson if isinstance(lesson, cls) else cls.from_dict(lesson)
+
+    def intern(self):
+        """Replace string values by their interned copies.
+
+        Called again after attributes were set one by one.
+        """
+        self.topic = _intern(self.topic)
+        self.city = _intern(self.city)
+        self.teacher = _intern(self.teacher)
+        self.date = _intern(self.date)
+        self.group_name = _intern(self.group_name)
+        return self
+
+    # Dictionary view
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, _intern(value) if key != 'module_id' else value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        if not isinstance(other, Lesson):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Lesson({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
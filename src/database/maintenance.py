@@ -0,0 +1,256 @@
+"""
+Database maintenance for Smart-J Data Collector.
+
+Refreshes query planner statistics (PRAGMA optimize / ANALYZE), returns
+free pages to the file system with incremental vacuum, checks integrity
+and reports the health of the database file: page count, free list,
+size and fragmentation of every table and index.
+
+Run with `python collect_data.py maintenance`; the quick part (optimize
+and incremental vacuum) also runs after every ingest when
+MAINTENANCE_AFTER_INGEST is set.
+"""
+import logging
+import os
+import sqlite3
+import time
+from src.config import DB_PATH, MAINTENANCE_AFTER_INGEST, MAINTENANCE_VACUUM_PAGES
+from src.utils.metrics import COLLECTOR_REGISTRY
+
+# Values of PRAGMA auto_vacuum
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+DB_PAGES = COLLECTOR_REGISTRY.gauge(
+    'smartj_db_pages', 'Pages of the database file by state', ['state']
+)
+DB_MAINTENANCE_SECONDS = COLLECTOR_REGISTRY.gauge(
+    'smartj_db_maintenance_seconds', 'Duration of the last database maintenance step', ['step']
+)
+
+
+def _connect():
+    """Open a writer connection in autocommit mode, VACUUM cannot run in a transaction."""
+    return sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def _object_stats(conn):
+    """Return size and fragmentation of every table and index.
+
+    Uses the dbstat virtual table. Fragmentation is the share of pages of
+    an object that do not directly follow the previous page in b-tree
+    order, so scans of a fragmented object read the file out of order.
+
+    Returns:
+        list: Dictionaries ordered by size, or None if dbstat is not available.
+    """
+    try:
+        rows = conn.execute('''
+        SELECT s.name, COALESCE(m.type, 'table'), COUNT(*), SUM(s.pgsize), SUM(s.unused)
+        FROM dbstat s
+        LEFT JOIN sqlite_master m ON m.name = s.name
+        GROUP BY s.name
+        ''').fetchall()
+    except sqlite3.Error:
+        return None
+
+    objects = []
+    for name, object_type, pages, size, unused in rows:
+        out_of_order = 0
+        previous = None
+        for (page,) in conn.execute("SELECT pageno FROM dbstat WHERE name = ? ORDER BY path", (name,)):
+            if previous is not None and page != previous + 1:
+                out_of_order += 1
+            previous = page
+        objects.append({
+            'name': name,
+            'type': object_type,
+            'pages': pages,
+            'bytes': size,
+            'unused_bytes': unused,
+            'fragmentation': out_of_order / (pages - 1) if pages > 1 else 0.0
+        })
+
+    objects.sort(key=lambda item: item['bytes'], reverse=True)
+    return objects
+
+
+def database_health(conn=None):
+    """Report page usage and fragmentation of the database.
+
+    Args:
+        conn (sqlite3.Connection, optional): Connection to inspect.
+
+    Returns:
+        dict: File size, page size and counts, free list, auto_vacuum mode
+            and per-object statistics (None without dbstat support).
+    """
+    own_connection = conn is None
+    conn = conn or _connect()
+    try:
+        page_size = _pragma(conn, 'page_size')
+        page_count = _pragma(conn, 'page_count')
+        freelist_count = _pragma(conn, 'freelist_count')
+        health = {
+            'file_bytes': os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else 0,
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_count': freelist_count,
+            'free_ratio': freelist_count / page_count if page_count else 0.0,
+            'auto_vacuum': AUTO_VACUUM_MODES.get(_pragma(conn, 'auto_vacuum'), 'unknown'),
+            'objects': _object_stats(conn)
+        }
+    finally:
+        if own_connection:
+            conn.close()
+
+    DB_PAGES.set(page_count - freelist_count, state='used')
+    DB_PAGES.set(freelist_count, state='free')
+    return health
+
+
+def integrity_check(conn):
+    """Run PRAGMA integrity_check.
+
+    Returns:
+        list: Problems found, empty if the database is intact.
+    """
+    problems = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+    return [] if problems == ['ok'] else problems
+
+
+def incremental_vacuum(conn, pages=MAINTENANCE_VACUUM_PAGES):
+    """Return free pages to the file system.
+
+    Only works on databases with auto_vacuum = INCREMENTAL, see
+    run_maintenance(full_vacuum=True) for older databases.
+
+    Args:
+        conn (sqlite3.Connection): Writer connection.
+        pages (int): Maximum number of pages to free, 0 frees all.
+
+    Returns:
+        int: Number of freed pages.
+    """
+    if _pragma(conn, 'auto_vacuum') != 2:
+        return 0
+
+    before = _pragma(conn, 'freelist_count')
+    # The pragma frees one page per step, but the sqlite3 module steps a
+    # statement without result rows only once: free one page per statement
+    # in a single transaction
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for _ in range(min(pages, before) if pages else before):
+            conn.execute("PRAGMA incremental_vacuum(1)")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    return before - _pragma(conn, 'freelist_count')
+
+
+def _timed(step, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    DB_MAINTENANCE_SECONDS.set(time.perf_counter() - started, step=step)
+    return result
+
+
+def run_maintenance(analyze=True, vacuum=True, full_vacuum=False, integrity=True):
+    """Run database maintenance.
+
+    Args:
+        analyze (bool): Rebuild planner statistics of all indexes with ANALYZE,
+            otherwise only PRAGMA optimize is run.
+        vacuum (bool): Run an incremental vacuum.
+        full_vacuum (bool): Rebuild the whole file with VACUUM. Switches an
+            older database to auto_vacuum = INCREMENTAL and removes fragmentation,
+            but needs free disk space of the database size and blocks writers.
+        integrity (bool): Run PRAGMA integrity_check.
+
+    Returns:
+        dict: Health before and after, integrity problems and freed pages.
+    """
+    conn = _connect()
+    try:
+        report = {'before': database_health(conn), 'integrity': None, 'freed_pages': 0}
+
+        if integrity:
+            report['integrity'] = _timed('integrity_check', integrity_check, conn)
+            if report['integrity']:
+                logging.error("Database integrity check failed: %s", '; '.join(report['integrity'][:10]))
+
+        if full_vacuum:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            _timed('vacuum', conn.execute, "VACUUM")
+        elif vacuum:
+            report['freed_pages'] = _timed('incremental_vacuum', incremental_vacuum, conn)
+
+        if analyze:
+            _timed('analyze', conn.execute, "ANALYZE")
+        else:
+            _timed('optimize', conn.execute, "PRAGMA optimize")
+
+        report['after'] = database_health(conn)
+    finally:
+        conn.close()
+
+    logging.info("Database maintenance done: %d of %d pages free before, %d of %d after",
+                 report['before']['freelist_count'], report['before']['page_count'],
+                 report['after']['freelist_count'], report['after']['page_count'])
+    return report
+
+
+def maintain_after_ingest():
+    """Quick maintenance after an ingest: PRAGMA optimize and incremental vacuum.
+
+    Does nothing unless MAINTENANCE_AFTER_INGEST is set. Errors are logged,
+    they must not fail the ingest.
+    """
+    if not MAINTENANCE_AFTER_INGEST:
+        return
+
+    try:
+        conn = _connect()
+        try:
+            _timed('optimize', conn.execute, "PRAGMA optimize")
+            freed = _timed('incremental_vacuum', incremental_vacuum, conn)
+            page_count = _pragma(conn, 'page_count')
+            freelist_count = _pragma(conn, 'freelist_count')
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.error("Database maintenance after ingest failed: %s", e)
+        return
+
+    DB_PAGES.set(page_count - freelist_count, state='used')
+    DB_PAGES.set(freelist_count, state='free')
+    if freed:
+        logging.info("Incremental vacuum freed %d pages", freed)
+
+
+def format_health(health):
+    """Format database health as text."""
+    lines = [
+        f"File size:     {health['file_bytes'] / 1024 / 1024:.1f} MiB",
+        f"Pages:         {health['page_count']} x {health['page_size']} bytes",
+        f"Free list:     {health['freelist_count']} pages ({health['free_ratio']:.1%})",
+        f"Auto vacuum:   {health['auto_vacuum']}"
+    ]
+
+    if health['objects'] is None:
+        lines.append("Table and index sizes are not available (SQLite without dbstat)")
+        return '\n'.join(lines)
+
+    lines.append('')
+    header = f"{'object':<36} {'type':<6} {'pages':>8} {'KiB':>10} {'fill':>6} {'fragm.':>7}"
+    lines.extend([header, '-' * len(header)])
+    for item in health['objects']:
+        fill = 1 - item['unused_bytes'] / item['bytes'] if item['bytes'] else 0.0
+        lines.append(f"{item['name']:<36} {item['type']:<6} {item['pages']:>8} {item['bytes'] / 1024:>10.1f} "
+                     f"{fill:>6.0%} {item['fragmentation']:>7.0%}")
+    return '\n'.join(lines)
@@ -3,11 +3,145 @@ Database operations for Smart-J Data Collector.
 """
 import sqlite3
 import logging
-from src.config import DB_PATH
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from src.config import DB_PATH, READER_POOL_SIZE, DEFAULT_TENANT
+from src.database.lesson import Lesson
+from src.database.partitions import (
+    archive_query, archive_source, attach_archives, hot_source, hot_start, lessons_source
+)
+from src.utils.metrics import REGISTRY
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'smartj_db_query_seconds', 'Time spent in database read functions', ['function']
+)
+
+# Idle reader connections reused by read_snapshot()
+_reader_pool = queue.LifoQueue(maxsize=READER_POOL_SIZE)
+
+# Snapshot connection of the current thread, set inside read_snapshot()
+_local = threading.local()
+
+# The single connection all writes of this process go through, see writer_connection()
+_writer = {'connection': None, 'pid': None}
+_writer_lock = threading.Lock()
+
+class _BorrowedConnection:
+    """Connection of a read snapshot handed out by get_connection().
+
+    Closing it is a no-op, the connection is owned by read_snapshot().
+    """
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        pass
+
+def _close_reader_pool():
+    """Close idle reader connections, so that forked workers do not inherit them."""
+    while True:
+        try:
+            _reader_pool.get_nowait().close()
+        except queue.Empty:
+            break
+    _close_writer()
+
+def _close_writer():
+    """Close the writer connection of this process."""
+    conn = _writer['connection']
+    if conn is not None:
+        conn.close()
+        _writer['connection'] = None
+
+def _reset_after_fork():
+    """Drop the snapshot and writer state inherited from the parent process."""
+    global _local, _writer_lock
+    _local = threading.local()
+    _writer_lock = threading.Lock()
+
+# Each pre-forked worker opens its own connections after fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_close_reader_pool, after_in_child=_reset_after_fork)
+
+def timed_query(func):
+    """Record the duration of a database read function in DB_QUERY_SECONDS."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with DB_QUERY_SECONDS.time(function=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
 
 def get_connection():
-    """Get a connection to the database."""
-    return sqlite3.connect(DB_PATH)
+    """Get a connection to the database.
+
+    Inside read_snapshot() the snapshot connection of the current thread
+    is returned instead of a new connection.
+    """
+    snapshot_conn = getattr(_local, 'snapshot_connection', None)
+    if snapshot_conn is not None:
+        return _BorrowedConnection(snapshot_conn)
+    conn = sqlite3.connect(DB_PATH, uri=True)
+    attach_archives(conn)
+    return conn
+
+@contextmanager
+def writer_connection():
+    """Run a write on the writer connection of this process.
+
+    Writes of all threads are serialized on one long-lived connection. The
+    database is switched to WAL mode, so readers keep reading their
+    snapshot while an ingest writes and see its data after the commit.
+    """
+    with _writer_lock:
+        conn = _writer['connection']
+        if conn is None or _writer['pid'] != os.getpid():
+            conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            _writer['connection'] = conn
+            _writer['pid'] = os.getpid()
+        yield conn
+
+@contextmanager
+def read_snapshot():
+    """Run all database reads of the block on one pooled connection.
+
+    The reads share a single read transaction, so they all see the same
+    consistent snapshot of the database. Nested calls reuse the outer
+    snapshot.
+    """
+    if getattr(_local, 'snapshot_connection', None) is not None:
+        yield
+        return
+
+    try:
+        conn = _reader_pool.get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, uri=True)
+
+    conn.row_factory = None
+    attach_archives(conn)
+    conn.execute('BEGIN')
+    _local.snapshot_connection = conn
+    try:
+        yield
+    finally:
+        _local.snapshot_connection = None
+        try:
+            # Nothing was written, just end the read transaction
+            conn.rollback()
+            _reader_pool.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.close()
 
 def get_city_id(cursor, city_name):
     """Get city ID by name, create if not exists."""
@@ -31,6 +165,17 @@ def get_teacher_id(cursor, teacher_name):
         cursor.execute("INSERT INTO teachers (name) VALUES (?)", (teacher_name,))
         return cursor.lastrowid
 
+def get_tenant_id(cursor, tenant_name):
+    """Get tenant ID by name, create if not exists."""
+    cursor.execute("SELECT id FROM tenants WHERE name = ?", (tenant_name,))
+    result = cursor.fetchone()
+    if result:
+        return result[0]
+    else:
+        # If tenant not found, add it
+        cursor.execute("INSERT INTO tenants (name) VALUES (?)", (tenant_name,))
+        return cursor.lastrowid
+
 def get_topic_id(cursor, module_id, topic_title):
     """Get topic ID by module ID and title, create if not exists."""
     cursor.execute("SELECT id FROM topics WHERE module_id = ? AND title = ?", (module_id, topic_title))
@@ -42,56 +187,102 @@ def get_topic_id(cursor, module_id, topic_title):
         cursor.execute("INSERT INTO topics (module_id, title) VALUES (?, ?)", (module_id, topic_title))
         return cursor.lastrowid
 
-def save_lessons_to_db(lessons_data):
-    """Save lessons data to database."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def log_lesson_change(cursor, lesson_id, tenant_id, operation, teacher_id, group_name,
+                      old_teacher_id=None, old_group_name=None):
+    """Append a lesson insert or update to the change log."""
+    cursor.execute(
+        """INSERT INTO lesson_changes
+        (lesson_id, tenant_id, operation, teacher_id, group_name, old_teacher_id, old_group_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (lesson_id, tenant_id, operation, teacher_id, group_name, old_teacher_id, old_group_name)
+    )
+
+def save_lessons_to_db(lessons_data, tenant_name=DEFAULT_TENANT):
+    """Save lessons data of a tenant to database.
 
+    A lesson is identified by topic, city, date and tenant. Existing lessons
+    whose teacher or group changed are updated. Inserts and updates are
+    written to the change log. Only the hot partition is written, lessons
+    of archived years are left unchanged.
+
+    Args:
+        lessons_data (iterable): Lesson records or dictionaries with the same keys.
+        tenant_name (str): Tenant the lessons belong to.
+
+    Returns:
+        tuple: Numbers of new, unchanged existing and updated lessons.
+
+    Raises:
+        Exception: Saving failed; nothing of the tenant was saved.
+    """
     # Counters for statistics
     new_lessons = 0
     existing_lessons = 0
+    updated_lessons = 0
 
-    try:
-        for lesson in lessons_data:
-            # Get city ID
-            city_id = get_city_id(cursor, lesson['city'])
-
-            # Get teacher ID
-            teacher_id = get_teacher_id(cursor, lesson['teacher'])
-
-            # Get topic ID
-            topic_id = get_topic_id(cursor, lesson['module_id'], lesson['topic'])
-
-            # Check if lesson already exists
-            cursor.execute(
-                "SELECT id FROM lessons WHERE topic_id = ? AND city_id = ? AND date = ?",
-                (topic_id, city_id, lesson['date'])
-            )
-            existing_lesson = cursor.fetchone()
-
-            if existing_lesson:
-                # Lesson already exists
-                existing_lessons += 1
-            else:
-                # Add new lesson
-                cursor.execute(
-                    "INSERT INTO lessons (topic_id, city_id, teacher_id, date, group_name) VALUES (?, ?, ?, ?, ?)",
-                    (topic_id, city_id, teacher_id, lesson['date'], lesson.get('group_name'))
-                )
-                new_lessons += 1
+    with writer_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            tenant_id = get_tenant_id(cursor, tenant_name)
+            first_hot_date = hot_start()
 
-        # Save changes
-        conn.commit()
-        logging.info(f"Saved to database: {new_lessons} new lessons, {existing_lessons} already existing")
+            for lesson in map(Lesson.coerce, lessons_data):
+                # Archived years are read-only, their lessons count as existing
+                if first_hot_date and lesson.date < first_hot_date:
+                    existing_lessons += 1
+                    continue
 
-    except Exception as e:
-        logging.error(f"Error saving data to database: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+                # Get city ID
+                city_id = get_city_id(cursor, lesson.city)
+
+                # Get teacher ID
+                teacher_id = get_teacher_id(cursor, lesson.teacher)
 
-    return new_lessons, existing_lessons
+                # Get topic ID
+                topic_id = get_topic_id(cursor, lesson.module_id, lesson.topic)
 
+                # Check if lesson already exists
+                cursor.execute(
+                    "SELECT id, teacher_id, group_name FROM lessons WHERE topic_id = ? AND city_id = ? AND date = ? AND tenant_id = ?",
+                    (topic_id, city_id, lesson.date, tenant_id)
+                )
+                existing_lesson = cursor.fetchone()
+
+                if existing_lesson is None:
+                    # Add new lesson
+                    cursor.execute(
+                        "INSERT INTO lessons (tenant_id, topic_id, city_id, teacher_id, date, group_name) VALUES (?, ?, ?, ?, ?, ?)",
+                        (tenant_id, topic_id, city_id, teacher_id, lesson.date, lesson.group_name)
+                    )
+                    log_lesson_change(cursor, cursor.lastrowid, tenant_id, 'insert', teacher_id, lesson.group_name)
+                    new_lessons += 1
+                elif existing_lesson[1:] != (teacher_id, lesson.group_name):
+                    # Teacher or group of the lesson changed
+                    lesson_id, old_teacher_id, old_group_name = existing_lesson
+                    cursor.execute(
+                        "UPDATE lessons SET teacher_id = ?, group_name = ? WHERE id = ?",
+                        (teacher_id, lesson.group_name, lesson_id)
+                    )
+                    log_lesson_change(cursor, lesson_id, tenant_id, 'update', teacher_id, lesson.group_name,
+                                      old_teacher_id, old_group_name)
+                    updated_lessons += 1
+                else:
+                    # Lesson already exists
+                    existing_lessons += 1
+
+            # Save changes
+            conn.commit()
+            logging.info(f"Saved to database ({tenant_name}): {new_lessons} new lessons, {updated_lessons} updated, "
+                         f"{existing_lessons} already existing")
+
+        except Exception as e:
+            logging.error(f"Error saving data to database: {e}")
+            conn.rollback()
+            raise
+
+    return new_lessons, existing_lessons, updated_lessons
+
+@timed_query
 def get_modules():
     """Get all modules from database."""
     conn = get_connection()
@@ -104,6 +295,20 @@ def get_modules():
     conn.close()
     return modules
 
+@timed_query
+def get_tenants():
+    """Get all tenants from database."""
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT id, name FROM tenants ORDER BY id")
+    tenants = cursor.fetchall()
+
+    conn.close()
+    return tenants
+
+@timed_query
 def get_cities():
     """Get all cities from database."""
     conn = get_connection()
@@ -116,6 +321,7 @@ def get_cities():
     conn.close()
     return cities
 
+@timed_query
 def get_teachers():
     """Get all teachers from database."""
     conn = get_connection()
@@ -128,11 +334,13 @@ def get_teachers():
     conn.close()
     return teachers
 
-def get_teachers_by_city(city_id=None):
+@timed_query
+def get_teachers_by_city(city_id=None, tenant_id=None):
     """Get teachers filtered by city.
     
     Args:
         city_id (int, optional): City ID to filter by. If None, returns all teachers.
+        tenant_id (int, optional): Only teachers with lessons of this tenant.
         
     Returns:
         list: List of teachers dictionaries with id and name.
@@ -141,27 +349,206 @@ def get_teachers_by_city(city_id=None):
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
-    if city_id:
-        # Get teachers who taught in this city
-        query = """
+    if city_id or tenant_id:
+        # Get teachers who taught in this city and/or tenant
+        conditions = []
+        params = []
+        if city_id:
+            conditions.append('l.city_id = ?')
+            params.append(city_id)
+        if tenant_id:
+            conditions.append('l.tenant_id = ?')
+            params.append(tenant_id)
+        query = f"""
         SELECT DISTINCT t.id, t.name
         FROM teachers t
-        JOIN lessons l ON t.id = l.teacher_id
-        WHERE l.city_id = ?
+        JOIN {{source}} l ON t.id = l.teacher_id
+        WHERE {' AND '.join(conditions)}
         ORDER BY t.name
         """
-        cursor.execute(query, (city_id,))
+        cursor.execute(query.format(source=hot_source()), params)
+        teachers = cursor.fetchall()
+
+        # Teachers who taught only in archived years
+        archived = archive_source()
+        if archived:
+            known = {teacher['id'] for teacher in teachers}
+            teachers.extend(teacher for teacher in archive_query(conn, query.format(source=archived), params)
+                            if teacher['id'] not in known)
+            teachers.sort(key=lambda teacher: teacher['name'])
     else:
         # Get all teachers
         cursor.execute("SELECT id, name FROM teachers ORDER BY name")
-        
-    teachers = cursor.fetchall()
+        teachers = cursor.fetchall()
     
     conn.close()
     return teachers
 
-def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=None, end_date=None):
-    """Get lessons with pagination and filtering."""
+# Lessons of a teacher ranked newest first within every module, see get_teacher_lessons()
+TEACHER_LESSONS_RANKED = '''
+WITH ranked AS (
+    SELECT
+        l.id,
+        t.module_id,
+        t.title as topic_title,
+        l.city_id,
+        c.name as city_name,
+        l.teacher_id,
+        tc.name as teacher_name,
+        l.date,
+        l.group_name,
+        COUNT(*) OVER (PARTITION BY t.module_id) as module_count,
+        ROW_NUMBER() OVER (
+            PARTITION BY t.module_id ORDER BY l.date DESC, l.id DESC
+        ) as row_num
+    FROM {source} l
+    JOIN topics t ON l.topic_id = t.id
+    JOIN cities c ON l.city_id = c.id
+    JOIN teachers tc ON l.teacher_id = tc.id
+    WHERE l.teacher_id = ?{filters}
+)
+'''
+
+@timed_query
+def get_teacher_lessons(teacher_id, city_id=None, page=1, per_page=10, tenant_id=None):
+    """Get lessons of a teacher grouped by module, one page per module.
+
+    Per-module counts and the requested page of every module are fetched
+    with a single window-function query instead of a COUNT and a paginated
+    join for each module. The query reads the hot partition; lessons of
+    archived years, which are older than all hot ones, continue the ranking
+    of every module from a cached query over the archives.
+
+    Args:
+        teacher_id (int): Teacher ID.
+        city_id (int, optional): City ID to filter by.
+        page (int): Page number applied to every module.
+        per_page (int): Number of lessons per page.
+        tenant_id (int, optional): Tenant ID to filter by.
+
+    Returns:
+        dict: Teacher name and lessons grouped by module name,
+            or None if the teacher does not exist.
+    """
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        # Get teacher name
+        cursor.execute("SELECT name FROM teachers WHERE id = ?", (teacher_id,))
+        teacher = cursor.fetchone()
+        if not teacher:
+            return None
+
+        city_filter = ''
+        params = [teacher_id]
+        if city_id:
+            city_filter = ' AND l.city_id = ?'
+            params.append(city_id)
+        if tenant_id:
+            city_filter += ' AND l.tenant_id = ?'
+            params.append(tenant_id)
+
+        offset = (page - 1) * per_page
+
+        # The first row of every module is always returned so that modules
+        # whose requested page is empty still report their total count
+        query = TEACHER_LESSONS_RANKED.format(source=hot_source(), filters=city_filter) + '''
+        SELECT
+            m.id as module_id,
+            m.name as module_name,
+            r.id,
+            r.topic_title,
+            r.city_id,
+            r.city_name,
+            r.teacher_id,
+            r.teacher_name,
+            r.date,
+            r.group_name,
+            r.module_count,
+            r.row_num > ? as in_page
+        FROM modules m
+        LEFT JOIN ranked r
+            ON r.module_id = m.id
+            AND (r.row_num = 1 OR (r.row_num > ? AND r.row_num <= ?))
+        ORDER BY m.id, r.row_num
+        '''
+        cursor.execute(query, params + [offset, offset, offset + per_page])
+        rows = cursor.fetchall()
+
+        # Archived lessons up to the end of the page, with their count
+        archive_rows = []
+        archived = archive_source()
+        if archived:
+            archive_query_text = TEACHER_LESSONS_RANKED.format(source=archived, filters=city_filter) + '''
+            SELECT m.name as module_name, r.*
+            FROM ranked r
+            JOIN modules m ON r.module_id = m.id
+            WHERE r.row_num <= ?
+            ORDER BY r.module_id, r.row_num
+            '''
+            archive_rows = archive_query(conn, archive_query_text, params + [offset + per_page])
+    finally:
+        conn.close()
+
+    def lesson_dict(row, module_name):
+        return {
+            'id': row['id'],
+            'module_id': row['module_id'],
+            'module_name': module_name,
+            'topic_title': row['topic_title'],
+            'city_id': row['city_id'],
+            'city_name': row['city_name'],
+            'teacher_id': row['teacher_id'],
+            'teacher_name': row['teacher_name'],
+            'date': row['date'],
+            'group_name': row['group_name']
+        }
+
+    modules = {}
+    for row in rows:
+        module_name = row['module_name']
+
+        if module_name not in modules:
+            total_count = row['module_count'] or 0
+            modules[module_name] = {
+                'count': total_count,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': (total_count + per_page - 1) // per_page if total_count > 0 else 1,
+                'lessons': []
+            }
+
+        if row['id'] is not None and row['in_page']:
+            modules[module_name]['lessons'].append(lesson_dict(row, module_name))
+
+    # Archived lessons are ranked after all hot lessons of their module
+    hot_counts = {name: module['count'] for name, module in modules.items()}
+    for row in archive_rows:
+        module_name = row['module_name']
+        module = modules[module_name]
+        if row['row_num'] == 1:
+            total_count = hot_counts[module_name] + row['module_count']
+            module['count'] = total_count
+            module['total_pages'] = (total_count + per_page - 1) // per_page
+        rank = hot_counts[module_name] + row['row_num']
+        if offset < rank <= offset + per_page:
+            module['lessons'].append(lesson_dict(row, module_name))
+
+    return {
+        'teacher_name': teacher['name'],
+        'modules': modules
+    }
+
+@timed_query
+def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=None, end_date=None, tenant_id=None):
+    """Get lessons with pagination and filtering.
+
+    Lessons of the hot partition are newer than all archived ones, so pages
+    of the newest lessons are read from the hot table alone, archives are
+    only read for pages that extend past it.
+    """
     # start_date and end_date should be in format 'YYYY-MM-DD'
     conn = get_connection()
     conn.row_factory = sqlite3.Row
@@ -171,13 +558,16 @@ def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=No
     query = '''
     SELECT
         l.id,
+        m.id as module_id,
         m.name as module_name,
         t.title as topic_title,
+        l.city_id,
         c.name as city_name,
+        l.teacher_id,
         tc.name as teacher_name,
         l.date,
         l.group_name
-    FROM lessons l
+    FROM {source} l
     JOIN topics t ON l.topic_id = t.id
     JOIN modules m ON t.module_id = m.id
     JOIN cities c ON l.city_id = c.id
@@ -196,6 +586,10 @@ def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=No
         query += ' AND l.city_id = ?'
         params.append(city_id)
 
+    if tenant_id:
+        query += ' AND l.tenant_id = ?'
+        params.append(tenant_id)
+
     if start_date:
         query += ' AND l.date >= ?'
         params.append(start_date)
@@ -204,23 +598,34 @@ def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=No
         query += ' AND l.date <= ?'
         params.append(end_date)
 
-    # Add sorting by date (newest first)
-    query += ' ORDER BY l.date DESC'
-
-    # Get total count
+    # Sorting by date (newest first) and pagination
+    page_query = query + ' ORDER BY l.date DESC LIMIT ? OFFSET ?'
     count_query = f"SELECT COUNT(*) as count FROM ({query})"
-    cursor.execute(count_query, params)
-    total_count = cursor.fetchone()['count']
-
-    # Add pagination
-    query += ' LIMIT ? OFFSET ?'
-    params.extend([per_page, (page - 1) * per_page])
+    offset = (page - 1) * per_page
+
+    # Hot partition first
+    lessons = []
+    hot_count = 0
+    hot = hot_source(start_date, end_date)
+    if hot:
+        cursor.execute(count_query.format(source=hot), params)
+        hot_count = cursor.fetchone()['count']
+        if offset < hot_count:
+            cursor.execute(page_query.format(source=hot), params + [per_page, offset])
+            lessons = cursor.fetchall()
 
-    # Execute query
-    cursor.execute(query, params)
-    lessons = cursor.fetchall()
+    # Archives continue after the last lesson of the hot partition
+    archive_count = 0
+    archived = archive_source(start_date, end_date)
+    if archived:
+        archive_count = archive_query(conn, count_query.format(source=archived), params)[0]['count']
+        missing = per_page - len(lessons)
+        if missing > 0 and offset + len(lessons) < hot_count + archive_count:
+            cursor.execute(page_query.format(source=archived), params + [missing, max(0, offset - hot_count)])
+            lessons += cursor.fetchall()
 
     # Calculate total pages
+    total_count = hot_count + archive_count
     total_pages = (total_count + per_page - 1) // per_page
 
     conn.close()
@@ -235,6 +640,156 @@ def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=No
         }
     }
 
+# Period expressions of get_lesson_timeseries(), periods start on their first day
+TIMESERIES_INTERVALS = {
+    'day': "l.date",
+    'week': "date(l.date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', l.date)"
+}
+
+# Dimensions of get_lesson_timeseries(): (ID column, name column, join)
+TIMESERIES_DIMENSIONS = {
+    'city': ('l.city_id', 'c.name as city_name', 'JOIN cities c ON l.city_id = c.id'),
+    'module': ('t.module_id', 'm.name as module_name', 'JOIN modules m ON t.module_id = m.id'),
+    'teacher': ('l.teacher_id', 'tc.name as teacher_name', 'JOIN teachers tc ON l.teacher_id = tc.id'),
+    'tenant': ('l.tenant_id', 'tn.name as tenant_name', 'JOIN tenants tn ON l.tenant_id = tn.id')
+}
+
+@timed_query
+def get_lesson_timeseries(interval, group_by, start_date, end_date, module_id=None, city_id=None, teacher_id=None,
+                          tenant_id=None):
+    """Count lessons per period, optionally grouped by city, module, teacher and tenant.
+
+    Computed with a single GROUP BY over the date index.
+
+    Args:
+        interval (str): 'day', 'week' or 'month'.
+        group_by (list): Dimensions from TIMESERIES_DIMENSIONS, may be empty.
+        start_date (str): Start date in format 'YYYY-MM-DD'.
+        end_date (str): End date in format 'YYYY-MM-DD'.
+        module_id (int, optional): Module ID to filter by.
+        city_id (int, optional): City ID to filter by.
+        teacher_id (int, optional): Teacher ID to filter by.
+        tenant_id (int, optional): Tenant ID to filter by.
+
+    Returns:
+        list: Dictionaries with period, dimension IDs and names and count,
+            ordered by period.
+    """
+    period = TIMESERIES_INTERVALS[interval]
+
+    columns = [f"{period} as period"]
+    group_columns = ['period']
+    joins = ['JOIN topics t ON l.topic_id = t.id']
+    for dimension in group_by:
+        id_column, name_column, join = TIMESERIES_DIMENSIONS[dimension]
+        columns.append(f"{id_column} as {dimension}_id")
+        columns.append(name_column)
+        group_columns.append(f"{dimension}_id")
+        joins.append(join)
+
+    query = f'''
+    SELECT {', '.join(columns)}, COUNT(*) as count
+    FROM {lessons_source(start_date, end_date)} l
+    {' '.join(joins)}
+    WHERE l.date >= ? AND l.date <= ?
+    '''
+    params = [start_date, end_date]
+
+    if module_id:
+        query += ' AND t.module_id = ?'
+        params.append(module_id)
+
+    if city_id:
+        query += ' AND l.city_id = ?'
+        params.append(city_id)
+
+    if teacher_id:
+        query += ' AND l.teacher_id = ?'
+        params.append(teacher_id)
+
+    if tenant_id:
+        query += ' AND l.tenant_id = ?'
+        params.append(tenant_id)
+
+    query += f" GROUP BY {', '.join(group_columns)} ORDER BY {', '.join(group_columns)}"
+
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute(query, params)
+    series = [dict(row) for row in cursor.fetchall()]
+
+    conn.close()
+    return series
+
+@timed_query
+def get_changes(since=0, limit=1000):
+    """Get lesson changes logged after a cursor.
+
+    The change log is read by its primary key and the lessons of the page
+    are looked up by ID in every partition, so the cost depends only on the
+    number of returned changes. Lessons moved into archive partitions keep
+    their IDs, their changes are returned as well. Every logged change of
+    the page is returned, even if its lesson or names cannot be found
+    (their fields are None), so the cursor never skips past a change.
+
+    Args:
+        since (int): Cursor, ID of the last change the caller has seen.
+        limit (int): Maximum number of changes to return.
+
+    Returns:
+        dict: Changes in log order with the current names of the lesson,
+            the cursor to continue from and whether more changes follow.
+    """
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute(f'''
+    WITH page AS (
+        SELECT * FROM lesson_changes WHERE id > ? ORDER BY id LIMIT ?
+    )
+    SELECT
+        ch.id as cursor,
+        ch.operation,
+        ch.changed_at,
+        ch.lesson_id as id,
+        ch.tenant_id,
+        m.id as module_id,
+        m.name as module_name,
+        t.title as topic_title,
+        l.city_id,
+        c.name as city_name,
+        ch.teacher_id,
+        tc.name as teacher_name,
+        l.date,
+        ch.group_name,
+        ch.old_teacher_id,
+        ch.old_group_name
+    FROM page ch
+    LEFT JOIN (SELECT * FROM {lessons_source()} WHERE id IN (SELECT lesson_id FROM page)) l ON ch.lesson_id = l.id
+    LEFT JOIN topics t ON l.topic_id = t.id
+    LEFT JOIN modules m ON t.module_id = m.id
+    LEFT JOIN cities c ON l.city_id = c.id
+    LEFT JOIN teachers tc ON ch.teacher_id = tc.id
+    ORDER BY ch.id
+    ''', (since, limit + 1))
+    changes = [dict(row) for row in cursor.fetchall()]
+
+    conn.close()
+
+    # One row per logged change, lesson IDs are unique across partitions
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        'changes': changes,
+        'next_cursor': changes[-1]['cursor'] if changes else since,
+        'has_more': has_more
+    }
+
+@timed_query
 def get_database_stats():
     """Get statistics about database."""
     conn = get_connection()
@@ -243,8 +798,11 @@ def get_database_stats():
     stats = {}
 
     # Count lessons
-    cursor.execute("SELECT COUNT(*) FROM lessons")
+    cursor.execute(f"SELECT COUNT(*) FROM {hot_source()}")
     stats['lessons_count'] = cursor.fetchone()[0]
+    archived = archive_source()
+    if archived:
+        stats['lessons_count'] += archive_query(conn, f"SELECT COUNT(*) FROM {archived}")[0][0]
 
     # Count modules
     cursor.execute("SELECT COUNT(*) FROM modules")
@@ -262,15 +820,21 @@ def get_database_stats():
     cursor.execute("SELECT COUNT(*) FROM teachers")
     stats['teachers_count'] = cursor.fetchone()[0]
 
+    # Count tenants
+    cursor.execute("SELECT COUNT(*) FROM tenants")
+    stats['tenants_count'] = cursor.fetchone()[0]
+
     conn.close()
     return stats
 
-def get_weekly_lessons(start_date, end_date):
+@timed_query
+def get_weekly_lessons(start_date, end_date, tenant_id=None):
     """Get lessons for weekly report.
 
     Args:
         start_date (str): Start date in format 'YYYY-MM-DD'
         end_date (str): End date in format 'YYYY-MM-DD'
+        tenant_id (int, optional): Tenant ID to filter by
 
     Returns:
         dict: Lessons grouped by city and module
@@ -287,6 +851,10 @@ def get_weekly_lessons(start_date, end_date):
     cursor.execute("SELECT id, name FROM modules ORDER BY id")
     modules = cursor.fetchall()
 
+    tenant_filter = ' AND l.tenant_id = ?' if tenant_id else ''
+    tenant_params = (tenant_id,) if tenant_id else ()
+    source = lessons_source(start_date, end_date)
+
     # Initialize result structure
     result = {}
     for city in cities:
@@ -299,7 +867,7 @@ def get_weekly_lessons(start_date, end_date):
             module_name = module['name']
 
             # Get lessons for this city and module in the date range
-            query = '''
+            query = f'''
             SELECT
                 l.id,
                 m.name as module_name,
@@ -308,16 +876,16 @@ def get_weekly_lessons(start_date, end_date):
                 tc.name as teacher_name,
                 l.date,
                 l.group_name
-            FROM lessons l
+            FROM {source} l
             JOIN topics t ON l.topic_id = t.id
             JOIN modules m ON t.module_id = m.id
             JOIN cities c ON l.city_id = c.id
             JOIN teachers tc ON l.teacher_id = tc.id
-            WHERE l.city_id = ? AND t.module_id = ? AND l.date >= ? AND l.date <= ?
+            WHERE l.city_id = ? AND t.module_id = ? AND l.date >= ? AND l.date <= ?{tenant_filter}
             ORDER BY l.date
             '''
 
-            cursor.execute(query, (city_id, module_id, start_date, end_date))
+            cursor.execute(query, (city_id, module_id, start_date, end_date) + tenant_params)
             lessons = cursor.fetchall()
 
             # Convert to list of dicts
@@ -0,0 +1,318 @@
+"""
+Per-year partitions of the lessons table.
+
+The lessons table of the main database is the hot partition, all writes
+go there. Finished years are moved by `python collect_data.py archive`
+into read-only archive databases ARCHIVE_DIR/lessons_<year>.db; the
+ARCHIVE_KEEP_YEARS latest years stay hot. Years are archived oldest
+first, so the hot partition holds every lesson from the year after the
+newest archive on.
+
+Every read connection attaches the archives read-only as archive_<year>
+(see attach_archives()). Queries select from lessons_source(start_date,
+end_date) instead of the lessons table: the plain hot table when the
+date range lies after the archived years, which is the case for almost
+all requests, otherwise a UNION ALL of only the partitions that cover
+the range.
+
+Queries without a date range, whose newest rows are all in the hot
+partition, read hot_source() and archive_source() separately instead:
+the hot table keeps its indexes for ORDER BY date LIMIT, and results
+over the archives, which only change when a year is archived, are
+cached by archive_query().
+"""
+import datetime
+import logging
+import os
+import re
+import sqlite3
+from urllib.parse import quote
+from src.config import ARCHIVE_DIR, ARCHIVE_KEEP_YEARS, DB_PATH
+
+# Columns of a lessons partition, in the order of the lessons table
+LESSON_COLUMNS = 'id, tenant_id, topic_id, city_id, teacher_id, date, group_name, created_at'
+
+ARCHIVE_FILE = re.compile(r'^lessons_(\d{4})\.db$')
+
+# SQLite attaches at most 10 databases to a connection (SQLITE_MAX_ATTACHED),
+# one is left free
+MAX_ARCHIVES = 9
+
+# Entries of the archive query cache, it is cleared when full
+ARCHIVE_QUERY_CACHE_SIZE = 1024
+
+# Schema of an archive database, the lessons table without foreign keys
+ARCHIVE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {schema}.lessons (
+    id INTEGER PRIMARY KEY,
+    tenant_id INTEGER NOT NULL DEFAULT 1,
+    topic_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    teacher_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    group_name TEXT,
+    created_at TIMESTAMP,
+    UNIQUE(topic_id, city_id, date, tenant_id)
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_lessons_date ON lessons(date);
+'''
+
+# Archived years, re-read when the archive directory changes
+_catalog = {'stamp': None, 'years': ()}
+
+# Rows of queries over archive partitions by query and parameters, see archive_query()
+_archive_results = {'stamp': None, 'rows': {}}
+
+
+def archive_path(year):
+    """Return the path of the archive database of a year."""
+    return os.path.join(ARCHIVE_DIR, f"lessons_{year}.db")
+
+
+def archived_years():
+    """Return the archived years in ascending order.
+
+    Only the newest MAX_ARCHIVES years are returned, older archives cannot
+    be attached and are not read.
+    """
+    try:
+        stamp = os.stat(ARCHIVE_DIR).st_mtime_ns
+    except OSError:
+        return ()
+    if stamp != _catalog['stamp']:
+        years = sorted(int(match.group(1)) for match in map(ARCHIVE_FILE.match, os.listdir(ARCHIVE_DIR)) if match)
+        if len(years) > MAX_ARCHIVES:
+            logging.error("%d archive databases in %s, only the newest %d can be attached, years %s are not read",
+                          len(years), ARCHIVE_DIR, MAX_ARCHIVES, ', '.join(map(str, years[:-MAX_ARCHIVES])))
+        _catalog['years'] = tuple(years[-MAX_ARCHIVES:])
+        _catalog['stamp'] = stamp
+    return _catalog['years']
+
+
+def hot_start():
+    """Return the first date of the hot partition, or None if nothing is archived."""
+    years = archived_years()
+    return f"{years[-1] + 1}-01-01" if years else None
+
+
+def max_archived_lesson_id():
+    """Return the highest lesson ID in the archive databases, 0 if there are none."""
+    highest_id = 0
+    for year in archived_years():
+        conn = sqlite3.connect(f"file:{quote(archive_path(year))}?mode=ro", uri=True)
+        try:
+            highest_id = max(highest_id, conn.execute("SELECT MAX(id) FROM lessons").fetchone()[0] or 0)
+        finally:
+            conn.close()
+    return highest_id
+
+
+def attach_archives(conn):
+    """Attach the archive databases read-only to a connection, detach removed ones.
+
+    The connection must be opened with uri=True and no transaction open.
+    """
+    years = archived_years()
+    attached = {name for _, name, _ in conn.execute("PRAGMA database_list") if name.startswith('archive_')}
+    wanted = {f"archive_{year}": year for year in years}
+
+    for name in attached - wanted.keys():
+        conn.execute(f"DETACH DATABASE {name}")
+    for name, year in wanted.items():
+        if name not in attached:
+            conn.execute("ATTACH DATABASE ? AS " + name, (f"file:{quote(archive_path(year))}?mode=ro",))
+
+
+def _archive_parts(start_date, end_date):
+    """Return SELECTs of the archive partitions covering a date range, oldest first."""
+    return [
+        f"SELECT {LESSON_COLUMNS} FROM archive_{year}.lessons" for year in archived_years()
+        if not (start_date and start_date > f"{year}-12-31") and not (end_date and end_date < f"{year}-01-01")
+    ]
+
+
+def _hot_part(start_date, end_date):
+    """Return the SELECT of the hot partition part of a date range, None if the range ends before it."""
+    first_hot_date = hot_start()
+    if end_date and end_date < first_hot_date:
+        return None
+    # Rows of archived years left in the hot table while a year is moved are
+    # skipped. The unary + keeps SQLite from using the date index for this
+    # filter alone, which would be slower than scanning the table
+    return f"SELECT {LESSON_COLUMNS} FROM main.lessons WHERE +date >= '{first_hot_date}'"
+
+
+def lessons_source(start_date=None, end_date=None):
+    """Return the FROM expression of the lessons partitions covering a date range.
+
+    Args:
+        start_date (str, optional): First date of the range, 'YYYY-MM-DD'.
+        end_date (str, optional): Last date of the range, 'YYYY-MM-DD'.
+
+    Returns:
+        str: 'lessons' if the range lies in the hot partition, otherwise
+            a parenthesized UNION ALL of the partitions of the range.
+    """
+    first_hot_date = hot_start()
+    if first_hot_date is None or (start_date and start_date >= first_hot_date):
+        return 'lessons'
+
+    parts = _archive_parts(start_date, end_date)
+    hot_part = _hot_part(start_date, end_date)
+    if hot_part:
+        parts.append(hot_part)
+    if not parts:
+        parts.append(f"SELECT {LESSON_COLUMNS} FROM main.lessons WHERE 0")
+    return f"({' UNION ALL '.join(parts)})"
+
+
+def hot_source(start_date=None, end_date=None):
+    """Return the FROM expression of the hot partition part of a date range.
+
+    All lessons of the hot partition are newer than the archived ones.
+
+    Returns:
+        str: 'lessons', a subquery of the hot table that SQLite flattens
+            into the outer query, or None if the range ends before the hot
+            partition.
+    """
+    first_hot_date = hot_start()
+    if first_hot_date is None or (start_date and start_date >= first_hot_date):
+        return 'lessons'
+    hot_part = _hot_part(start_date, end_date)
+    return f"({hot_part})" if hot_part else None
+
+
+def archive_source(start_date=None, end_date=None):
+    """Return the FROM expression of the archive partitions covering a date range.
+
+    Returns:
+        str: A parenthesized UNION ALL of the archives, or None if no
+            archive covers the range.
+    """
+    first_hot_date = hot_start()
+    if first_hot_date is None or (start_date and start_date >= first_hot_date):
+        return None
+    parts = _archive_parts(start_date, end_date)
+    return f"({' UNION ALL '.join(parts)})" if parts else None
+
+
+def archive_query(conn, query, params=()):
+    """Run a query that reads lessons only from archive_source(), caching its rows.
+
+    Archives do not change until a year is archived, which changes the
+    archive directory, so the rows are reused until then.
+
+    Args:
+        conn (sqlite3.Connection): Connection with the archives attached.
+        query (str): SQL query.
+        params (sequence): Query parameters.
+
+    Returns:
+        list: Rows of the query.
+    """
+    archived_years()
+    if _archive_results['stamp'] != _catalog['stamp']:
+        _archive_results['rows'] = {}
+        _archive_results['stamp'] = _catalog['stamp']
+
+    cache = _archive_results['rows']
+    key = (query, tuple(params), conn.row_factory)
+    rows = cache.get(key)
+    if rows is None:
+        rows = conn.execute(query, params).fetchall()
+        if len(cache) >= ARCHIVE_QUERY_CACHE_SIZE:
+            cache.clear()
+        cache[key] = rows
+    return rows
+
+
+def archive_year(conn, year):
+    """Move the lessons of a year from the hot partition into its archive database.
+
+    The archive is filled under a temporary name and renamed when complete,
+    then the rows are deleted from the hot table. An interrupted run is
+    completed by running it again.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the main database in autocommit mode.
+        year (int): Year to archive.
+
+    Returns:
+        int: Number of moved lessons.
+    """
+    path = archive_path(year)
+    target = path if os.path.exists(path) else f"{path}.tmp"
+    if target != path and os.path.exists(target):
+        os.remove(target)
+
+    first_date, last_date = f"{year}-01-01", f"{year}-12-31"
+    conn.execute("ATTACH DATABASE ? AS archive_new", (target,))
+    try:
+        conn.executescript(ARCHIVE_SCHEMA.format(schema='archive_new'))
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(f'''
+        INSERT OR IGNORE INTO archive_new.lessons ({LESSON_COLUMNS})
+        SELECT {LESSON_COLUMNS} FROM main.lessons WHERE date >= ? AND date <= ?
+        ''', (first_date, last_date))
+        copied = cursor.rowcount
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("DETACH DATABASE archive_new")
+
+    # Readers attach the archive from now on and skip its rows in the hot table
+    if target != path:
+        os.replace(target, path)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        moved = conn.execute("DELETE FROM main.lessons WHERE date >= ? AND date <= ?",
+                             (first_date, last_date)).rowcount
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+    logging.info("Archived %d lessons of %d to %s (%d copied)", moved, year, path, copied)
+    return moved
+
+
+def archive_old_years(keep_years=ARCHIVE_KEEP_YEARS, today=None):
+    """Archive all years before the keep_years latest ones, oldest first.
+
+    Years without lessons get no archive. Archiving stops when there are
+    MAX_ARCHIVES archives, the remaining years stay in the hot partition.
+
+    Args:
+        keep_years (int): Number of latest years kept in the hot partition,
+            the current year included.
+        today (datetime.date, optional): Current date.
+
+    Returns:
+        dict: Moved lessons by year.
+    """
+    today = today or datetime.date.today()
+    last_year = today.year - keep_years
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        years = [int(row[0]) for row in conn.execute(
+            "SELECT DISTINCT substr(date, 1, 4) FROM lessons WHERE date GLOB '[0-9][0-9][0-9][0-9]-*' AND date < ?",
+            (f"{last_year + 1}-01-01",)
+        )]
+        moved = {}
+        for year in sorted(years):
+            archives = len(set(archived_years()) | {year})
+            if archives > MAX_ARCHIVES:
+                logging.warning("Not archiving %d and later years, there are already %d archives (maximum %d)",
+                                year, archives - 1, MAX_ARCHIVES)
+                break
+            moved[year] = archive_year(conn, year)
+    finally:
+        conn.close()
+    return moved
@@ -0,0 +1,376 @@
+"""
+In-memory read model of lessons for Smart-J Data Collector web interface.
+
+The lessons table is loaded into compact array columns: integer IDs of
+topic, module, city, teacher and tenant, integer date codes and integer
+group name codes. Dates and group names are dictionary-encoded, every
+distinct string is stored once. Rows are ordered by date and ID, so a
+date range is a slice found by binary search, and posting lists (sorted
+row positions per city, module, teacher and tenant) select the rows of
+a filter without scanning the table.
+
+The model is loaded once per data generation. A new generation is loaded
+by one thread while the others keep serving the previous model, which is
+then replaced by a single assignment.
+
+Enabled with READ_MODEL_ENABLED, otherwise all queries go to SQLite.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from src.config import READ_MODEL_ENABLED
+from src.database import operations
+from src.database.generation import current_generation, generation_pinned
+from src.database.partitions import lessons_source
+from src.utils.metrics import REGISTRY
+
+READ_MODEL_QUERY_SECONDS = REGISTRY.histogram(
+    'smartj_read_model_query_seconds', 'Time spent in read model queries', ['function']
+)
+READ_MODEL_ROWS = REGISTRY.gauge(
+    'smartj_read_model_lessons', 'Lessons loaded into the in-memory read model'
+)
+READ_MODEL_GENERATION = REGISTRY.gauge(
+    'smartj_read_model_generation', 'Data generation of the in-memory read model'
+)
+
+# Dimensions with posting lists: filter name -> column attribute
+DIMENSIONS = {
+    'module_id': 'module_col',
+    'city_id': 'city_col',
+    'teacher_id': 'teacher_col',
+    'tenant_id': 'tenant_col'
+}
+
+# Code of a missing group name
+NO_GROUP = 0
+
+
+class ReadModel:
+    """Lessons of one data generation in dictionary-encoded array columns."""
+
+    def __init__(self, generation):
+        self.generation = generation
+
+        # Columns, one item per lesson, ordered by (date, id)
+        self.id_col = array('q')
+        self.topic_col = array('i')
+        self.module_col = array('i')
+        self.city_col = array('i')
+        self.teacher_col = array('i')
+        self.tenant_col = array('i')
+        self.date_col = array('i')
+        self.group_col = array('i')
+
+        # String tables: codes of dates are in date order
+        self.dates = []
+        self.groups = [None]
+
+        # Reference tables: ID -> name
+        self.modules = {}
+        self.cities = {}
+        self.teachers = {}
+        self.topics = {}
+
+        # Posting lists: dimension -> {ID: sorted row positions}
+        self.postings = {dimension: {} for dimension in DIMENSIONS}
+
+    def __len__(self):
+        return len(self.id_col)
+
+    @classmethod
+    def load(cls, generation, conn=None):
+        """Load the model from the database in one read transaction.
+
+        Args:
+            generation (int): Data generation the model is loaded for.
+            conn (sqlite3.Connection, optional): Connection to read from.
+
+        Returns:
+            ReadModel: Loaded model.
+        """
+        own_connection = conn is None
+        conn = conn or operations.get_connection()
+        model = cls(generation)
+        # Inside read_snapshot() the snapshot transaction is reused
+        own_transaction = not conn.in_transaction
+        try:
+            if own_transaction:
+                conn.execute('BEGIN')
+            cursor = conn.cursor()
+            model.modules = dict(cursor.execute("SELECT id, name FROM modules ORDER BY id"))
+            model.cities = dict(cursor.execute("SELECT id, name FROM cities"))
+            model.teachers = dict(cursor.execute("SELECT id, name FROM teachers"))
+            model.topics = dict(cursor.execute("SELECT id, title FROM topics"))
+
+            cursor.execute(f'''
+            SELECT l.id, l.topic_id, t.module_id, l.city_id, l.teacher_id, l.tenant_id, l.date, l.group_name
+            FROM {lessons_source()} l
+            JOIN topics t ON l.topic_id = t.id
+            ORDER BY l.date, l.id
+            ''')
+            group_codes = {}
+            for lesson_id, topic_id, module_id, city_id, teacher_id, tenant_id, date, group_name in cursor:
+                if not model.dates or model.dates[-1] != date:
+                    model.dates.append(date)
+                if group_name is None:
+                    group_code = NO_GROUP
+                else:
+                    group_code = group_codes.get(group_name)
+                    if group_code is None:
+                        group_code = group_codes[group_name] = len(model.groups)
+                        model.groups.append(group_name)
+
+                model.id_col.append(lesson_id)
+                model.topic_col.append(topic_id)
+                model.module_col.append(module_id)
+                model.city_col.append(city_id)
+                model.teacher_col.append(teacher_id)
+                model.tenant_col.append(tenant_id)
+                model.date_col.append(len(model.dates) - 1)
+                model.group_col.append(group_code)
+        finally:
+            if own_transaction:
+                conn.rollback()
+            if own_connection:
+                conn.close()
+
+        for dimension, column in DIMENSIONS.items():
+            postings = model.postings[dimension]
+            for position, value in enumerate(getattr(model, column)):
+                posting = postings.get(value)
+                if posting is None:
+                    posting = postings[value] = array('i')
+                posting.append(position)
+
+        return model
+
+    def select(self, start_date=None, end_date=None, **filters):
+        """Return positions of matching rows in (date, id) order.
+
+        Args:
+            start_date (str, optional): First date in format 'YYYY-MM-DD'.
+            end_date (str, optional): Last date in format 'YYYY-MM-DD'.
+            **filters: Values of DIMENSIONS, None or 0 means no filter.
+
+        Returns:
+            sequence: Row positions.
+        """
+        low, high = 0, len(self)
+        if start_date:
+            low = bisect_left(self.date_col, bisect_left(self.dates, start_date))
+        if end_date:
+            high = bisect_left(self.date_col, bisect_right(self.dates, end_date))
+
+        filters = [(dimension, value) for dimension, value in filters.items() if value]
+        if not filters:
+            return range(low, max(low, high))
+
+        # Walk the shortest posting list and check the other filters on the columns
+        postings = [self.postings[dimension].get(value, ()) for dimension, value in filters]
+        shortest = min(range(len(filters)), key=lambda i: len(postings[i]))
+        posting = postings[shortest]
+        candidates = posting[bisect_left(posting, low):bisect_left(posting, high)]
+
+        checks = [(getattr(self, DIMENSIONS[dimension]), value)
+                  for i, (dimension, value) in enumerate(filters) if i != shortest]
+        if not checks:
+            return candidates
+        return [position for position in candidates if all(column[position] == value for column, value in checks)]
+
+    def lesson(self, position):
+        """Return a lesson row as a dictionary with the columns of get_lessons()."""
+        module_id = self.module_col[position]
+        city_id = self.city_col[position]
+        teacher_id = self.teacher_col[position]
+        return {
+            'id': self.id_col[position],
+            'module_id': module_id,
+            'module_name': self.modules.get(module_id),
+            'topic_title': self.topics.get(self.topic_col[position]),
+            'city_id': city_id,
+            'city_name': self.cities.get(city_id),
+            'teacher_id': teacher_id,
+            'teacher_name': self.teachers.get(teacher_id),
+            'date': self.dates[self.date_col[position]],
+            'group_name': self.groups[self.group_col[position]]
+        }
+
+    def newest_page(self, positions, page, per_page):
+        """Return lessons of a page of positions, newest first."""
+        end = len(positions) - (page - 1) * per_page
+        if end <= 0 or end > len(positions) or per_page < 1:
+            return []
+        return [self.lesson(positions[i]) for i in range(end - 1, max(0, end - per_page) - 1, -1)]
+
+    def lessons(self, module_id=None, city_id=None, page=1, per_page=10, start_date=None, end_date=None,
+                tenant_id=None):
+        """Same as operations.get_lessons()."""
+        positions = self.select(start_date, end_date, module_id=module_id, city_id=city_id, tenant_id=tenant_id)
+        total_count = len(positions)
+        return {
+            'lessons': self.newest_page(positions, page, per_page),
+            'pagination': {
+                'total_count': total_count,
+                'total_pages': (total_count + per_page - 1) // per_page,
+                'current_page': page,
+                'per_page': per_page
+            }
+        }
+
+    def weekly_lessons(self, start_date, end_date, tenant_id=None):
+        """Same as operations.get_weekly_lessons()."""
+        result = {}
+        cities = sorted(self.cities.items(), key=lambda item: item[1])
+        for _, city_name in cities:
+            result[city_name] = {module_name: [] for module_name in self.modules.values()}
+
+        for position in self.select(start_date, end_date, tenant_id=tenant_id):
+            lesson = self.lesson(position)
+            result[lesson['city_name']][lesson['module_name']].append({
+                'id': lesson['id'],
+                'module_name': lesson['module_name'],
+                'topic_title': lesson['topic_title'],
+                'city_name': lesson['city_name'],
+                'teacher_name': lesson['teacher_name'],
+                'date': lesson['date'],
+                'group_name': lesson['group_name']
+            })
+        return result
+
+    def teachers_by_city(self, city_id=None, tenant_id=None):
+        """Same as operations.get_teachers_by_city()."""
+        if city_id or tenant_id:
+            positions = self.select(city_id=city_id, tenant_id=tenant_id)
+            teacher_ids = {self.teacher_col[position] for position in positions}
+        else:
+            teacher_ids = self.teachers
+        teachers = [{'id': teacher_id, 'name': self.teachers[teacher_id]} for teacher_id in teacher_ids]
+        teachers.sort(key=lambda teacher: teacher['name'])
+        return teachers
+
+    def teacher_lessons(self, teacher_id, city_id=None, page=1, per_page=10, tenant_id=None):
+        """Same as operations.get_teacher_lessons()."""
+        teacher_name = self.teachers.get(teacher_id)
+        if teacher_name is None:
+            return None
+
+        positions = self.select(teacher_id=teacher_id, city_id=city_id, tenant_id=tenant_id)
+        by_module = {module_id: [] for module_id in self.modules}
+        for position in positions:
+            by_module[self.module_col[position]].append(position)
+
+        modules = {}
+        for module_id, module_positions in by_module.items():
+            total_count = len(module_positions)
+            modules[self.modules[module_id]] = {
+                'count': total_count,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': (total_count + per_page - 1) // per_page if total_count > 0 else 1,
+                'lessons': self.newest_page(module_positions, page, per_page)
+            }
+
+        return {
+            'teacher_name': teacher_name,
+            'modules': modules
+        }
+
+
+# Model of the current generation, replaced as a whole on reload
+_current = {'model': None}
+_load_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Do not inherit a lock held by another thread of the parent process."""
+    global _load_lock
+    _load_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_read_model():
+    """Return the read model of the current data generation.
+
+    While a new generation is loaded, other threads get the previous model,
+    except inside pinned_generation(): pinned reads get the model of the
+    pinned generation or None.
+
+    Returns:
+        ReadModel: Current model, or None if the read model is disabled
+            or could not be loaded.
+    """
+    if not READ_MODEL_ENABLED:
+        return None
+
+    generation = current_generation()
+    model = _current['model']
+    if model is not None and model.generation == generation:
+        return model
+
+    # Only the first request blocks, later ones use the old model meanwhile.
+    # Pinned reads (/api/batch) wait, they must not mix generations
+    pinned = generation_pinned()
+    if not _load_lock.acquire(blocking=model is None or pinned):
+        return model
+    try:
+        model = _current['model']
+        if model is None or model.generation != generation:
+            if pinned and model is not None and model.generation > generation:
+                # Published during the pinned reads, they use their database snapshot
+                return None
+            started = time.perf_counter()
+            try:
+                model = ReadModel.load(generation)
+            except Exception as e:
+                logging.error("Failed to load read model of generation %s: %s", generation, e)
+                return None if pinned else _current['model']
+            _current['model'] = model
+            READ_MODEL_ROWS.set(len(model))
+            READ_MODEL_GENERATION.set(generation)
+            logging.info("Loaded read model of generation %s: %d lessons in %.2f s",
+                         generation, len(model), time.perf_counter() - started)
+        return model
+    finally:
+        _load_lock.release()
+
+
+def get_lessons(module_id=None, city_id=None, page=1, per_page=10, start_date=None, end_date=None, tenant_id=None):
+    """Get lessons from the read model, see operations.get_lessons()."""
+    model = get_read_model()
+    if model is None:
+        return operations.get_lessons(module_id, city_id, page, per_page, start_date, end_date, tenant_id)
+    with READ_MODEL_QUERY_SECONDS.time(function='get_lessons'):
+        return model.lessons(module_id, city_id, page, per_page, start_date, end_date, tenant_id)
+
+
+def get_weekly_lessons(start_date, end_date, tenant_id=None):
+    """Get lessons for weekly report from the read model, see operations.get_weekly_lessons()."""
+    model = get_read_model()
+    if model is None:
+        return operations.get_weekly_lessons(start_date, end_date, tenant_id)
+    with READ_MODEL_QUERY_SECONDS.time(function='get_weekly_lessons'):
+        return model.weekly_lessons(start_date, end_date, tenant_id)
+
+
+def get_teachers_by_city(city_id=None, tenant_id=None):
+    """Get teachers from the read model, see operations.get_teachers_by_city()."""
+    model = get_read_model()
+    if model is None:
+        return operations.get_teachers_by_city(city_id, tenant_id)
+    with READ_MODEL_QUERY_SECONDS.time(function='get_teachers_by_city'):
+        return model.teachers_by_city(city_id, tenant_id)
+
+
+def get_teacher_lessons(teacher_id, city_id=None, page=1, per_page=10, tenant_id=None):
+    """Get lessons of a teacher from the read model, see operations.get_teacher_lessons()."""
+    model = get_read_model()
+    if model is None:
+        return operations.get_teacher_lessons(teacher_id, city_id, page, per_page, tenant_id)
+    with READ_MODEL_QUERY_SECONDS.time(function='get_teacher_lessons'):
+        return model.teacher_lessons(teacher_id, city_id, page, per_page, tenant_id)
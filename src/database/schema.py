@@ -4,7 +4,48 @@ Database schema for Smart-J Data Collector.
 import sqlite3
 import os
 import logging
-from src.config import DB_PATH, MODULE_URLS
+from src.config import DB_PATH, MODULE_URLS, DEFAULT_TENANT
+from src.database.partitions import max_archived_lesson_id
+
+# Bump when tables or indexes change, so that ensure_database() reapplies the DDL
+SCHEMA_VERSION = 5
+
+# Lessons of all tenants, a lesson is unique within its tenant. IDs are never
+# reused, also not those of lessons moved into archive partitions
+LESSONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS lessons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id INTEGER NOT NULL DEFAULT 1,
+    topic_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    teacher_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    group_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (tenant_id) REFERENCES tenants(id),
+    FOREIGN KEY (topic_id) REFERENCES topics(id),
+    FOREIGN KEY (city_id) REFERENCES cities(id),
+    FOREIGN KEY (teacher_id) REFERENCES teachers(id),
+    UNIQUE(topic_id, city_id, date, tenant_id)
+)
+'''
+
+# Change log of lessons: operation is 'insert' or 'update', old_* columns
+# hold the values replaced by an update
+CHANGE_LOG_TABLE = '''
+CREATE TABLE IF NOT EXISTS lesson_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lesson_id INTEGER NOT NULL,
+    tenant_id INTEGER NOT NULL,
+    operation TEXT NOT NULL,
+    teacher_id INTEGER NOT NULL,
+    group_name TEXT,
+    old_teacher_id INTEGER,
+    old_group_name TEXT,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lesson_id) REFERENCES lessons(id)
+)
+'''
 
 def create_database():
     """Create database and tables if they don't exist."""
@@ -18,6 +59,11 @@ def create_database():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
+    # Free pages of new databases can be returned by an incremental vacuum,
+    # see src/database/maintenance.py. Must be set before the first table
+    if not db_exists:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
     # Create tables if they don't exist
 
     # Modules table
@@ -56,22 +102,67 @@ def create_database():
     )
     ''')
 
-    # Lessons table
+    # Tenants (Smart-J accounts) table, the default tenant always has ID 1
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lessons (
+    CREATE TABLE IF NOT EXISTS tenants (
         id INTEGER PRIMARY KEY,
-        topic_id INTEGER NOT NULL,
-        city_id INTEGER NOT NULL,
-        teacher_id INTEGER NOT NULL,
-        date TEXT NOT NULL,
-        group_name TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (topic_id) REFERENCES topics(id),
-        FOREIGN KEY (city_id) REFERENCES cities(id),
-        FOREIGN KEY (teacher_id) REFERENCES teachers(id),
-        UNIQUE(topic_id, city_id, date)
+        name TEXT NOT NULL UNIQUE
     )
     ''')
+    cursor.execute('INSERT OR IGNORE INTO tenants (id, name) VALUES (1, ?)', (DEFAULT_TENANT,))
+
+    # Lessons table. The table is rebuilt for databases created before tenants
+    # were added, to change its UNIQUE key (their lessons get the default
+    # tenant), and for databases created before lesson IDs were AUTOINCREMENT
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lessons'")
+    lessons_sql = cursor.fetchone()
+    cursor.execute("PRAGMA table_info(lessons)")
+    lesson_columns = [row[1] for row in cursor.fetchall()]
+    migrate_tenants = bool(lesson_columns) and 'tenant_id' not in lesson_columns
+    migrate_ids = lessons_sql is not None and 'AUTOINCREMENT' not in lessons_sql[0].upper()
+    if migrate_tenants or migrate_ids:
+        # Keep the references of lesson_changes pointing to the lessons table
+        cursor.execute('PRAGMA legacy_alter_table = ON')
+        cursor.execute('ALTER TABLE lessons RENAME TO lessons_before_migration')
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+
+    cursor.execute(LESSONS_TABLE)
+
+    if migrate_tenants or migrate_ids:
+        cursor.execute(f'''
+        INSERT INTO lessons (id, tenant_id, topic_id, city_id, teacher_id, date, group_name, created_at)
+        SELECT id, {'1' if migrate_tenants else 'tenant_id'}, topic_id, city_id, teacher_id, date, group_name, created_at
+        FROM lessons_before_migration
+        ''')
+        cursor.execute('DROP TABLE lessons_before_migration')
+        logging.info("Lessons table migrated (tenants: %s, AUTOINCREMENT IDs: %s)", migrate_tenants, migrate_ids)
+
+    # Index for date range queries and aggregations by date
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lessons_date ON lessons(date)')
+
+    # Append-only log of inserted and changed lessons, read by /api/changes.
+    # The ID is the sync cursor and is never reused. Lessons saved before the
+    # log existed are logged as inserts, so consumers can sync from cursor 0
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lesson_changes'")
+    create_change_log = cursor.fetchone() is None
+    cursor.execute(CHANGE_LOG_TABLE)
+    if create_change_log:
+        cursor.execute('''
+        INSERT INTO lesson_changes (lesson_id, tenant_id, operation, teacher_id, group_name, changed_at)
+        SELECT id, tenant_id, 'insert', teacher_id, group_name, created_at
+        FROM lessons
+        ORDER BY id
+        ''')
+
+    if migrate_ids:
+        # Continue after the highest ID ever used, deleted and archived lessons included
+        cursor.execute("SELECT MAX(lesson_id) FROM lesson_changes")
+        highest_id = max(cursor.fetchone()[0] or 0, max_archived_lesson_id())
+        cursor.execute(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'lessons', 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'lessons')"
+        )
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'lessons'", (highest_id,))
 
     # If database was just created, add initial data
     if not db_exists:
@@ -99,12 +190,36 @@ def create_database():
         ]
         cursor.executemany('INSERT INTO cities (id, name) VALUES (?, ?)', cities)
 
+    # Remember which schema version has been applied
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
     # Save changes and close connection
     conn.commit()
     conn.close()
 
     logging.info(f"Database {'created' if not db_exists else 'updated'} successfully.")
 
+def ensure_database():
+    """Create or update the database only if its schema is out of date.
+
+    Cheaper than create_database() on every start: an up-to-date database
+    costs a single PRAGMA read.
+
+    Returns:
+        bool: True if the schema was created or updated.
+    """
+    if os.path.exists(DB_PATH):
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+        if version >= SCHEMA_VERSION:
+            return False
+
+    create_database()
+    return True
+
 if __name__ == "__main__":
     # Configure logging
     logging.basicConfig(
@@ -0,0 +1,116 @@
+"""
+Cache shared by all web worker processes for Smart-J Data Collector.
+
+Values are stored in a separate SQLite database (SHARED_CACHE_PATH), so a
+value computed by one worker is read by all others and cache memory lives
+in the OS page cache once instead of once per worker. Entries are keyed by
+data generation and entries of older generations are pruned.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from src.config import SHARED_CACHE_ENABLED, SHARED_CACHE_PATH
+from src.utils.metrics import CACHE_REQUESTS
+
+
+class SharedCache:
+    """Key-value cache stored in an SQLite file.
+
+    Connections are opened lazily per process and thread, so the cache is
+    safe to create before a pre-forking server forks its workers.
+    """
+
+    def __init__(self, path=SHARED_CACHE_PATH, enabled=SHARED_CACHE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._local = threading.local()
+        self._pruned_generation = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            value BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''')
+        self._local.connection = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, generation, name='shared'):
+        """Return the cached value of the generation, or None.
+
+        Args:
+            key (str): Cache key.
+            generation (int): Current data generation.
+            name (str): Cache name used in metrics.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND generation = ?", (key, generation)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Shared cache read failed: {e}")
+            row = None
+
+        CACHE_REQUESTS.inc(cache=name, result='hit' if row is not None else 'miss')
+        return row[0] if row is not None else None
+
+    def set(self, key, generation, value):
+        """Store a value for the generation.
+
+        Args:
+            key (str): Cache key.
+            generation (int): Data generation the value was computed from.
+            value (bytes or str): Value to store.
+        """
+        if not self.enabled:
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, generation, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, generation, value, time.time())
+            )
+            if self._pruned_generation != generation:
+                # Entries of older generations are never read again
+                conn.execute("DELETE FROM cache WHERE generation < ?", (generation,))
+                self._pruned_generation = generation
+        except sqlite3.Error as e:
+            # Another worker may hold the write lock, the value is just not cached
+            logging.warning(f"Shared cache write failed: {e}")
+
+    def clear(self):
+        """Remove all entries."""
+        if self.enabled:
+            self._connection().execute("DELETE FROM cache")
+
+    def close(self):
+        """Close the connection of the current thread."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+
+shared_cache = SharedCache()
+
+# Do not let forked workers inherit the connection of the parent
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=shared_cache.close)
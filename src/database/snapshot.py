@@ -0,0 +1,275 @@
+"""
+Columnar lesson snapshots for analytics tools.
+
+After every ingest the lessons of the published data generation are
+exported into an immutable snapshot directory SNAPSHOT_DIR/<generation>:
+
+- one .npy file per integer column, rows ordered by date and ID:
+  id (int64), date (int32, days since 1970-01-01, NO_DATE if unknown),
+  topic_id, module_id, city_id, teacher_id, tenant_id and group (int32),
+- strings.json with the string tables: names of topics, modules, cities,
+  teachers and tenants by ID and the group names indexed by group code
+  (code 0 is a lesson without group),
+- manifest.json with the generation, row count and column types.
+
+The .npy files are written without NumPy, so the collector does not need
+it. Readers memory-map the columns with open_snapshot(): the arrays are
+backed by the files, loading costs no parsing and no copies, and all
+processes reading a snapshot share its pages in the OS page cache.
+
+SNAPSHOT_DIR/latest.json points to the newest snapshot. Only the last
+SNAPSHOT_KEEP snapshots are kept.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from array import array
+from src.config import SNAPSHOT_DIR, SNAPSHOT_EXPORT_ENABLED, SNAPSHOT_KEEP
+from src.database import operations
+from src.database.partitions import lessons_source
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only needed to read snapshots
+    np = None
+
+LATEST_FILE = 'latest.json'
+MANIFEST_FILE = 'manifest.json'
+STRINGS_FILE = 'strings.json'
+
+# Column name -> array typecode, in file order
+COLUMNS = {
+    'id': 'q',
+    'date': 'i',
+    'topic_id': 'i',
+    'module_id': 'i',
+    'city_id': 'i',
+    'teacher_id': 'i',
+    'tenant_id': 'i',
+    'group': 'i'
+}
+
+# Date code of lessons without a valid date
+NO_DATE = -2 ** 31
+
+# String tables: name -> (table, name column)
+STRING_TABLES = {
+    'topics': ('topics', 'title'),
+    'modules': ('modules', 'name'),
+    'cities': ('cities', 'name'),
+    'teachers': ('teachers', 'name'),
+    'tenants': ('tenants', 'name')
+}
+
+# Version of the .npy format written by _write_npy()
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def _npy_descr(typecode):
+    """Return the NumPy dtype string of an array typecode in native byte order."""
+    byte_order = '<' if sys.byteorder == 'little' else '>'
+    return f"{byte_order}i{array(typecode).itemsize}"
+
+
+def _write_npy(path, values):
+    """Write a one-dimensional array as an .npy file (format version 1.0)."""
+    header = repr({'descr': _npy_descr(values.typecode), 'fortran_order': False, 'shape': (len(values),)})
+    # Data starts at a multiple of 64 bytes, the header ends with a newline
+    padding = 64 - (len(NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header = (header + ' ' * (padding % 64) + '\n').encode('latin1')
+    with open(path, 'wb') as f:
+        f.write(NPY_MAGIC)
+        f.write(len(header).to_bytes(2, 'little'))
+        f.write(header)
+        values.tofile(f)
+
+
+def export_snapshot(generation):
+    """Export the lessons of a data generation into a snapshot directory.
+
+    Args:
+        generation (int): Published data generation.
+
+    Returns:
+        str: Path of the snapshot directory.
+    """
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    groups = [None]
+    group_codes = {None: 0}
+    strings = {}
+
+    with operations.read_snapshot():
+        conn = operations.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+
+        for name, (table, column) in STRING_TABLES.items():
+            cursor.execute(f"SELECT id, {column} FROM {table} ORDER BY id")
+            strings[name] = {str(row_id): value for row_id, value in cursor.fetchall()}
+
+        cursor.execute(f'''
+        SELECT l.id, CAST(strftime('%s', l.date) AS INTEGER) / 86400, l.topic_id, t.module_id, l.city_id,
+               l.teacher_id, l.tenant_id, l.group_name
+        FROM {lessons_source()} l
+        JOIN topics t ON l.topic_id = t.id
+        ORDER BY l.date, l.id
+        ''')
+        append = [columns[name].append for name in COLUMNS if name != 'group']
+        group_col = columns['group']
+        for row in cursor:
+            for add, value in zip(append, row):
+                add(NO_DATE if value is None else value)
+            group_name = row[7]
+            code = group_codes.get(group_name)
+            if code is None:
+                code = group_codes[group_name] = len(groups)
+                groups.append(group_name)
+            group_col.append(code)
+        conn.close()
+
+    strings['groups'] = groups
+
+    # Write into a temporary directory and rename it, readers never see a partial snapshot
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, str(generation))
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, values in columns.items():
+        _write_npy(os.path.join(tmp_path, f"{name}.npy"), values)
+    with open(os.path.join(tmp_path, STRINGS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(strings, f, ensure_ascii=False)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'generation': generation,
+            'rows': len(columns['id']),
+            'columns': {name: _npy_descr(typecode) for name, typecode in COLUMNS.items()},
+            'no_date': NO_DATE
+        }, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    latest_path = os.path.join(SNAPSHOT_DIR, LATEST_FILE)
+    with open(f"{latest_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'path': str(generation)}, f)
+    os.replace(f"{latest_path}.tmp", latest_path)
+
+    _remove_old_snapshots(generation)
+    return path
+
+
+def _remove_old_snapshots(generation, keep=SNAPSHOT_KEEP):
+    """Remove all but the newest snapshots.
+
+    Memory-mapped files of removed snapshots stay readable until they are
+    closed, on POSIX systems.
+    """
+    generations = sorted(int(name) for name in os.listdir(SNAPSHOT_DIR) if name.isdigit())
+    for old in generations[:-keep]:
+        if old != generation:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, str(old)), ignore_errors=True)
+
+
+def export_after_ingest(generation):
+    """Export a snapshot after an ingest when SNAPSHOT_EXPORT_ENABLED is set.
+
+    Errors are logged, they must not fail the ingest.
+    """
+    if not SNAPSHOT_EXPORT_ENABLED:
+        return None
+
+    started = time.perf_counter()
+    try:
+        path = export_snapshot(generation)
+    except (OSError, sqlite3.Error) as e:
+        logging.error("Failed to export lesson snapshot of generation %s: %s", generation, e)
+        return None
+    logging.info("Exported lesson snapshot of generation %s to %s in %.2f s",
+                 generation, path, time.perf_counter() - started)
+    return path
+
+
+class Snapshot:
+    """Memory-mapped columns and string tables of a lesson snapshot."""
+
+    def __init__(self, path):
+        if np is None:
+            raise RuntimeError("Reading lesson snapshots requires numpy")
+
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, STRINGS_FILE), encoding='utf-8') as f:
+            strings = json.load(f)
+
+        self.path = path
+        self.generation = self.manifest['generation']
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in self.manifest['columns']
+        }
+        # Name tables by integer ID, group names by group code
+        self.strings = {
+            name: {int(row_id): value for row_id, value in table.items()}
+            for name, table in strings.items() if name != 'groups'
+        }
+        self.groups = strings['groups']
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def __getitem__(self, name):
+        """Return a read-only memory-mapped column."""
+        return self.columns[name]
+
+    def dates(self):
+        """Return the date column as datetime64[D], unknown dates are NaT."""
+        days = self.columns['date']
+        dates = days.astype('datetime64[D]')
+        dates[days == self.manifest['no_date']] = np.datetime64('NaT')
+        return dates
+
+    def names(self, table, ids):
+        """Return the names of the IDs of a column as an object array.
+
+        Args:
+            table (str): String table, e.g. 'cities' for the city_id column.
+            ids (numpy.ndarray): IDs, e.g. snapshot['city_id'].
+        """
+        lookup = self.strings[table]
+        unique_ids, codes = np.unique(ids, return_inverse=True)
+        names = np.array([lookup.get(int(item)) for item in unique_ids], dtype=object)
+        return names[codes.reshape(-1)]
+
+    def group_names(self):
+        """Return the group names of all lessons as an object array."""
+        return np.array(self.groups, dtype=object)[self.columns['group']]
+
+
+def latest_snapshot_path():
+    """Return the directory of the newest snapshot, or None if none was exported."""
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, LATEST_FILE), encoding='utf-8') as f:
+            return os.path.join(SNAPSHOT_DIR, json.load(f)['path'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def open_snapshot(path=None):
+    """Open a lesson snapshot with memory-mapped columns.
+
+    Args:
+        path (str, optional): Snapshot directory, the newest snapshot by default.
+
+    Returns:
+        Snapshot: Opened snapshot.
+    """
+    path = path or latest_snapshot_path()
+    if path is None:
+        raise FileNotFoundError(f"No lesson snapshot in {SNAPSHOT_DIR}")
+    return Snapshot(path)
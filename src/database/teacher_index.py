@@ -0,0 +1,172 @@
+"""
+Teacher name index for the teacher picker of Smart-J Data Collector web interface.
+
+Teacher names are normalized (Unicode NFKC, case folding, ё -> е,
+punctuation and repeated spaces removed) and every word suffix of a name
+is stored in one sorted list, so "иван", "Ивано" and "мария" all find
+"Иванова Мария" by a binary search for the prefix. The cities every
+teacher taught in are kept as sets, so a search can be limited to one
+city without a query.
+
+The index is built once per data generation from the teachers table and
+one DISTINCT query over the lessons of all partitions.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from src.database import operations
+from src.database.generation import current_generation, generation_pinned, pinned_value
+from src.database.partitions import lessons_source
+
+# Characters between words, removed by normalize_name()
+SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_name(name):
+    """Normalize a name or a search query for matching.
+
+    Examples:
+        "  Семёнова  А.В. " -> "семенова а в"
+    """
+    name = unicodedata.normalize('NFKC', name or '').casefold().replace('ё', 'е')
+    return SEPARATORS.sub(' ', name).strip()
+
+
+class TeacherIndex:
+    """Sorted word-prefix index of teacher names of one data generation."""
+
+    def __init__(self, generation, teachers, city_teachers):
+        """Build the index.
+
+        Args:
+            generation (int): Data generation.
+            teachers (iterable): (ID, name) pairs.
+            city_teachers (dict): City ID -> set of IDs of teachers with lessons there.
+        """
+        self.generation = generation
+        # Teachers ordered by normalized name, ID breaks ties
+        self.teachers = sorted(((normalize_name(name), teacher_id, name) for teacher_id, name in teachers))
+        self.city_teachers = city_teachers
+
+        # Every word suffix of every name with the position of its teacher
+        entries = []
+        for position, (normalized, _, _) in enumerate(self.teachers):
+            words = normalized.split(' ')
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), position))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def __len__(self):
+        return len(self.teachers)
+
+    @classmethod
+    def load(cls, generation):
+        """Read teachers and the cities they taught in from the database."""
+        with operations.read_snapshot():
+            conn = operations.get_connection()
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            teachers = cursor.execute("SELECT id, name FROM teachers").fetchall()
+            city_teachers = {}
+            for city_id, teacher_id in cursor.execute(f"SELECT DISTINCT city_id, teacher_id FROM {lessons_source()}"):
+                city_teachers.setdefault(city_id, set()).add(teacher_id)
+            conn.close()
+        return cls(generation, teachers, city_teachers)
+
+    def search(self, query='', city_id=None, page=1, per_page=20):
+        """Find teachers whose name or one of its later words starts with the query.
+
+        Args:
+            query (str): Name prefix, empty for all teachers.
+            city_id (int, optional): Only teachers with lessons in this city.
+            page (int): Page number.
+            per_page (int): Number of teachers per page.
+
+        Returns:
+            dict: Teachers ({'id', 'name'}) of the page ordered by name and pagination.
+        """
+        prefix = normalize_name(query)
+        if prefix:
+            positions = set()
+            index = bisect_left(self.keys, prefix)
+            while index < len(self.keys) and self.keys[index].startswith(prefix):
+                positions.add(self.positions[index])
+                index += 1
+            positions = sorted(positions)
+        else:
+            positions = range(len(self.teachers))
+
+        if city_id:
+            allowed = self.city_teachers.get(city_id, ())
+            positions = [position for position in positions if self.teachers[position][1] in allowed]
+
+        total_count = len(positions)
+        offset = (page - 1) * per_page
+        return {
+            'teachers': [
+                {'id': self.teachers[position][1], 'name': self.teachers[position][2]}
+                for position in positions[offset:offset + per_page]
+            ],
+            'pagination': {
+                'total_count': total_count,
+                'total_pages': (total_count + per_page - 1) // per_page,
+                'current_page': page,
+                'per_page': per_page
+            }
+        }
+
+
+# Index of the last loaded generation
+_current = {'index': None}
+_load_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Drop the lock state inherited from the parent process."""
+    global _load_lock
+    _load_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_teacher_index():
+    """Return the teacher index of the current data generation, building it once per generation.
+
+    While a new generation is indexed, other threads get the previous index,
+    except inside pinned_generation(), which always gets the index of the
+    pinned generation.
+    """
+    generation = current_generation()
+    index = _current['index']
+    if index is not None and index.generation == generation:
+        return index
+
+    pinned = generation_pinned()
+    if not _load_lock.acquire(blocking=index is None or pinned):
+        return index
+    try:
+        index = _current['index']
+        if pinned and index is not None and index.generation > generation:
+            # Published during the pinned reads, index their generation separately
+            return pinned_value('teacher_index', TeacherIndex.load)
+        if index is None or index.generation != generation:
+            started = time.perf_counter()
+            index = TeacherIndex.load(generation)
+            _current['index'] = index
+            logging.info("Built teacher index of generation %s: %d teachers in %.3f s",
+                         generation, len(index), time.perf_counter() - started)
+        return index
+    finally:
+        _load_lock.release()
+
+
+def search_teachers(query='', city_id=None, page=1, per_page=20):
+    """Search teachers by name prefix, see TeacherIndex.search()."""
+    return get_teacher_index().search(query, city_id, page, per_page)
@@ -4,13 +4,19 @@ Authentication module for Smart-J Data Collector.
 import requests
 import logging
 import urllib3
-from src.config import BASE_URL, USERNAME, PASSWORD, HEADERS
+from src.config import BASE_URL, HEADERS
+from src.parsers.credentials import USERNAME, PASSWORD
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def login():
-    """Log in to the website and return the session."""
+def login(username=None, password=None):
+    """Log in to the website and return the session.
+
+    Args:
+        username (str, optional): Account login, SMARTJ_USERNAME by default.
+        password (str, optional): Account password, SMARTJ_PASSWORD by default.
+    """
     session = requests.Session()
     
     try:
@@ -21,8 +27,8 @@ def login():
         
         # Prepare login data
         login_data = {
-            'login': USERNAME,
-            'passw': PASSWORD,
+            'login': username or USERNAME,
+            'passw': password or PASSWORD,
             'auth_mode': 'login'
         }
         
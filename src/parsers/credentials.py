@@ -0,0 +1,26 @@
+"""
+Smart-J account credentials for Smart-J Data Collector.
+
+Loaded from environment variables or the .env file. Only the collector
+imports this module, so the web interface never reads the .env file.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+USERNAME = os.getenv("SMARTJ_USERNAME")
+PASSWORD = os.getenv("SMARTJ_PASSWORD")
+
+
+def tenant_credentials(tenant_name):
+    """Return (username, password) of a tenant.
+
+    Read from SMARTJ_<TENANT>_USERNAME and SMARTJ_<TENANT>_PASSWORD, the
+    default tenant falls back to SMARTJ_USERNAME and SMARTJ_PASSWORD.
+    """
+    prefix = f"SMARTJ_{tenant_name.upper().replace('-', '_')}"
+    return (
+        os.getenv(f"{prefix}_USERNAME", USERNAME),
+        os.getenv(f"{prefix}_PASSWORD", PASSWORD)
+    )
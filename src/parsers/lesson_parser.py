@@ -4,8 +4,29 @@ Lesson parser module for Smart-J Data Collector.
 import re
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
-from src.config import HEADERS, MODULE_URLS
+from src.config import HEADERS, MODULE_URLS, MODULE_IDS, DEFAULT_TENANT, REQUEST_DELAY
+from src.database.lesson import Lesson, UNKNOWN_CITY
+from src.utils.logger import ITEM_LOGGER_NAME
+from src.utils.metrics import COLLECTOR_REGISTRY
+from src.utils.profiler import PROFILER
+
+# Per-topic and per-lesson messages are sampled, see src.utils.logger
+item_logger = logging.getLogger(ITEM_LOGGER_NAME)
+
+FETCH_SECONDS = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_fetch_seconds', 'Duration of the module page fetch', ['module']
+)
+FETCH_BYTES = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_fetch_bytes', 'Size of the fetched module page', ['module']
+)
+LESSONS_PARSED = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_lessons_parsed', 'Lessons parsed from the module page', ['module']
+)
+PARSE_FAILURES = COLLECTOR_REGISTRY.gauge(
+    'smartj_collector_parse_failures', 'Lessons skipped because no city was found', ['module']
+)
 
 def clean_teacher_name(name):
     """
@@ -37,20 +58,23 @@ def clean_teacher_name(name):
 
     return name
 
-def parse_lesson_data(popover_content):
-    """Extract lesson data from popover content."""
-    # Initialize data dictionary
-    data = {
-        'teacher': "Неизвестный преподаватель",
-        'date': "Неизвестная дата",
-        'city': "Неизвестный город",
-        'group_name': None
-    }
+def parse_lesson_data(popover_content, topic=None, module_id=None):
+    """Extract lesson data from popover content.
+
+    Args:
+        popover_content (str): HTML of the lesson popover.
+        topic (str, optional): Topic title of the report row.
+        module_id (int, optional): Module ID of the report page.
+
+    Returns:
+        Lesson: Parsed lesson, unknown values are set to the UNKNOWN_* defaults.
+    """
+    lesson = Lesson(topic, module_id)
 
     # Check if popover_content is not empty
     if not popover_content or len(popover_content.strip()) < 5:
-        logging.warning(f"Empty popover content: {popover_content}")
-        return data
+        logging.warning("Empty popover content: %s", popover_content)
+        return lesson
 
     # Look for date using regular expressions
     date_patterns = [
@@ -66,16 +90,16 @@ def parse_lesson_data(popover_content):
             # Convert date to standard format YYYY-MM-DD
             try:
                 if '-' in date_str:  # Already in YYYY-MM-DD format
-                    data['date'] = date_str
+                    lesson.date = date_str
                 else:  # In DD.MM.YYYY format
                     date_parts = date_str.split('.')
                     if len(date_parts) == 3:
-                        data['date'] = f"{date_parts[2]}-{date_parts[1].zfill(2)}-{date_parts[0].zfill(2)}"
+                        lesson.date = f"{date_parts[2]}-{date_parts[1].zfill(2)}-{date_parts[0].zfill(2)}"
                     else:
-                        data['date'] = date_str
+                        lesson.date = date_str
             except Exception as e:
-                logging.warning(f"Error processing date {date_str}: {e}")
-                data['date'] = date_str
+                logging.warning("Error processing date %s: %s", date_str, e)
+                lesson.date = date_str
             break
 
     # Look for city (branch)
@@ -95,8 +119,8 @@ def parse_lesson_data(popover_content):
             # Take first match and remove extra whitespace
             city_name = re.sub(r'\\s+', ' ', city_matches[0].strip())
             if city_name and len(city_name) > 2:
-                data['city'] = city_name
-                logging.debug(f"Found city: {city_name}")
+                lesson.city = city_name
+                item_logger.debug("Found city: %s", city_name)
                 break
 
     # Look for teacher
@@ -112,8 +136,8 @@ def parse_lesson_data(popover_content):
             # Take first match and clean the teacher name
             teacher_name = clean_teacher_name(teacher_matches[0])
             if teacher_name and len(teacher_name) > 2:
-                data['teacher'] = teacher_name
-                logging.debug(f"Found teacher: {teacher_name}")
+                lesson.teacher = teacher_name
+                item_logger.debug("Found teacher: %s", teacher_name)
                 break
 
     # Look for group information
@@ -128,8 +152,8 @@ def parse_lesson_data(popover_content):
             # Take first match and clean it
             group_name = group_matches[0].strip()
             if group_name:
-                data['group_name'] = group_name
-                logging.debug(f"Found group: {group_name}")
+                lesson.group_name = group_name
+                item_logger.debug("Found group: %s", group_name)
                 break
 
     # If there's an HTML table, try to extract data from it
@@ -149,76 +173,102 @@ def parse_lesson_data(popover_content):
                         # Look for teacher, date, city and group
                         key_lower = key.lower()
                         if ('преподаватель' in key_lower or 'учитель' in key_lower) and value:
-                            data['teacher'] = clean_teacher_name(value)
-                            logging.debug(f"Found teacher in table: {data['teacher']}")
+                            lesson.teacher = clean_teacher_name(value)
+                            item_logger.debug("Found teacher in table: %s", lesson.teacher)
                         elif 'дат' in key_lower and value:
                             # Convert date to standard format YYYY-MM-DD
                             try:
                                 date_parts = value.split('.')
                                 if len(date_parts) == 3:
-                                    data['date'] = f"{date_parts[2]}-{date_parts[1].zfill(2)}-{date_parts[0].zfill(2)}"
+                                    lesson.date = f"{date_parts[2]}-{date_parts[1].zfill(2)}-{date_parts[0].zfill(2)}"
                                 else:
-                                    data['date'] = value
+                                    lesson.date = value
                             except Exception:
-                                data['date'] = value
-                            logging.debug(f"Found date in table: {value}")
+                                lesson.date = value
+                            item_logger.debug("Found date in table: %s", value)
                         elif ('город' in key_lower or 'филиал' in key_lower) and value:
-                            data['city'] = value
-                            logging.debug(f"Found city/branch in table: {value}")
+                            lesson.city = value
+                            item_logger.debug("Found city/branch in table: %s", value)
                         elif 'групп' in key_lower and value:
-                            data['group_name'] = value
-                            logging.debug(f"Found group in table: {value}")
+                            lesson.group_name = value
+                            item_logger.debug("Found group in table: %s", value)
                         # Look for group information in other fields
                         elif any(keyword in key_lower for keyword in ['класс', 'клаc', 'кл.']) and value:
-                            data['group_name'] = value
-                            logging.debug(f"Found class/group in table: {value}")
+                            lesson.group_name = value
+                            item_logger.debug("Found class/group in table: %s", value)
         except Exception as e:
-            logging.warning(f"Error processing HTML table: {e}")
+            logging.warning("Error processing HTML table: %s", e)
 
     # Extract group name from popover content
     group_pattern = r'Группа:\s*([^|<\n]+)'  # Группа: xxx
     group_matches = re.findall(group_pattern, popover_content, re.IGNORECASE)
     if group_matches and group_matches[0].strip():
-        data['group_name'] = group_matches[0].strip()
-        logging.debug(f"Found group in popover content: {data['group_name']}")
+        lesson.group_name = group_matches[0].strip()
+        item_logger.debug("Found group in popover content: %s", lesson.group_name)
 
-    return data
+    return lesson.intern()
 
-def extract_data_from_page(session, module_id, module_url):
-    """Extract lesson data from the specified page."""
-    try:
-        logging.info(f"Getting data from page: {module_url}")
-        response = session.get(module_url, headers=HEADERS, verify=False, timeout=15)
-        logging.info(f"Response status: {response.status_code}")
+def fetch_module_page(session, module_url, module_label, headers=None):
+    """Fetch a module page and record fetch metrics.
 
-        # Save page for debugging
-        with open(f"data/module_{module_id}_page.html", "w", encoding="utf-8") as f:
-            f.write(response.text)
+    Args:
+        session (requests.Session): Authenticated session.
+        module_url (str): URL of the module page.
+        module_label (str): Module name used in metrics.
+        headers (dict, optional): Request headers, HEADERS by default.
+
+    Returns:
+        requests.Response: Response of the module page.
+    """
+    logging.info("Getting data from page: %s", module_url)
+    started = time.perf_counter()
+    with PROFILER.stage('fetch', module_label):
+        response = session.get(module_url, headers=headers or HEADERS, verify=False, timeout=15)
+        PROFILER.add_items('fetch', 1, module_label)
+    FETCH_SECONDS.set(time.perf_counter() - started, module=module_label)
+    FETCH_BYTES.set(len(response.content), module=module_label)
+    logging.info("Response status: %s", response.status_code)
+    return response
+
+def parse_module_page(html, module_id, module_label):
+    """Extract lesson data from the HTML of a module page.
+
+    Args:
+        html (str): Module page.
+        module_id (int): Module ID stored in every lesson.
+        module_label (str): Module name used in metrics.
 
-        # Parse page with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
+    Returns:
+        list: Lesson records, or None if the page has no lessons table
+            (e.g. the session expired and the login page was returned).
+    """
+    # Parse page with BeautifulSoup
+    with PROFILER.stage('soup', module_label):
+        soup = BeautifulSoup(html, 'html.parser')
 
-        # Look for main table with data
-        main_table = soup.find('table', class_='plan-rep')
-        if not main_table:
-            logging.error("Main data table not found")
-            return []
+    # Look for main table with data
+    main_table = soup.find('table', class_='plan-rep')
+    if not main_table:
+        logging.error("Main data table not found")
+        return None
 
-        logging.info("Found main data table")
+    logging.info("Found main data table")
 
-        # Check if there's a header row
-        headers_row = main_table.find('tr')
-        if not headers_row:
-            logging.error("Header row not found")
-            return []
+    # Check if there's a header row
+    headers_row = main_table.find('tr')
+    if not headers_row:
+        logging.error("Header row not found")
+        return None
 
-        # Get all table rows
-        rows = main_table.find_all('tr')
+    # Get all table rows
+    rows = main_table.find_all('tr')
 
-        # List to store lesson data
-        lessons_data = []
+    # List to store lesson data
+    lessons_data = []
+    parse_failures = 0
 
-        # Process each row, starting from the second one (skip header)
+    # Process each row, starting from the second one (skip header)
+    with PROFILER.stage('extract', module_label):
         for row in rows[1:]:
             cells = row.find_all('td')
             if len(cells) < 2:  # Must have at least a topic cell and one city cell
@@ -227,7 +277,7 @@ def extract_data_from_page(session, module_id, module_url):
             # Get lesson topic from first cell
             topic_cell = cells[0]
             topic_title = topic_cell.get_text().strip()
-            logging.info(f"Processing topic: {topic_title}")
+            item_logger.info("Processing topic: %s", topic_title)
 
             # Process all cells except the first one (topic)
             for cell in cells[1:]:
@@ -239,42 +289,78 @@ def extract_data_from_page(session, module_id, module_url):
                     if div.get('data-toggle') == 'popover':
                         # Extract data from data-content attribute
                         popover_content = div.get('data-content', '')
-                        logging.debug(f"Popover content: {popover_content[:100]}...")
+                        item_logger.debug("Popover content: %.100s...", popover_content)
 
                         # Parse data from popover
-                        lesson_data = parse_lesson_data(popover_content)
-
-                        # Add topic and module information
-                        lesson_data['topic'] = topic_title
-                        lesson_data['module_id'] = module_id
+                        with PROFILER.stage('popover', module_label):
+                            lesson = parse_lesson_data(popover_content, topic_title, module_id)
+                        PROFILER.add_items('popover', 1, module_label)
 
                         # City should already be extracted from popover
-                        if 'city' in lesson_data and lesson_data['city'] != "Неизвестный город":
-                            lessons_data.append(lesson_data)
-                            logging.info(f"Found lesson: {lesson_data['city']} - {topic_title} - {lesson_data['date']}")
+                        if lesson.city != UNKNOWN_CITY:
+                            lessons_data.append(lesson)
+                            item_logger.info("Found lesson: %s - %s - %s", lesson.city, topic_title, lesson.date)
                         else:
-                            logging.warning(f"Could not determine city for lesson: {topic_title} - {lesson_data['date']}")
+                            parse_failures += 1
+                            logging.warning("Could not determine city for lesson: %s - %s", topic_title, lesson.date)
+
+    PROFILER.add_items('soup', len(rows), module_label)
+    PROFILER.add_items('extract', len(lessons_data), module_label)
+    logging.info("Module %s: %d lessons found, %d without city", module_label, len(lessons_data), parse_failures)
+    LESSONS_PARSED.set(len(lessons_data), module=module_label)
+    PARSE_FAILURES.set(parse_failures, module=module_label)
+    return lessons_data
+
+def extract_data_from_page(session, module_id, module_url, module_name=None, tenant_name=None):
+    """Extract lesson data from the specified page."""
+    module_label = module_name or str(module_id)
+    page_prefix = f"{tenant_name}_" if tenant_name and tenant_name != DEFAULT_TENANT else ""
+    try:
+        response = fetch_module_page(session, module_url, module_label)
+
+        # Save page for debugging
+        with open(f"data/{page_prefix}module_{module_id}_page.html", "w", encoding="utf-8") as f:
+            f.write(response.text)
 
-        return lessons_data
+        return parse_module_page(response.text, module_id, module_label) or []
 
     except Exception as e:
-        logging.error(f"Error getting data from page {module_url}: {e}")
-        import traceback
-        logging.error(traceback.format_exc())
+        logging.exception("Error getting data from page %s: %s", module_url, e)
         return []
 
-def collect_all_data(session):
-    """Collect data from all modules."""
-    all_lessons_data = []
+def collect_all_data(session, tenant=None):
+    """Collect data from all modules of a tenant.
+
+    Up to tenant.max_workers module pages are fetched at the same time,
+    every worker pauses tenant.request_delay seconds after its request.
+
+    Args:
+        session (requests.Session): Session logged in to the tenant account.
+        tenant (Tenant, optional): Tenant to collect, the default tenant if None.
+
+    Returns:
+        list: Lesson records of all modules.
+    """
+    if tenant is None:
+        module_urls, max_workers, request_delay = MODULE_URLS, 1, REQUEST_DELAY
+        tenant_name, module_label = None, lambda module_name: module_name
+    else:
+        module_urls, max_workers, request_delay = tenant.module_urls, tenant.max_workers, tenant.request_delay
+        tenant_name, module_label = tenant.name, tenant.module_label
 
-    for module_id, (module_name, module_url) in enumerate(MODULE_URLS.items(), 1):
-        logging.info(f"Processing module: {module_name}")
+    def collect_module(module_name):
+        logging.info("Processing module: %s", module_label(module_name))
 
         # Extract data from module page
-        module_lessons = extract_data_from_page(session, module_id, module_url)
-        all_lessons_data.extend(module_lessons)
+        module_lessons = extract_data_from_page(
+            session, MODULE_IDS[module_name], module_urls[module_name], module_label(module_name), tenant_name
+        )
 
         # Pause between requests to avoid overloading the server
-        time.sleep(2)
+        time.sleep(request_delay)
+        return module_lessons
+
+    with ThreadPoolExecutor(max_workers=PROFILER.workers(max_workers)) as executor:
+        results = list(executor.map(collect_module, module_urls))
 
-    return all_lessons_data
+    return [lesson for module_lessons in results for lesson in module_lessons]
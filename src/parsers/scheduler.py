@@ -0,0 +1,196 @@
+"""
+Adaptive module scheduling for the Smart-J collector daemon.
+
+Every module is checked at its own interval. The interval shrinks when a
+check finds changed lessons and grows when it does not, so frequently
+updated modules are fresh while rarely updated ones cost few requests.
+All requests share one budget per time window, which alone limits the
+total, so requests saved on quiet modules are spent on changing ones.
+
+Every tenant has its own schedules and budget. They are saved to
+DAEMON_STATE_FILE (one file per tenant), so a restarted daemon keeps the
+learned intervals and does not overspend.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from src.config import (
+    DEFAULT_TENANT, DAEMON_STATE_FILE, DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL,
+    DAEMON_INITIAL_INTERVAL, DAEMON_SPEEDUP, DAEMON_SLOWDOWN, DAEMON_JITTER,
+    DAEMON_BUDGET_WINDOW, LOGIN_REQUESTS
+)
+
+
+class ModuleSchedule:
+    """Check schedule and change history of one module page."""
+
+    def __init__(self, module_id, name, url, interval=DAEMON_INITIAL_INTERVAL, next_run=0.0,
+                 fingerprint=None, etag=None, last_modified=None, last_changed=None, checks=0, changes=0):
+        self.module_id = module_id
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self.next_run = next_run
+        self.fingerprint = fingerprint
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_changed = last_changed
+        self.checks = checks
+        self.changes = changes
+
+    def to_dict(self):
+        return {
+            'interval': self.interval,
+            'next_run': self.next_run,
+            'fingerprint': self.fingerprint,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'last_changed': self.last_changed,
+            'checks': self.checks,
+            'changes': self.changes
+        }
+
+
+class RequestBudget:
+    """Sliding-window limit on the number of requests sent to Smart-J."""
+
+    def __init__(self, limit, window=DAEMON_BUDGET_WINDOW, sent=()):
+        self.limit = limit
+        self.window = window
+        self._sent = deque(sorted(sent))
+
+    def _expire(self, now):
+        while self._sent and self._sent[0] <= now - self.window:
+            self._sent.popleft()
+
+    def remaining(self, now=None):
+        """Number of requests that can be sent now."""
+        now = time.time() if now is None else now
+        self._expire(now)
+        return max(0, self.limit - len(self._sent))
+
+    def wait_time(self, count=1, now=None):
+        """Seconds until count requests fit into the budget."""
+        now = time.time() if now is None else now
+        missing = count - self.remaining(now)
+        if missing <= 0:
+            return 0.0
+        if count > self.limit:
+            raise ValueError(f"{count} requests never fit into a budget of {self.limit}")
+        return self._sent[missing - 1] + self.window - now
+
+    def spend(self, count=1, now=None):
+        """Record sent requests."""
+        now = time.time() if now is None else now
+        self._sent.extend([now] * count)
+
+    def to_list(self):
+        return list(self._sent)
+
+
+def min_interval(module_count, budget, login_requests=LOGIN_REQUESTS):
+    """Shortest check interval of one module within the request budget.
+
+    The budget is shared by all modules and limits the total, so this is
+    not an equal share per module: it leaves room for one login per window
+    and for checking every other module at DAEMON_MAX_INTERVAL, and gives
+    the rest to the module. When several modules change, they wait for the
+    budget in turn.
+
+    Args:
+        module_count (int): Number of modules checked within the budget.
+        budget (RequestBudget): Request budget of the tenant.
+        login_requests (int): Requests sent by a login.
+    """
+    checks_per_window = math.ceil(budget.window / DAEMON_MAX_INTERVAL)
+    spare = budget.limit - login_requests - (module_count - 1) * checks_per_window
+    if spare <= 0:
+        return DAEMON_MAX_INTERVAL
+    return min(DAEMON_MAX_INTERVAL, max(DAEMON_MIN_INTERVAL, budget.window / spare))
+
+
+def adapt_interval(interval, changed, shortest=DAEMON_MIN_INTERVAL):
+    """Return the next check interval of a module.
+
+    Args:
+        interval (float): Current interval in seconds.
+        changed (bool): Whether the last check found changed lessons.
+        shortest (float): Lower bound of the interval.
+    """
+    interval *= DAEMON_SPEEDUP if changed else DAEMON_SLOWDOWN
+    return min(DAEMON_MAX_INTERVAL, max(shortest, interval))
+
+
+def jittered(interval, jitter=DAEMON_JITTER):
+    """Add a random +/- jitter fraction to an interval."""
+    return interval * (1 + random.uniform(-jitter, jitter))
+
+
+def lessons_fingerprint(lessons):
+    """Return a fingerprint of parsed Lesson records that ignores their order."""
+    rows = sorted(
+        (lesson.topic, lesson.city, lesson.teacher, lesson.date, lesson.group_name or '')
+        for lesson in lessons
+    )
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update('\x1f'.join(row).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def state_file(tenant_name):
+    """Return the schedule state file of a tenant."""
+    if tenant_name == DEFAULT_TENANT:
+        return DAEMON_STATE_FILE
+    root, ext = os.path.splitext(DAEMON_STATE_FILE)
+    return f"{root}_{tenant_name}{ext}"
+
+
+def load_state(tenant, path=None):
+    """Load module schedules and the request budget of a tenant.
+
+    Modules come from the tenant, their saved state is restored by name.
+
+    Args:
+        tenant (Tenant): Tenant to schedule.
+        path (str, optional): State file, state_file() of the tenant by default.
+
+    Returns:
+        tuple: List of ModuleSchedule and RequestBudget.
+    """
+    path = path or state_file(tenant.name)
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    saved = state.get('modules', {})
+    schedules = [
+        ModuleSchedule(tenant.module_ids[name], name, url, **saved.get(name, {}))
+        for name, url in tenant.module_urls.items()
+    ]
+    budget = RequestBudget(limit=tenant.request_budget, sent=state.get('requests', ()))
+    return schedules, budget
+
+
+def save_state(schedules, budget, path):
+    """Save module schedules and the request budget atomically."""
+    state = {
+        'modules': {schedule.name: schedule.to_dict() for schedule in schedules},
+        'requests': budget.to_list()
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error("Failed to save collector schedule: %s", e)
@@ -0,0 +1,83 @@
+"""
+Smart-J accounts (tenants) for Smart-J Data Collector.
+
+Tenants are listed in TENANTS_FILE as a JSON list, for example:
+
+    [
+        {"name": "default", "plan": "r1869~plan"},
+        {"name": "spb", "plan": "r2040~plan", "modules": ["Kids", "Junior"],
+         "max_workers": 2, "request_delay": 1, "request_budget": 96}
+    ]
+
+Credentials are not stored in the file, see tenant_credentials(). Without
+the file the default tenant with all modules is collected.
+"""
+import json
+import logging
+from src.config import (
+    BASE_URL, MODULE_PATHS, MODULE_IDS, DEFAULT_TENANT, DEFAULT_TENANT_PLAN, TENANTS_FILE,
+    REQUEST_DELAY, DAEMON_REQUEST_BUDGET, LOGIN_REQUESTS
+)
+from src.parsers.credentials import tenant_credentials
+
+
+class Tenant:
+    """Smart-J account with its own credentials, module set and request limits."""
+
+    def __init__(self, name, plan, modules=None, max_workers=1, request_delay=REQUEST_DELAY,
+                 request_budget=DAEMON_REQUEST_BUDGET):
+        """Create a tenant.
+
+        Args:
+            request_budget (int, optional): Requests of the collector daemon per
+                budget window, by default as many as a daily run of
+                collect_data.py sends for the modules of the tenant.
+        """
+        unknown = [module for module in modules or () if module not in MODULE_PATHS]
+        if unknown:
+            raise ValueError(f"Unknown modules of tenant {name}: {', '.join(unknown)}")
+
+        self.name = name
+        self.plan = plan
+        self.modules = list(modules or MODULE_PATHS)
+        self.max_workers = max(1, int(max_workers))
+        self.request_delay = float(request_delay)
+        if request_budget is None:
+            request_budget = LOGIN_REQUESTS + len(self.modules)
+        self.request_budget = int(request_budget)
+        self.username, self.password = tenant_credentials(name)
+
+    @property
+    def module_urls(self):
+        """Module names mapped to report URLs of this tenant."""
+        return {name: f"{BASE_URL}/{self.plan}/{MODULE_PATHS[name]}" for name in self.modules}
+
+    @property
+    def module_ids(self):
+        """Module names mapped to module IDs in the database."""
+        return {name: MODULE_IDS[name] for name in self.modules}
+
+    def module_label(self, module_name):
+        """Module name used in metrics and logs, prefixed unless the tenant is the default."""
+        return module_name if self.name == DEFAULT_TENANT else f"{self.name}/{module_name}"
+
+
+def load_tenants(path=TENANTS_FILE):
+    """Load tenants from the tenants file.
+
+    Returns:
+        list: Tenant objects, only the default tenant if the file does not exist.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            items = json.load(f)
+    except FileNotFoundError:
+        return [Tenant(DEFAULT_TENANT, DEFAULT_TENANT_PLAN)]
+
+    names = [item['name'] for item in items]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate tenant names in {path}")
+
+    tenants = [Tenant(**item) for item in items]
+    logging.info("Loaded %d tenants from %s", len(tenants), path)
+    return tenants
@@ -1,26 +1,130 @@
 """
 Logging utilities for Smart-J Data Collector.
+
+In background mode log records are put on a queue and written to the
+console and the log file by a listener thread, so the collector
+and web workers never wait for disk or terminal I/O. Messages are
+formatted by the listener as well, callers pass %-style arguments.
+
+Per-item messages (one per topic or lesson) go to the ITEM_LOGGER_NAME
+logger, which passes only every LOG_ITEM_SAMPLE_RATE-th record of each
+message.
+
+The log file is shared by the collector, the daemon and the web
+processes, so it is not rotated here: rotation by several processes at
+once loses records. It is rotated by logrotate (see smartj-logrotate),
+every process reopens the file when it was moved away.
 """
+import atexit
 import logging
+import logging.handlers
 import os
-from src.config import LOG_DIR, LOG_FILE
+import queue
+from src.config import (
+    LOG_DIR, LOG_FILE, LOG_BACKGROUND, LOG_ITEM_SAMPLE_RATE
+)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Logger for per-topic and per-lesson messages
+ITEM_LOGGER_NAME = 'smartj.items'
+
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only every n-th record of each message, warnings and errors always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counts = {}
+
+    def filter(self, record):
+        if self.rate == 1 or record.levelno >= logging.WARNING:
+            return True
+
+        count = self._counts.get(record.msg, 0)
+        self._counts[record.msg] = count + 1
+        return count % self.rate == 0
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread.
+
+    The queue is never pickled, so records are passed as is and their
+    arguments are merged into the message only when a record is written.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _file_handler():
+    # Reopens the file after logrotate moved it, safe with several writing processes
+    return logging.handlers.WatchedFileHandler(LOG_FILE, encoding='utf-8')
+
+
+def _start_listener(log_queue, handlers):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork, without it the queue grows forever
+    if _listener is not None:
+        _start_listener(_listener.queue, _listener.handlers)
+
+
+def stop_logging():
+    """Write queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level=logging.INFO, background=LOG_BACKGROUND):
+    """Set up logging configuration.
+
+    Args:
+        level (int): Logging level of the root logger.
+        background (bool): Write records from a listener thread.
+
+    Returns:
+        logging.Logger: Root logger.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        # Already configured, e.g. by the web server process
+        return root
 
-def setup_logging(level=logging.INFO):
-    """Set up logging configuration."""
     # Create log directory if it doesn't exist
     os.makedirs(LOG_DIR, exist_ok=True)
-    
-    # Configure logging
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
-    
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [_file_handler(), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if background:
+        log_queue = queue.SimpleQueue()
+        _start_listener(log_queue, handlers)
+        atexit.register(stop_logging)
+        handlers = [DeferredQueueHandler(log_queue)]
+
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=handlers)
+
+    item_logger = logging.getLogger(ITEM_LOGGER_NAME)
+    if not any(isinstance(f, SamplingFilter) for f in item_logger.filters):
+        item_logger.addFilter(SamplingFilter(LOG_ITEM_SAMPLE_RATE))
+
     # Log setup complete
-    logging.info("Logging setup complete")
-    
-    return logging.getLogger()
+    logging.info("Logging setup complete (background: %s)", background)
+
+    return root
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
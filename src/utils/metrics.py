@@ -0,0 +1,332 @@
+"""
+Prometheus-style metrics for Smart-J Data Collector.
+
+A minimal in-process metrics registry rendering the Prometheus text
+exposition format, so no extra dependency is needed.
+
+Under gunicorn every worker has its own registry. Registry.share() makes
+each worker write its samples to a file in a shared directory, and any
+worker serving /metrics merges the files of all processes, like the
+multiprocess mode of prometheus_client: counters and histograms are
+summed, gauges get a pid label.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    """Format labels as {name="value",...}."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _process_alive(pid):
+    """Return True if a process with this pid exists (POSIX only, like gunicorn)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_value(value):
+    """Format a sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class for metrics with optional labels."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """Return label values in the order of labelnames."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        """Remove all samples."""
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """Return the samples as a JSON-serializable list of [labels, value]."""
+        with self._lock:
+            return [[list(map(list, key)), value] for key, value in self._values.items()]
+
+    def merge(self, snapshots):
+        """Merge snapshots of several processes into one dict of values.
+
+        Values of the same labels are summed.
+
+        Args:
+            snapshots (list): (pid, alive, snapshot) tuples.
+        """
+        values = {}
+        for _pid, _alive, snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(map(tuple, key))
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def samples(self, values=None):
+        """Yield (suffix, labels, value) tuples of values, by default of this process."""
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in values.items():
+            yield '', key, value
+
+    def render(self, values=None):
+        """Render the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        for suffix, labels, value in self.samples(values):
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, snapshots):
+        """Keep the values of every live process apart under a pid label."""
+        values = {}
+        for pid, alive, snapshot in snapshots:
+            if not alive:
+                continue
+            for key, value in snapshot:
+                values[tuple(map(tuple, key)) + (('pid', str(pid)),)] = value
+        return values
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(map(list, key)), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def merge(self, snapshots):
+        values = {}
+        for _pid, _alive, snapshot in snapshots:
+            for key, (counts, total) in snapshot:
+                key = tuple(map(tuple, key))
+                merged_counts, merged_total = values.get(key, ([0] * len(self.buckets), 0.0))
+                values[key] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+        return values
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', key + (('le', _format_value(bound)),), cumulative
+            yield '_sum', key, total
+            yield '_count', key, cumulative
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+        # Directory shared with other processes, see share()
+        self._directory = None
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self):
+        """Remove samples of all metrics."""
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self):
+        """Render all metrics in the Prometheus text format.
+
+        When the registry is shared, samples of all processes are merged.
+        Samples of other processes are at most the flush interval old.
+        """
+        if self._directory is None:
+            return ''.join(metric.render() + '\n' for metric in self._metrics)
+
+        processes = self._read_processes()
+        processes[os.getpid()] = self.snapshot()
+        content = ''
+        for metric in self._metrics:
+            snapshots = [
+                (pid, pid == os.getpid() or _process_alive(pid), snapshot.get(metric.name, []))
+                for pid, snapshot in processes.items()
+            ]
+            content += metric.render(metric.merge(snapshots)) + '\n'
+        return content
+
+    def snapshot(self):
+        """Return samples of all metrics by metric name."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def share(self, directory, flush_interval=5):
+        """Share samples with other processes forked after this call.
+
+        Files of previous runs are removed. Before a fork this process
+        writes its samples, the child starts from empty metrics and writes
+        its own samples every flush_interval seconds, so nothing recorded
+        before the fork is counted twice. Call flush() when a process exits
+        to keep its last counts.
+
+        Args:
+            directory (str): Directory for the files of the processes.
+            flush_interval (float): Seconds between writes of a process.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+        self._directory = directory
+        self._flush_interval = flush_interval
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self.flush, after_in_child=self._start_child)
+
+    def flush(self):
+        """Write the samples of this process to the shared directory."""
+        if self._directory is None:
+            return
+        path = os.path.join(self._directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _start_child(self):
+        """Forget the samples of the parent and write own samples periodically."""
+        self.clear()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                # Retried on the next flush
+                pass
+
+    def _read_processes(self):
+        """Return samples written by other processes by pid."""
+        processes = {}
+        for path in glob.glob(os.path.join(self._directory, '*.json')):
+            try:
+                pid = int(os.path.basename(path)[:-len('.json')])
+                with open(path, encoding='utf-8') as f:
+                    processes[pid] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return processes
+
+    def write_file(self, path):
+        """Write rendered metrics to a file atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+# Metrics of the running process (web interface and database)
+REGISTRY = Registry()
+
+# Metrics of one data collection run, written to COLLECTOR_METRICS_FILE
+COLLECTOR_REGISTRY = Registry()
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'smartj_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result']
+)
@@ -0,0 +1,219 @@
+"""
+Stage profiler for Smart-J Data Collector.
+
+Records wall time, CPU time, allocated memory and item counts of the
+collection stages (login, fetch, soup, popover, save, ...) per module.
+Profiling is disabled by default and a disabled stage costs a single
+attribute check, so the instrumentation stays in the collector.
+
+Stages run in tenant and module threads. CPU time is measured per thread;
+allocations are traced for the whole process, so while they are traced
+the collector runs tenants and modules one at a time, see workers().
+
+Profiles are saved as JSON and can be compared with a previous run.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Stages are printed in this order, unknown stages after them
+STAGE_ORDER = ('login', 'fetch', 'soup', 'extract', 'popover', 'save', 'prerender', 'publish', 'snapshot', 'maintenance', 'warmup')
+
+# Module label of stages not related to a module
+TOTAL = '-'
+
+
+class StageStats:
+    """Accumulated measurements of one stage of one module."""
+
+    __slots__ = ('calls', 'wall', 'cpu', 'alloc', 'items')
+
+    def __init__(self, calls=0, wall=0.0, cpu=0.0, alloc=0, items=0):
+        self.calls = calls
+        self.wall = wall
+        self.cpu = cpu
+        self.alloc = alloc
+        self.items = items
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Profiler:
+    """Collects per-stage and per-module measurements of a collection run."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_allocations = False
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def start(self, trace_allocations=True):
+        """Enable profiling and forget previous measurements.
+
+        Args:
+            trace_allocations (bool): Measure allocated memory with
+                tracemalloc, which slows the run down noticeably.
+        """
+        self.stats = {}
+        self.enabled = True
+        self.trace_allocations = trace_allocations
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        """Disable profiling, measurements are kept."""
+        self.enabled = False
+
+    def workers(self, count):
+        """Return the number of threads a thread pool may use.
+
+        1 while allocations are traced: tracemalloc counts the allocations of
+        all threads, so stages of different threads must not overlap.
+
+        Args:
+            count (int): Number of threads without profiling.
+        """
+        if self.enabled and self.trace_allocations:
+            return 1
+        return count
+
+    def _entry(self, stage, module):
+        """Return the stats of a stage, called with the lock held."""
+        key = (stage, module or TOTAL)
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = self.stats[key] = StageStats()
+        return entry
+
+    def stage(self, stage, module=None):
+        """Return a context manager measuring a stage.
+
+        Args:
+            stage (str): Stage name, see STAGE_ORDER.
+            module (str, optional): Module the stage works on.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(stage, module)
+
+    @contextmanager
+    def _measure(self, stage, module):
+        tracing = self.trace_allocations and tracemalloc.is_tracing()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu_started
+            alloc = tracemalloc.get_traced_memory()[0] - memory_before if tracing else 0
+            with self._lock:
+                entry = self._entry(stage, module)
+                entry.calls += 1
+                entry.wall += wall
+                entry.cpu += cpu
+                entry.alloc += alloc
+
+    def add_items(self, stage, count, module=None):
+        """Add processed items (pages, rows, lessons, ...) to a stage."""
+        if self.enabled:
+            with self._lock:
+                self._entry(stage, module).items += count
+
+    def to_dict(self):
+        """Return measurements as {'stages': [...]} suitable for JSON."""
+        return {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'trace_allocations': self.trace_allocations,
+            'stages': [
+                dict(stage=stage, module=module, **entry.to_dict())
+                for (stage, module), entry in list(self.stats.items())
+            ]
+        }
+
+    def save(self, path):
+        """Write measurements to a JSON file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def load_profile(path):
+    """Read a profile written by Profiler.save().
+
+    Returns:
+        dict: Measurements keyed by (stage, module).
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {
+        (item['stage'], item['module']): StageStats(
+            item['calls'], item['wall'], item['cpu'], item['alloc'], item['items']
+        )
+        for item in data['stages']
+    }
+
+
+def _sort_key(key):
+    stage, module = key
+    order = STAGE_ORDER.index(stage) if stage in STAGE_ORDER else len(STAGE_ORDER)
+    return order, stage, module != TOTAL, module
+
+
+def _totals(stats):
+    """Add per-stage totals over all modules."""
+    totals = {}
+    for (stage, module), entry in stats.items():
+        if module == TOTAL:
+            continue
+        total = totals.setdefault((stage, TOTAL), StageStats())
+        for name in StageStats.__slots__:
+            setattr(total, name, getattr(total, name) + getattr(entry, name))
+
+    combined = dict(totals)
+    combined.update(stats)
+    return combined
+
+
+def format_profile(stats, previous=None):
+    """Format measurements as a table, optionally compared with a previous run.
+
+    Args:
+        stats (dict): Measurements keyed by (stage, module).
+        previous (dict, optional): Measurements of a previous run.
+
+    Returns:
+        str: Table with one row per stage total and per module.
+    """
+    stats = _totals(stats)
+    previous = _totals(previous) if previous else None
+
+    header = f"{'stage':<10} {'module':<10} {'calls':>7} {'items':>8} {'wall s':>9} {'cpu s':>9} {'alloc KiB':>10}"
+    if previous is not None:
+        header += f" {'wall prev':>10} {'change':>8}"
+    lines = [header, '-' * len(header)]
+
+    for key in sorted(stats, key=_sort_key):
+        stage, module = key
+        entry = stats[key]
+        line = (f"{stage:<10} {module:<10} {entry.calls:>7} {entry.items:>8} "
+                f"{entry.wall:>9.3f} {entry.cpu:>9.3f} {entry.alloc / 1024:>10.1f}")
+        if previous is not None:
+            before = previous.get(key)
+            if before is None:
+                line += f" {'-':>10} {'new':>8}"
+            elif before.wall > 0:
+                line += f" {before.wall:>10.3f} {(entry.wall - before.wall) / before.wall:>+8.0%}"
+            else:
+                line += f" {before.wall:>10.3f} {'-':>8}"
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+PROFILER = Profiler()
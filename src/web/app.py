@@ -1,65 +1,157 @@
 """
 Web interface for Smart-J Data Collector.
 """
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, Response, current_app, g, render_template, request, jsonify, redirect
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
 import datetime
 import os
-import sqlite3
-from src.config import WEB_HOST, WEB_PORT, ITEMS_PER_PAGE
-from src.database.operations import get_cities, get_lessons, get_weekly_lessons, get_teachers, get_connection, get_teachers_by_city
-
-app = Flask(__name__)
-
-# Set template folder
-template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
-app.template_folder = template_dir
-
-@app.route('/')
+import time
+from urllib.parse import parse_qsl
+from src.config import (
+    WEB_HOST, WEB_PORT, ITEMS_PER_PAGE, BATCH_MAX_REQUESTS, COLLECTOR_METRICS_FILE, CHANGES_PAGE_SIZE,
+    CHANGES_MAX_PAGE_SIZE, TEACHER_SEARCH_PAGE_SIZE, TEACHER_SEARCH_MAX_PAGE_SIZE, HEATMAP_MAX_WEEKS
+)
+from src.database.operations import (
+    get_cities, get_lesson_timeseries, get_tenants, get_changes, read_snapshot,
+    TIMESERIES_DIMENSIONS, TIMESERIES_INTERVALS
+)
+from src.database.generation import pinned_generation
+from src.database.heatmap import HEATMAP_LAYOUTS, get_heatmap, heatmap_available, heatmap_weeks
+from src.database.teacher_index import search_teachers
+from src.database.read_model import get_lessons, get_weekly_lessons, get_teachers_by_city, get_teacher_lessons
+from src.web.events import generation_events
+from src.web.response_cache import cached_json_response, cached_reference
+from src.web.responses import (
+    FORMAT_DICT, LookupEncoder, compress_response, parse_fields, parse_format, serialize_lessons
+)
+from src.web.weekly_cache import load_cached_report
+from src.utils.metrics import REGISTRY
+
+# Template folder
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'smartj_http_request_duration_seconds', 'HTTP request latency by route', ['route', 'method']
+)
+REQUEST_COUNT = REGISTRY.counter(
+    'smartj_http_requests_total', 'HTTP requests by route and status code', ['route', 'method', 'status']
+)
+
+# Routes added to the application by create_app()
+_routes = []
+
+def route(rule, **options):
+    """Register a view function to be added to the application by create_app()."""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+def start_request_timer():
+    """Remember when the request started."""
+    g.request_started = time.perf_counter()
+
+def record_request_metrics(response):
+    """Record request latency and status code."""
+    started = g.pop('request_started', None)
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route=rule, method=request.method)
+    REQUEST_COUNT.inc(route=rule, method=request.method, status=str(response.status_code))
+    return response
+
+@route('/')
 def index():
     """Redirect to Matata page."""
     return redirect('/matata')
 
-@app.route('/matata')
+@route('/matata')
 def matata():
     """Matata module page."""
     # Get cities for filters
-    cities = get_cities()
+    cities = cached_reference('cities', get_cities)
     return render_template('index.html', cities=cities)
 
-@app.route('/kids')
+@route('/kids')
 def kids():
     """Kids module page."""
     # Get cities for filters
-    cities = get_cities()
+    cities = cached_reference('cities', get_cities)
     return render_template('index.html', cities=cities)
 
-@app.route('/junior')
+@route('/junior')
 def junior():
     """Junior module page."""
     # Get cities for filters
-    cities = get_cities()
+    cities = cached_reference('cities', get_cities)
     return render_template('index.html', cities=cities)
 
-@app.route('/tutors')
+@route('/tutors')
 def tutors():
     """Tutors page."""
     # Get cities for filters
-    cities = get_cities()
-    # Get teachers for filters
-    teachers = get_teachers()
-    return render_template('tutors.html', cities=cities, teachers=teachers)
-
-@app.route('/weekly')
-@app.route('/weekly/<start_date>')
+    cities = cached_reference('cities', get_cities)
+    # First page of the teacher picker, further pages come from /api/teachers/search
+    teachers = search_teachers(per_page=TEACHER_SEARCH_PAGE_SIZE)
+    return render_template('tutors.html', cities=cities, teachers=teachers['teachers'],
+                           teachers_pagination=teachers['pagination'])
+
+@route('/weekly')
+@route('/weekly/<start_date>')
 def weekly(start_date=None):
     """Weekly report page.
 
+    Served from the pre-rendered weekly cache when the week is cached,
+    otherwise rendered live.
+
     Args:
         start_date (str, optional): Start date of the week in format 'YYYY-MM-DD'.
             If not provided, the most recent completed week is used.
     """
     today = datetime.date.today()
+    start_date, end_date = resolve_week(start_date, today)
+    tenant_id = request.args.get('tenant_id', type=int)
+
+    # Serve pre-rendered page if available, only reports of all tenants are pre-rendered
+    if not tenant_id:
+        cached_html = load_cached_report(start_date.strftime('%Y-%m-%d'), 'html', today)
+        if cached_html is not None:
+            return cached_html
+
+    return render_weekly_report(build_weekly_report(start_date, end_date, today, tenant_id))
+
+@route('/api/weekly')
+@cached_json_response(('start_date', 'tenant_id'), daily=True)
+def api_weekly():
+    """API for getting weekly report data.
+
+    Served from the pre-rendered weekly cache when the week is cached.
+    """
+    today = datetime.date.today()
+    start_date, end_date = resolve_week(request.args.get('start_date'), today)
+    tenant_id = request.args.get('tenant_id', type=int)
+
+    if not tenant_id:
+        cached_json = load_cached_report(start_date.strftime('%Y-%m-%d'), 'json', today)
+        if cached_json is not None:
+            return current_app.response_class(cached_json, mimetype='application/json')
+
+    report = build_weekly_report(start_date, end_date, today, tenant_id)
+    return jsonify(weekly_report_json(report))
+
+def resolve_week(start_date, today):
+    """Resolve the week to show in the weekly report.
 
+    Args:
+        start_date (str): Start date of the week in format 'YYYY-MM-DD', may be None.
+            Any day of the week is moved to its Monday.
+        today (datetime.date): Current date.
+
+    Returns:
+        tuple: Monday and Sunday of the week as datetime.date. If start_date is
+            not provided or invalid, the most recent completed week is used.
+    """
     if start_date:
         # Parse the provided start date
         try:
@@ -88,7 +180,19 @@ def weekly(start_date=None):
         # Start date is the Monday before end_date
         start_date = end_date - datetime.timedelta(days=6)  # Monday
 
-    # Generate a list of available weeks (12 weeks back from today)
+    return start_date, end_date
+
+def get_available_weeks(today, selected_start_date=None, weeks=12):
+    """Generate a list of weeks available in the weekly report.
+
+    Args:
+        today (datetime.date): Current date.
+        selected_start_date (datetime.date, optional): Start date of the selected week.
+        weeks (int): Maximum number of weeks back from today.
+
+    Returns:
+        list: Weeks from the newest to the oldest.
+    """
     available_weeks = []
 
     # Find the most recent completed week's start date (Monday)
@@ -99,7 +203,7 @@ def weekly(start_date=None):
         most_recent_monday = today - datetime.timedelta(days=days_since_monday)
 
     current_week_start = most_recent_monday
-    for i in range(12):  # Show up to 12 weeks
+    for i in range(weeks):
         week_end = current_week_start + datetime.timedelta(days=6)
 
         # Skip future weeks
@@ -111,29 +215,60 @@ def weekly(start_date=None):
             'start_date': current_week_start.strftime('%Y-%m-%d'),
             'end_date': week_end.strftime('%Y-%m-%d'),
             'display': f"{current_week_start.strftime('%d.%m.%Y')} - {week_end.strftime('%d.%m.%Y')}",
-            'active': current_week_start == start_date
+            'active': current_week_start == selected_start_date
         })
 
         # Move to the previous week
         current_week_start = current_week_start - datetime.timedelta(days=7)
 
+    return available_weeks
+
+def build_weekly_report(start_date, end_date, today, tenant_id=None, weekly_lessons=get_weekly_lessons):
+    """Collect data for the weekly report template.
+
+    Args:
+        start_date (datetime.date): Monday of the week.
+        end_date (datetime.date): Sunday of the week.
+        today (datetime.date): Current date.
+        tenant_id (int, optional): Tenant ID to filter by, all tenants if None.
+        weekly_lessons (callable): Function returning lessons of the week,
+            the read model by default.
+
+    Returns:
+        dict: Template context of weekly.html.
+    """
     # Format dates for database query
     start_date_str = start_date.strftime('%Y-%m-%d')
     end_date_str = end_date.strftime('%Y-%m-%d')
 
     # Get weekly lessons
-    weekly_data = get_weekly_lessons(start_date_str, end_date_str)
+    weekly_data = weekly_lessons(start_date_str, end_date_str, tenant_id)
 
     # Generate calendar data for the month containing the selected week
     calendar_data = generate_calendar_data(start_date, end_date)
 
-    return render_template('weekly.html',
-                           weekly_data=weekly_data,
-                           start_date=start_date.strftime('%d.%m.%Y'),
-                           end_date=end_date.strftime('%d.%m.%Y'),
-                           available_weeks=available_weeks,
-                           calendar_data=calendar_data,
-                           selected_start_date=start_date_str)
+    return {
+        'weekly_data': weekly_data,
+        'start_date': start_date.strftime('%d.%m.%Y'),
+        'end_date': end_date.strftime('%d.%m.%Y'),
+        'available_weeks': get_available_weeks(today, start_date),
+        'calendar_data': calendar_data,
+        'selected_start_date': start_date_str,
+        'selected_end_date': end_date_str,
+        'tenant_id': tenant_id
+    }
+
+def render_weekly_report(report):
+    """Render weekly.html for a report built by build_weekly_report()."""
+    return render_template('weekly.html', **report)
+
+def weekly_report_json(report):
+    """Return the JSON representation of a weekly report."""
+    return {
+        'start_date': report['selected_start_date'],
+        'end_date': report['selected_end_date'],
+        'weekly_data': report['weekly_data']
+    }
 
 def generate_calendar_data(start_date, end_date):
     """Generate calendar data for the month(s) containing the selected week.
@@ -224,200 +359,89 @@ def generate_calendar_data(start_date, end_date):
 
     return calendars
 
-@app.route('/api/lessons')
+@route('/api/lessons')
+@cached_json_response(('module_id', 'city_id', 'tenant_id', 'page', 'per_page', 'fields', 'format'))
 def api_lessons():
     """API for getting lessons with filtering and pagination."""
     # Get request parameters
     module_id = request.args.get('module_id', type=int)
     city_id = request.args.get('city_id', type=int)
+    tenant_id = request.args.get('tenant_id', type=int)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', ITEMS_PER_PAGE, type=int)
+    if page < 1 or per_page < 1:
+        return jsonify({'error': 'page and per_page must be >= 1'}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        response_format = parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Get lessons from database
-    result = get_lessons(module_id, city_id, page, per_page)
+    result = get_lessons(module_id, city_id, page, per_page, tenant_id=tenant_id)
 
     # Convert lessons to list of dictionaries
-    lessons_list = []
-    for lesson in result['lessons']:
-        lessons_list.append({
-            'id': lesson['id'],
-            'module_name': lesson['module_name'],
-            'topic_title': lesson['topic_title'],
-            'city_name': lesson['city_name'],
-            'teacher_name': lesson['teacher_name'],
-            'date': lesson['date'],
-            'group_name': lesson['group_name']
-        })
+    encoder = LookupEncoder() if response_format == FORMAT_DICT else None
+    response = {
+        'lessons': serialize_lessons(result['lessons'], fields, encoder),
+        'pagination': result['pagination']
+    }
+    if encoder is not None:
+        response['lookups'] = encoder.lookups(fields)
 
     # Return results as JSON
-    return jsonify({
-        'lessons': lessons_list,
-        'pagination': result['pagination']
-    })
+    return jsonify(response)
 
-@app.route('/api/teacher_lessons')
+@route('/api/teacher_lessons')
+@cached_json_response(('teacher_id', 'city_id', 'tenant_id', 'page', 'per_page', 'fields', 'format'))
 def api_teacher_lessons():
     """API for getting lessons by teacher."""
     try:
         # Get request parameters
         teacher_id = request.args.get('teacher_id', type=int)
         city_id = request.args.get('city_id', type=int)
+        tenant_id = request.args.get('tenant_id', type=int)
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', ITEMS_PER_PAGE, type=int)
         
         if not teacher_id:
             return jsonify({'error': 'Teacher ID is required'}), 400
+        if page < 1 or per_page < 1:
+            return jsonify({'error': 'page and per_page must be >= 1'}), 400
         
-        # Get lessons from database
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            response_format = parse_format(request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get teacher name
-        cursor.execute("SELECT name FROM teachers WHERE id = ?", (teacher_id,))
-        teacher = cursor.fetchone()
-        if not teacher:
-            conn.close()
+        # Get lessons from database
+        result = get_teacher_lessons(teacher_id, city_id, page, per_page, tenant_id)
+        if result is None:
             return jsonify({'error': 'Teacher not found'}), 404
         
-        teacher_name = teacher['name']
-        
-        # Base query without pagination (for counting total lessons)
-        base_query = '''
-        SELECT
-            l.id,
-            m.id as module_id,
-            m.name as module_name,
-            t.title as topic_title,
-            c.name as city_name,
-            tc.name as teacher_name,
-            l.date,
-            l.group_name
-        FROM lessons l
-        JOIN topics t ON l.topic_id = t.id
-        JOIN modules m ON t.module_id = m.id
-        JOIN cities c ON l.city_id = c.id
-        JOIN teachers tc ON l.teacher_id = tc.id
-        WHERE l.teacher_id = ?
-        '''
-        
-        params = [teacher_id]
-        
-        if city_id:
-            base_query += ' AND l.city_id = ?'
-            params.append(city_id)
-        
-        # Add sorting by date (newest first)
-        base_query += ' ORDER BY l.date DESC'
-        
-        # Get all modules first
-        cursor.execute("SELECT id, name FROM modules ORDER BY id")
-        all_modules = cursor.fetchall()
-        
-        # Initialize modules structure
-        modules = {}
-        for module in all_modules:
-            module_name = module['name']
-            
-            # Count total lessons for this module
-            count_query = '''
-            SELECT COUNT(*) as count
-            FROM lessons l
-            JOIN topics t ON l.topic_id = t.id
-            WHERE l.teacher_id = ? AND t.module_id = ?
-            '''
-            count_params = [teacher_id, module['id']]
-            
-            if city_id:
-                count_query += ' AND l.city_id = ?'
-                count_params.append(city_id)
-            
-            cursor.execute(count_query, count_params)
-            total_count = cursor.fetchone()['count']
-            
-            # Calculate total pages
-            total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
-            
-            # Initialize module data
-            modules[module_name] = {
-                'count': total_count,
-                'page': page,
-                'per_page': per_page,
-                'total_pages': total_pages,
-                'lessons': []
-            }
-            
-            # Skip query if there are no lessons for this module
-            if total_count == 0:
-                continue
-            
-            # Query for lessons of this module with pagination, используем прямой запрос вместо модификации базового
-            module_query = '''
-            SELECT
-                l.id,
-                m.id as module_id,
-                m.name as module_name,
-                t.title as topic_title,
-                c.name as city_name,
-                tc.name as teacher_name,
-                l.date,
-                l.group_name
-            FROM lessons l
-            JOIN topics t ON l.topic_id = t.id
-            JOIN modules m ON t.module_id = m.id
-            JOIN cities c ON l.city_id = c.id
-            JOIN teachers tc ON l.teacher_id = tc.id
-            WHERE l.teacher_id = ? AND t.module_id = ?
-            '''
-            
-            module_params = [teacher_id, module['id']]
-            
-            if city_id:
-                module_query += ' AND l.city_id = ?'
-                module_params.append(city_id)
-            
-            # Добавляем сортировку и пагинацию
-            module_query += ' ORDER BY l.date DESC LIMIT ? OFFSET ?'
-            module_params.append(per_page)
-            module_params.append((page - 1) * per_page)
-            
-            try:
-                cursor.execute(module_query, module_params)
-                module_lessons = cursor.fetchall()
-            except sqlite3.Error as e:
-                # В случае ошибки, логируем и продолжаем
-                print(f"SQL error: {e}, query: {module_query}, params: {module_params}")
-                module_lessons = []
-            
-            # Add lessons to their modules
-            for lesson in module_lessons:
-                modules[module_name]['lessons'].append({
-                    'id': lesson['id'],
-                    'module_name': lesson['module_name'],
-                    'topic_title': lesson['topic_title'],
-                    'city_name': lesson['city_name'],
-                    'teacher_name': lesson['teacher_name'],
-                    'date': lesson['date'],
-                    'group_name': lesson['group_name']
-                })
-        
-        conn.close()
+        # Convert lessons of every module to the requested representation
+        encoder = LookupEncoder() if response_format == FORMAT_DICT else None
+        for module in result['modules'].values():
+            module['lessons'] = serialize_lessons(module['lessons'], fields, encoder)
+        if encoder is not None:
+            result['lookups'] = encoder.lookups(fields)
         
         # Return results as JSON
-        return jsonify({
-            'teacher_name': teacher_name,
-            'modules': modules
-        })
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/teachers_by_city')
+@route('/api/teachers_by_city')
+@cached_json_response(('city_id', 'tenant_id'))
 def api_teachers_by_city():
     """API for getting teachers filtered by city."""
     city_id = request.args.get('city_id', type=int)
+    tenant_id = request.args.get('tenant_id', type=int)
     
     # Get teachers from database
-    teachers = get_teachers_by_city(city_id)
+    teachers = get_teachers_by_city(city_id, tenant_id)
     
     # Convert to list of dicts
     teachers_list = []
@@ -431,6 +455,241 @@ def api_teachers_by_city():
         'teachers': teachers_list
     })
 
+@route('/api/teachers/search')
+@cached_json_response(('q', 'city_id', 'page', 'per_page'))
+def api_teachers_search():
+    """API for the teacher picker: teachers by name prefix, one page at a time.
+
+    Matches the start of the name or of any later word of it, ignoring case,
+    ё/е and punctuation. Served from a sorted name index rebuilt for every
+    data generation.
+    """
+    city_id = request.args.get('city_id', type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', TEACHER_SEARCH_PAGE_SIZE, type=int)
+    if page < 1 or per_page < 1:
+        return jsonify({'error': 'page and per_page must be >= 1'}), 400
+
+    result = search_teachers(request.args.get('q', ''), city_id, page, min(per_page, TEACHER_SEARCH_MAX_PAGE_SIZE))
+    return jsonify(result)
+
+@route('/api/stats/timeseries')
+@cached_json_response(('interval', 'group_by', 'start_date', 'end_date', 'module_id', 'city_id',
+                       'teacher_id', 'tenant_id'), daily=True)
+def api_stats_timeseries():
+    """API for lesson counts per day, week or month.
+
+    Counts can be grouped by any of city, module, teacher and tenant. The result is
+    cached for each data generation.
+    """
+    interval = request.args.get('interval', 'week')
+    group_by = [dimension.strip() for dimension in request.args.get('group_by', '').split(',') if dimension.strip()]
+
+    if interval not in TIMESERIES_INTERVALS:
+        return jsonify({'error': f"Interval must be one of: {', '.join(TIMESERIES_INTERVALS)}"}), 400
+    unknown = [dimension for dimension in group_by if dimension not in TIMESERIES_DIMENSIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown group_by dimensions: {', '.join(unknown)}"}), 400
+    # Drop duplicates, keep the requested order
+    group_by = list(dict.fromkeys(group_by))
+
+    try:
+        end_date = datetime.date.fromisoformat(request.args['end_date']) if request.args.get('end_date') \
+            else datetime.date.today()
+        start_date = datetime.date.fromisoformat(request.args['start_date']) if request.args.get('start_date') \
+            else end_date - datetime.timedelta(days=365)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in format YYYY-MM-DD'}), 400
+
+    series = get_lesson_timeseries(
+        interval, group_by, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'),
+        module_id=request.args.get('module_id', type=int),
+        city_id=request.args.get('city_id', type=int),
+        teacher_id=request.args.get('teacher_id', type=int),
+        tenant_id=request.args.get('tenant_id', type=int)
+    )
+
+    return jsonify({
+        'interval': interval,
+        'group_by': group_by,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'series': series
+    })
+
+@route('/api/heatmap')
+@cached_json_response(('by', 'start_date', 'end_date', 'module_id', 'city_id', 'tenant_id'), daily=True)
+def api_heatmap():
+    """API for a dense matrix of weekly lesson counts by city and module or by teacher.
+
+    Built with NumPy from lesson codes loaded once per data generation, the
+    response is cached for each data generation.
+    """
+    if not heatmap_available():
+        return jsonify({'error': 'Heatmaps require numpy'}), 501
+
+    layout = request.args.get('by', 'city_module')
+    if layout not in HEATMAP_LAYOUTS:
+        return jsonify({'error': f"by must be one of: {', '.join(HEATMAP_LAYOUTS)}"}), 400
+
+    try:
+        end_date = datetime.date.fromisoformat(request.args['end_date']) if request.args.get('end_date') \
+            else datetime.date.today()
+        start_date = datetime.date.fromisoformat(request.args['start_date']) if request.args.get('start_date') \
+            else end_date - datetime.timedelta(days=365)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in format YYYY-MM-DD'}), 400
+    if start_date > end_date:
+        return jsonify({'error': 'start_date must not be after end_date'}), 400
+    if heatmap_weeks(start_date, end_date) > HEATMAP_MAX_WEEKS:
+        return jsonify({'error': f'Date range must not span more than {HEATMAP_MAX_WEEKS} weeks'}), 400
+
+    result = get_heatmap(
+        layout, start_date, end_date,
+        module_id=request.args.get('module_id', type=int),
+        city_id=request.args.get('city_id', type=int),
+        tenant_id=request.args.get('tenant_id', type=int)
+    )
+    result.update({
+        'by': layout,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d')
+    })
+    return jsonify(result)
+
+@route('/api/tenants')
+def api_tenants():
+    """API for getting tenants (Smart-J accounts) to filter other APIs by."""
+    return jsonify({'tenants': cached_reference('tenants', get_tenants)})
+
+@route('/api/changes')
+def api_changes():
+    """API for incremental sync: lesson inserts and updates after a cursor.
+
+    Start with since=0 and pass next_cursor of every response as since of the
+    next request until has_more is false. Every change carries the current
+    names of the lesson and, for updates, the replaced teacher and group.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', CHANGES_PAGE_SIZE, type=int)
+    if since < 0 or limit < 1:
+        return jsonify({'error': 'since must be >= 0 and limit >= 1'}), 400
+
+    return jsonify(get_changes(since, min(limit, CHANGES_MAX_PAGE_SIZE)))
+
+@route('/api/events')
+def api_events():
+    """Server-sent events stream announcing new data generations.
+
+    An event is sent whenever collect_data.py publishes new data, with the
+    generation number and counts of new and existing lessons.
+    """
+    return Response(
+        generation_events(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@route('/metrics')
+def metrics():
+    """Metrics of the web interface and of the last collection run in Prometheus text format."""
+    content = REGISTRY.render()
+    try:
+        with open(COLLECTOR_METRICS_FILE, encoding='utf-8') as f:
+            content += f.read()
+    except OSError:
+        # No collection run yet
+        pass
+    return Response(content, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Endpoints that can be called through /api/batch
+BATCH_ENDPOINTS = {
+    'api_lessons', 'api_teacher_lessons', 'api_teachers_by_city', 'api_weekly', 'api_stats_timeseries', 'api_tenants',
+    'api_changes', 'api_heatmap', 'api_teachers_search'
+}
+
+@route('/api/batch', methods=['POST'])
+def api_batch():
+    """API for running several API requests in one HTTP request.
+
+    Expects a JSON body like
+    {"requests": [{"path": "/api/lessons", "params": {"module_id": 1}}, ...]}.
+    All sub-requests run on one database connection in a single read
+    transaction and with one pinned data generation, so the database, the
+    shared cache and the in-memory models all serve the same data.
+    """
+    payload = request.get_json(silent=True)
+    sub_requests = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(sub_requests, list):
+        return jsonify({'error': 'JSON body with a list of requests is required'}), 400
+    if len(sub_requests) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'Too many requests, maximum is {BATCH_MAX_REQUESTS}'}), 400
+
+    url_adapter = current_app.url_map.bind('localhost')
+    responses = []
+    with pinned_generation(), read_snapshot():
+        for sub_request in sub_requests:
+            responses.append(run_batch_request(url_adapter, sub_request))
+
+    return jsonify({'responses': responses})
+
+def run_batch_request(url_adapter, sub_request):
+    """Run one sub-request of /api/batch.
+
+    Returns:
+        dict: Status code and JSON body of the sub-request.
+    """
+    if not isinstance(sub_request, dict) or not isinstance(sub_request.get('path'), str):
+        return {'status': 400, 'body': {'error': 'Request path is required'}}
+
+    path, _, query_string = sub_request['path'].partition('?')
+    params = MultiDict(parse_qsl(query_string))
+    extra_params = sub_request.get('params') or {}
+    if not isinstance(extra_params, dict):
+        return {'status': 400, 'body': {'error': 'Request params must be an object'}}
+    for key, value in extra_params.items():
+        params[key] = value
+
+    try:
+        endpoint, view_args = url_adapter.match(path, method='GET')
+    except HTTPException as e:
+        return {'status': e.code, 'body': {'error': e.description}}
+    if endpoint not in BATCH_ENDPOINTS:
+        return {'status': 400, 'body': {'error': f'Endpoint {path} is not allowed in batch'}}
+
+    with current_app.test_request_context(path, query_string=params):
+        response = current_app.make_response(current_app.view_functions[endpoint](**view_args))
+
+    return {'status': response.status_code, 'body': response.get_json()}
+
+def create_app():
+    """Create the Flask application.
+
+    Safe to call in the master process of a pre-forking server: no database
+    connections or threads are opened here. Each worker opens its own
+    connections lazily after fork and workers share cached data through
+    the shared cache.
+
+    Returns:
+        Flask: Configured application.
+    """
+    app = Flask(__name__, template_folder=TEMPLATE_DIR)
+
+    # Compress JSON and HTML responses
+    app.after_request(compress_response)
+
+    # Request metrics
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    return app
+
+# Application instance for the development server and WSGI servers
+app = create_app()
+
 def run_web_interface(host=None, port=None, debug=False):
     """Run web interface.
     
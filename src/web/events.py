@@ -0,0 +1,132 @@
+"""
+Server-sent events for Smart-J Data Collector web interface.
+
+A single background thread per process watches the data generation stamp
+and wakes up all subscribers when a new generation is published, so idle
+subscribers cost no database queries and no polling of their own. When
+ingests run in the web process itself, the watcher is notified directly
+by publish_generation() and does not poll.
+"""
+import json
+import os
+import threading
+import time
+from src.config import EVENTS_POLL_INTERVAL, EVENTS_KEEPALIVE_INTERVAL
+from src.database.generation import generation_stamp, read_generation
+
+
+class GenerationWatcher:
+    """Watches the data generation stamp and notifies waiting subscribers."""
+
+    def __init__(self, poll_interval=EVENTS_POLL_INTERVAL):
+        # None disables polling, publish() is then called on every new generation
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._stamp = generation_stamp()
+        self._generation = read_generation()
+        self._thread = None
+
+    def start(self):
+        """Start the watcher thread if it is not running.
+
+        The thread is started lazily so that it is created after a
+        pre-forking server has forked its workers.
+        """
+        if self.poll_interval is None:
+            return
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='generation-watcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.check()
+
+    def check(self):
+        """Check the stamp and notify subscribers if the generation changed."""
+        stamp = generation_stamp()
+        if stamp == self._stamp:
+            return False
+
+        generation = read_generation()
+        with self._condition:
+            self._stamp = stamp
+            self._generation = generation
+            self._condition.notify_all()
+        return True
+
+    def publish(self, generation):
+        """Notify subscribers of a generation published by this process."""
+        with self._condition:
+            self._stamp = generation_stamp()
+            self._generation = generation
+            self._condition.notify_all()
+
+    @property
+    def current(self):
+        """Current data generation."""
+        return self._generation
+
+    def wait_for_change(self, known_generation, timeout):
+        """Wait until the generation number differs from known_generation.
+
+        Returns:
+            dict: Current generation, unchanged if the timeout expired.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation['generation'] != known_generation, timeout)
+            return self._generation
+
+    def reset_after_fork(self):
+        """Forget the watcher thread and lock state inherited from the parent."""
+        self._condition = threading.Condition()
+        self._thread = None
+
+
+generation_watcher = GenerationWatcher()
+
+# The watcher thread does not survive fork, each worker starts its own
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=generation_watcher.reset_after_fork)
+
+
+def format_event(generation):
+    """Format a generation as a server-sent event."""
+    return (
+        f"id: {generation['generation']}\n"
+        f"event: generation\n"
+        f"data: {json.dumps(generation)}\n\n"
+    )
+
+
+def generation_events(last_event_id=None, keepalive_interval=EVENTS_KEEPALIVE_INTERVAL):
+    """Yield server-sent events for published data generations.
+
+    The current generation is sent first unless the client already saw it
+    (Last-Event-ID). Comment lines are sent as keep-alives.
+
+    Args:
+        last_event_id (str, optional): Last-Event-ID header of a reconnecting client.
+        keepalive_interval (int): Seconds between keep-alive comments.
+    """
+    generation_watcher.start()
+
+    try:
+        known_generation = int(last_event_id)
+    except (TypeError, ValueError):
+        known_generation = None
+
+    # Tell the client how often to reconnect
+    yield f"retry: {EVENTS_POLL_INTERVAL * 1000}\n\n"
+
+    while True:
+        generation = generation_watcher.current
+        if generation['generation'] != known_generation:
+            known_generation = generation['generation']
+            yield format_event(generation)
+
+        generation = generation_watcher.wait_for_change(known_generation, keepalive_interval)
+        if generation['generation'] == known_generation:
+            yield ": keep-alive\n\n"
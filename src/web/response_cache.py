@@ -0,0 +1,85 @@
+"""
+Shared caching of reference data and API responses for Smart-J Data
+Collector web interface.
+
+Values are stored in the shared cache under the current data generation,
+so all web workers reuse each other's results until the next ingest.
+"""
+import datetime
+import json
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request
+from src.database.generation import current_generation
+from src.database.shared_cache import shared_cache
+
+
+def cached_reference(name, loader):
+    """Return reference data (cities, teachers, ...) from the shared cache.
+
+    Args:
+        name (str): Name of the reference data.
+        loader (callable): Function returning rows, called on cache miss.
+
+    Returns:
+        list: Rows as dictionaries.
+    """
+    key = f"reference:{name}"
+    generation = current_generation()
+
+    value = shared_cache.get(key, generation, name='reference')
+    if value is not None:
+        return json.loads(value)
+
+    rows = [dict(row) for row in loader()]
+    shared_cache.set(key, generation, json.dumps(rows, ensure_ascii=False))
+    return rows
+
+
+def response_cache_key(params, daily=False):
+    """Return the shared cache key of the current request.
+
+    Args:
+        params (iterable): Query parameters the view reads, other parameters
+            do not create separate cache entries.
+        daily (bool): The response depends on the current date, e.g. through
+            a default date range ending today.
+
+    Returns:
+        str: Path with the sorted values of the parameters, and today's date
+            for daily responses.
+    """
+    query = urlencode([(name, value) for name in sorted(params) for value in request.args.getlist(name)])
+    key = f"response:{request.path}?{query}"
+    if daily:
+        key += f"@{datetime.date.today().isoformat()}"
+    return key
+
+
+def cached_json_response(params=(), daily=False):
+    """Serve a JSON view from the shared cache of the current data generation.
+
+    Only successful JSON responses are cached, keyed by response_cache_key().
+
+    Args:
+        params (iterable): Query parameters the view reads.
+        daily (bool): Cache the response only for the current day.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = response_cache_key(params, daily)
+            generation = current_generation()
+
+            body = shared_cache.get(key, generation, name='api_response')
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'application/json' and not response.is_streamed:
+                shared_cache.set(key, generation, response.get_data())
+            return response
+
+        return wrapper
+
+    return decorator
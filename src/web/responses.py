@@ -0,0 +1,157 @@
+"""
+JSON response helpers for Smart-J Data Collector web interface.
+
+Provides field projection and dictionary encoding for lesson lists and
+gzip/brotli compression of responses.
+"""
+import gzip
+from flask import request
+from src.config import COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is used without it
+    brotli = None
+
+# Fields of a lesson object in API responses
+LESSON_FIELDS = ('id', 'module_name', 'topic_title', 'city_name', 'teacher_name', 'date', 'group_name')
+
+# Name fields replaced by lookup table references in the dictionary format:
+# field -> (ID field in the row, lookup table name)
+ENCODED_FIELDS = {
+    'module_name': ('module_id', 'modules'),
+    'city_name': ('city_id', 'cities'),
+    'teacher_name': ('teacher_id', 'teachers')
+}
+
+# Response formats
+FORMAT_PLAIN = 'plain'
+FORMAT_DICT = 'dict'
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/javascript'
+}
+
+
+def parse_fields(value):
+    """Parse the `fields` request parameter.
+
+    Args:
+        value (str): Comma separated list of lesson fields, may be empty.
+
+    Returns:
+        tuple: Requested fields in the order of LESSON_FIELDS.
+
+    Raises:
+        ValueError: If an unknown field is requested.
+    """
+    if not value:
+        return LESSON_FIELDS
+
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(LESSON_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return tuple(field for field in LESSON_FIELDS if field in requested)
+
+
+def parse_format(value):
+    """Parse the `format` request parameter.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if not value or value == FORMAT_PLAIN:
+        return FORMAT_PLAIN
+    if value == FORMAT_DICT:
+        return FORMAT_DICT
+    raise ValueError(f"Unknown format: {value}")
+
+
+class LookupEncoder:
+    """Collects lookup tables for dictionary-encoded lesson lists."""
+
+    def __init__(self):
+        self.tables = {table: {} for _, table in ENCODED_FIELDS.values()}
+
+    def encode(self, lesson, field):
+        """Store the name in its lookup table and return its ID."""
+        id_field, table = ENCODED_FIELDS[field]
+        value_id = lesson[id_field]
+        self.tables[table][str(value_id)] = lesson[field]
+        return value_id
+
+    def lookups(self, fields):
+        """Return lookup tables used by the given fields."""
+        return {
+            ENCODED_FIELDS[field][1]: self.tables[ENCODED_FIELDS[field][1]]
+            for field in fields if field in ENCODED_FIELDS
+        }
+
+
+def serialize_lessons(lessons, fields=LESSON_FIELDS, encoder=None):
+    """Convert lesson rows to a list of dictionaries.
+
+    Args:
+        lessons (iterable): Lesson rows (sqlite3.Row or dict).
+        fields (tuple): Fields to include.
+        encoder (LookupEncoder, optional): If given, name fields are replaced
+            by IDs (`module_id`, `city_id`, `teacher_id`) referring to the
+            encoder lookup tables.
+
+    Returns:
+        list: List of lesson dictionaries.
+    """
+    lessons_list = []
+    for lesson in lessons:
+        item = {}
+        for field in fields:
+            if encoder is not None and field in ENCODED_FIELDS:
+                item[ENCODED_FIELDS[field][0]] = encoder.encode(lesson, field)
+            else:
+                item[field] = lesson[field]
+        lessons_list.append(item)
+    return lessons_list
+
+
+def compress_response(response):
+    """Compress a response with brotli or gzip if the client accepts it.
+
+    Registered as an `after_request` handler. Streamed responses, already
+    encoded responses and responses smaller than COMPRESSION_MIN_SIZE are
+    left unchanged.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    accept_encodings = request.accept_encodings
+    if brotli is not None and accept_encodings['br']:
+        encoding = 'br'
+    elif accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        # Brotli quality is 0-11, gzip level is 1-9
+        data = brotli.compress(data, quality=min(COMPRESSION_LEVEL + 2, 11))
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
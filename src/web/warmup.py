@@ -0,0 +1,191 @@
+"""
+Cache warmup for Smart-J Data Collector web interface.
+
+Run when the web interface starts and after every ingest, so the first
+users of /weekly, /tutors and /api/teacher_lessons do not wait on cold
+SQLite pages and empty caches. In order, the warmup
+
+- stores cities, teachers, modules and tenants in the shared cache,
+- reads the lessons of the latest weeks through idx_lessons_date and
+  scans the other indexes, which loads their pages into the OS page cache,
+- reads the pre-rendered reports of the latest weeks (or the lessons of
+  weeks that are not pre-rendered),
+- loads the in-memory read model and the teacher name index.
+
+The whole warmup is limited to WARMUP_BUDGET seconds: SQL statements are
+interrupted at the deadline, remaining steps are skipped, and a step that
+cannot be interrupted finishes in the background without holding up the
+start of the web interface.
+"""
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+from src.config import WARMUP_ENABLED, WARMUP_BUDGET, WARMUP_WEEKS
+from src.database import operations
+from src.database.read_model import get_read_model, get_weekly_lessons
+from src.database.teacher_index import get_teacher_index
+from src.utils.metrics import REGISTRY
+
+WARMUP_SECONDS = REGISTRY.gauge(
+    'smartj_warmup_seconds', 'Duration of the last cache warmup by step', ['step']
+)
+WARMUP_COMPLETE = REGISTRY.gauge(
+    'smartj_warmup_complete', 'Whether the last cache warmup finished all steps within its budget'
+)
+
+# SQLite virtual machine instructions between deadline checks
+PROGRESS_INSTRUCTIONS = 10000
+
+
+class WarmupBudgetExceeded(Exception):
+    """The warmup deadline passed."""
+
+
+def warm_reference_data(deadline):
+    """Store reference data of the current generation in the shared cache."""
+    # Imported here because the web app imports this module
+    from src.web.response_cache import cached_reference
+
+    for name, loader in (('cities', operations.get_cities), ('teachers', operations.get_teachers),
+                         ('modules', operations.get_modules), ('tenants', operations.get_tenants)):
+        _check_deadline(deadline)
+        cached_reference(name, loader)
+
+
+def warm_index_pages(deadline, weeks=WARMUP_WEEKS):
+    """Read lessons of the latest weeks and scan all indexes to load their pages.
+
+    Returns:
+        int: Number of scanned indexes.
+    """
+    since = (datetime.date.today() - datetime.timedelta(weeks=weeks)).strftime('%Y-%m-%d')
+    scanned = 0
+    with operations.read_snapshot():
+        conn = operations.get_connection()
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INSTRUCTIONS)
+        try:
+            # Index and table pages of the recent lessons most pages show
+            conn.execute(
+                "SELECT COUNT(*), SUM(LENGTH(group_name)) FROM lessons INDEXED BY idx_lessons_date WHERE date >= ?",
+                (since,)
+            ).fetchone()
+
+            indexes = conn.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' ORDER BY tbl_name = 'lessons' DESC"
+            ).fetchall()
+            for name, table in indexes:
+                conn.execute(f'SELECT COUNT(*) FROM "{table}" INDEXED BY "{name}"').fetchone()
+                scanned += 1
+        except sqlite3.OperationalError as e:
+            if time.monotonic() > deadline:
+                raise WarmupBudgetExceeded() from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+    return scanned
+
+
+def warm_weekly_reports(deadline, weeks=WARMUP_WEEKS, weekly_lessons=get_weekly_lessons):
+    """Read the reports of the latest weeks.
+
+    Pre-rendered reports are read from the weekly cache, lessons of weeks
+    that are not pre-rendered are read from the read model or the database.
+    """
+    # Imported here because the web app imports this module
+    from src.web.app import get_available_weeks
+    from src.web.weekly_cache import load_cached_report
+
+    today = datetime.date.today()
+    for week in get_available_weeks(today, weeks=weeks):
+        _check_deadline(deadline)
+        cached = load_cached_report(week['start_date'], 'html', today)
+        if cached is None:
+            weekly_lessons(week['start_date'], week['end_date'])
+
+
+def warm_read_model(deadline):
+    """Load the in-memory read model of the current generation."""
+    _check_deadline(deadline)
+    get_read_model()
+
+
+def warm_teacher_index(deadline):
+    """Build the teacher name index of the current generation."""
+    _check_deadline(deadline)
+    get_teacher_index()
+
+
+def _check_deadline(deadline):
+    if time.monotonic() > deadline:
+        raise WarmupBudgetExceeded()
+
+
+def warm_up(budget=WARMUP_BUDGET, read_model=True):
+    """Warm up caches within a time budget.
+
+    Args:
+        budget (float): Seconds the warmup may take.
+        read_model (bool): Load the read model and the teacher index, only
+            useful in web processes.
+
+    Returns:
+        dict: Seconds per finished step, 'total' and 'complete'.
+    """
+    started = time.monotonic()
+    deadline = started + budget
+    # Without the read model, weeks are read from the database directly
+    weekly_lessons = get_weekly_lessons if read_model else operations.get_weekly_lessons
+    steps = [('reference', warm_reference_data), ('index_pages', warm_index_pages),
+             ('weekly', lambda deadline: warm_weekly_reports(deadline, weekly_lessons=weekly_lessons))]
+    if read_model:
+        steps.append(('read_model', warm_read_model))
+        steps.append(('teacher_index', warm_teacher_index))
+
+    report = {'complete': True}
+    for step, func in steps:
+        step_started = time.monotonic()
+        try:
+            func(deadline)
+        except WarmupBudgetExceeded:
+            report['complete'] = False
+            logging.warning("Cache warmup exceeded its budget of %.1f s at step %s", budget, step)
+            break
+        except Exception as e:
+            logging.error("Cache warmup step %s failed: %s", step, e)
+            continue
+        report[step] = time.monotonic() - step_started
+        WARMUP_SECONDS.set(report[step], step=step)
+
+    report['total'] = time.monotonic() - started
+    WARMUP_SECONDS.set(report['total'], step='total')
+    WARMUP_COMPLETE.set(1 if report['complete'] else 0)
+    logging.info("Cache warmup %s in %.0f ms (%s)",
+                 "done" if report['complete'] else "stopped", report['total'] * 1000,
+                 ', '.join(f"{step} {report[step] * 1000:.0f} ms" for step, _ in steps if step in report))
+    return report
+
+
+def run_warmup(budget=WARMUP_BUDGET, read_model=True):
+    """Warm up caches, waiting for the warmup at most budget seconds.
+
+    The warmup runs on a background thread, so a step that overruns the
+    budget finishes without holding up the caller.
+
+    Returns:
+        dict: Report of warm_up(), or None if the warmup is disabled or
+            still running when the budget is spent.
+    """
+    if not WARMUP_ENABLED:
+        return None
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(warm_up(budget, read_model)),
+                              name='cache-warmup', daemon=True)
+    thread.start()
+    thread.join(budget)
+    if thread.is_alive():
+        logging.warning("Cache warmup continues in the background after %.1f s", budget)
+        return None
+    return result
@@ -0,0 +1,113 @@
+"""
+Pre-rendered weekly report cache for Smart-J Data Collector.
+
+After each ingest the weekly reports of the last weeks are rendered to
+HTML and JSON files in WEEKLY_CACHE_DIR. The cache is valid for the day it
+was rendered on, because the list of available weeks and the calendar
+depend on the current date.
+"""
+import datetime
+import json
+import logging
+import os
+from src.config import WEEKLY_CACHE_DIR, WEEKLY_CACHE_WEEKS
+from src.utils.metrics import CACHE_REQUESTS
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _write_file(path, content):
+    """Write a file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest():
+    """Read the cache manifest, return None if it is missing or broken."""
+    try:
+        with open(os.path.join(WEEKLY_CACHE_DIR, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_cached_report(start_date, kind, today=None):
+    """Load a pre-rendered weekly report.
+
+    Args:
+        start_date (str): Monday of the week in format 'YYYY-MM-DD'.
+        kind (str): 'html' or 'json'.
+        today (datetime.date, optional): Current date.
+
+    Returns:
+        str: Cached content, or None if the week is not cached or the cache
+            was rendered on another day.
+    """
+    today = today or datetime.date.today()
+    content = None
+
+    manifest = _read_manifest()
+    if (manifest and manifest.get('rendered_on') == today.strftime('%Y-%m-%d')
+            and start_date in manifest.get('weeks', [])):
+        try:
+            with open(os.path.join(WEEKLY_CACHE_DIR, f"{start_date}.{kind}"), encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            content = None
+
+    CACHE_REQUESTS.inc(cache=f'weekly_{kind}', result='hit' if content is not None else 'miss')
+    return content
+
+
+def prerender_weekly_reports(weeks=WEEKLY_CACHE_WEEKS):
+    """Render weekly reports of the last weeks into the cache.
+
+    Called after data collection. Files of weeks that are no longer
+    available are removed.
+
+    Args:
+        weeks (int): Number of weeks to render.
+
+    Returns:
+        list: Start dates of rendered weeks.
+    """
+    # Imported here because the web app imports this module
+    from src.web.app import (
+        app, build_weekly_report, get_available_weeks, render_weekly_report, weekly_report_json
+    )
+    from src.database.operations import get_weekly_lessons
+
+    os.makedirs(WEEKLY_CACHE_DIR, exist_ok=True)
+    today = datetime.date.today()
+
+    rendered_weeks = []
+    with app.app_context():
+        for week in get_available_weeks(today, weeks=weeks):
+            start_date = datetime.date.fromisoformat(week['start_date'])
+            end_date = datetime.date.fromisoformat(week['end_date'])
+
+            # Read the database directly, the read model still holds the previous generation
+            report = build_weekly_report(start_date, end_date, today, weekly_lessons=get_weekly_lessons)
+            _write_file(os.path.join(WEEKLY_CACHE_DIR, f"{week['start_date']}.html"),
+                        render_weekly_report(report))
+            _write_file(os.path.join(WEEKLY_CACHE_DIR, f"{week['start_date']}.json"),
+                        json.dumps(weekly_report_json(report), ensure_ascii=False))
+            rendered_weeks.append(week['start_date'])
+
+    # Publish the new set of weeks
+    _write_file(os.path.join(WEEKLY_CACHE_DIR, MANIFEST_FILE), json.dumps({
+        'rendered_on': today.strftime('%Y-%m-%d'),
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'weeks': rendered_weeks
+    }))
+
+    # Remove weeks that are not in the cache anymore
+    for file_name in os.listdir(WEEKLY_CACHE_DIR):
+        week_start, _, extension = file_name.partition('.')
+        if extension in ('html', 'json') and file_name != MANIFEST_FILE and week_start not in rendered_weeks:
+            os.remove(os.path.join(WEEKLY_CACHE_DIR, file_name))
+
+    logging.info(f"Pre-rendered weekly reports for {len(rendered_weeks)} weeks")
+    return rendered_weeks